@@ -0,0 +1,145 @@
+import copy
+import hashlib
+import random
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.permissions import SAFE_METHODS
+
+TOKEN_KEY = 'token:{}'
+AUTH_KEY = 'auth:{}'
+
+
+class LRUCache:
+    """Ограниченный по размеру кэш в памяти процесса со сроком жизни
+    записей. Дольше всех не использованные записи вытесняются первыми."""
+
+    def __init__(self, size, timeout):
+        self.size = size
+        self.timeout = timeout
+        self.entries = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.timeout, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+
+local_tokens = LRUCache(
+    settings.TOKEN_CACHE_SIZE, settings.TOKEN_CACHE_TIMEOUT
+)
+
+
+def get_auth_counter(user_id):
+    """Счётчик изменений пользователя. Пропавший из кэша счётчик
+    начинается со случайного числа, чтобы не совпасть с прежним."""
+    key = AUTH_KEY.format(user_id)
+    counter = cache.get(key)
+    if counter is None:
+        cache.add(key, random.getrandbits(48), None)
+        counter = cache.get(key)
+    return counter
+
+
+def increment_auth_counter(user_id):
+    try:
+        cache.incr(AUTH_KEY.format(user_id))
+    except ValueError:
+        # Счётчика нет — записи с ним и так не примутся.
+        pass
+
+
+def invalidate_user_tokens(user_id):
+    """Делает устаревшими закэшированные токены пользователя во всех
+    процессах: запись из кэша принимается, только если счётчик
+    изменений пользователя с её загрузки не менялся.
+
+    Счётчик увеличивается сразу и ещё раз после коммита: запись,
+    загруженная из базы до коммита, тоже устареет.
+    """
+    increment_auth_counter(user_id)
+    transaction.on_commit(lambda: increment_auth_counter(user_id))
+
+
+class CachingTokenAuthentication(TokenAuthentication):
+    """Проверка токена без запроса к базе на каждый запрос.
+
+    Токен с пользователем хранится в LRU-кэше процесса и, если включён
+    TOKEN_CACHE_SHARED, в общем кэше. Запись действительна, пока
+    не изменился счётчик изменений пользователя, прочитанный перед её
+    загрузкой: его увеличивают выход, удаление токена и любое
+    сохранение пользователя — смена пароля, деактивация.
+
+    Изменяющие запросы получают пользователя из базы: сохранение
+    пользователя из кэша затёрло бы изменения, сделанные после его
+    загрузки, например число подписчиков.
+    """
+
+    use_cache = True
+
+    def authenticate(self, request):
+        self.use_cache = request.method in SAFE_METHODS
+        return super().authenticate(request)
+
+    def authenticate_credentials(self, key):
+        if not self.use_cache:
+            return super().authenticate_credentials(key)
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        token = self.get_cached(digest)
+        if token is None:
+            token = self.load(key, digest)
+        return token.user, token
+
+    @staticmethod
+    def is_current(entry):
+        counter, token = entry
+        return get_auth_counter(token.user_id) == counter
+
+    def get_cached(self, digest):
+        entry = local_tokens.get(digest)
+        if entry is None and settings.TOKEN_CACHE_SHARED:
+            entry = cache.get(TOKEN_KEY.format(digest))
+            if entry is not None:
+                local_tokens.set(digest, entry)
+        if entry is None or not self.is_current(entry):
+            return None
+        # Копия, чтобы изменения пользователя в одном запросе
+        # не попадали в другие.
+        return copy.deepcopy(entry[1])
+
+    def load(self, key, digest):
+        # Счётчик читается до токена с пользователем: если их изменят
+        # во время чтения, счётчик окажется новее и запись сразу
+        # устареет.
+        user_id = self.get_model().objects.filter(key=key).values_list(
+            'user_id', flat=True
+        ).first()
+        counter = None if user_id is None else get_auth_counter(user_id)
+        _, token = super().authenticate_credentials(key)
+        entry = (counter, token)
+        local_tokens.set(digest, entry)
+        if settings.TOKEN_CACHE_SHARED:
+            cache.set(
+                TOKEN_KEY.format(digest), entry, settings.TOKEN_CACHE_TIMEOUT
+            )
+        return copy.deepcopy(token)
@@ -0,0 +1,94 @@
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from threading import Lock
+
+from api.cache import ingredients_cache
+
+_index = None
+_index_catalog = None
+_index_lock = Lock()
+
+GRAM_SIZE = 3
+# Сколько названий просматривает поиск по подстроке короче триграммы.
+SHORT_QUERY_SCAN_LIMIT = 5000
+
+
+class IngredientIndex:
+    """Индекс для подсказок ингредиентов.
+
+    Названия в нижнем регистре хранятся отсортированными, поэтому
+    совпадения по началу названия находятся двоичным поиском. Если их
+    меньше лимита, список дополняется совпадениями по подстроке:
+    кандидаты берутся из триграммного индекса по самой редкой
+    триграмме запроса. Запросы короче триграммы проверяются только
+    на первых SHORT_QUERY_SCAN_LIMIT названиях.
+    """
+
+    def __init__(self, ingredients):
+        self.entries = sorted(
+            (name.lower(), pk) for pk, name in ingredients
+        )
+        self.names = [name for name, pk in self.entries]
+        grams = defaultdict(list)
+        for position, name in enumerate(self.names):
+            for gram in self.get_grams(name):
+                grams[gram].append(position)
+        self.grams = {
+            gram: array('I', positions) for gram, positions in grams.items()
+        }
+
+    def __len__(self):
+        return len(self.entries)
+
+    @staticmethod
+    def get_grams(text):
+        return {
+            text[start:start + GRAM_SIZE]
+            for start in range(len(text) - GRAM_SIZE + 1)
+        }
+
+    def get_candidates(self, query):
+        """Позиции названий, которые могут содержать запрос,
+        по возрастанию."""
+        if len(query) < GRAM_SIZE:
+            return range(min(len(self.names), SHORT_QUERY_SCAN_LIMIT))
+        postings = [self.grams.get(gram) for gram in self.get_grams(query)]
+        if not all(postings):
+            return ()
+        return min(postings, key=len)
+
+    def search(self, query, limit):
+        query = query.strip().lower()
+        if not query or limit < 1:
+            return []
+        result = []
+        for name, pk in self.entries[bisect_left(self.names, query):]:
+            if not name.startswith(query):
+                break
+            result.append(pk)
+            if len(result) == limit:
+                return result
+        found = set(result)
+        for position in self.get_candidates(query):
+            name, pk = self.entries[position]
+            if query in name and pk not in found:
+                result.append(pk)
+                if len(result) == limit:
+                    break
+        return result
+
+
+def get_ingredient_index():
+    """Индекс по текущей версии справочника ингредиентов."""
+    global _index, _index_catalog
+    catalog = ingredients_cache.get()
+    if _index_catalog is catalog:
+        return _index
+    with _index_lock:
+        if _index_catalog is not catalog:
+            _index = IngredientIndex(
+                (item['id'], item['name']) for item in catalog.data
+            )
+            _index_catalog = catalog
+    return _index
@@ -0,0 +1,109 @@
+from array import array
+from bisect import bisect_left
+from itertools import groupby
+
+CHUNK_BITS = 16
+CHUNK_SIZE = 1 << CHUNK_BITS
+OFFSET_MASK = CHUNK_SIZE - 1
+# Блок, в котором позиций больше, хранится битовой картой: при таком
+# количестве массив из двухбайтовых смещений занимает больше неё.
+ARRAY_LIMIT = CHUNK_SIZE // 16
+
+
+def offsets_to_int(offsets):
+    """Битовая карта блока в виде целого числа по отсортированным
+    смещениям."""
+    if not offsets:
+        return 0
+    bits = bytearray(offsets[-1] // 8 + 1)
+    for offset in offsets:
+        bits[offset >> 3] |= 1 << (offset & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def iter_bits(bits):
+    """Установленные биты числа от старшего к младшему."""
+    while bits:
+        offset = bits.bit_length() - 1
+        bits ^= 1 << offset
+        yield offset
+
+
+class Bitmap:
+    """Сжатая битовая карта позиций.
+
+    Позиции делятся на блоки по CHUNK_SIZE. Пустые блоки не хранятся,
+    в редких блоках лежит отсортированный массив смещений, в плотных —
+    битовая карта блока целым числом. Операции над картами выполняются
+    поблочно, блок приводится к числу методом chunk.
+    """
+
+    __slots__ = ('blocks',)
+
+    def __init__(self):
+        self.blocks = {}
+
+    @classmethod
+    def from_sorted(cls, positions):
+        bitmap = cls()
+        for chunk, group in groupby(
+            positions, key=lambda position: position >> CHUNK_BITS
+        ):
+            offsets = array('H', (
+                position & OFFSET_MASK for position in group
+            ))
+            bitmap.blocks[chunk] = (
+                offsets if len(offsets) <= ARRAY_LIMIT
+                else offsets_to_int(offsets)
+            )
+        return bitmap
+
+    def __bool__(self):
+        return bool(self.blocks)
+
+    def chunks(self):
+        return self.blocks.keys()
+
+    def chunk(self, number):
+        block = self.blocks.get(number, 0)
+        if isinstance(block, array):
+            return offsets_to_int(block)
+        return block
+
+    def add(self, position):
+        number, offset = position >> CHUNK_BITS, position & OFFSET_MASK
+        block = self.blocks.get(number)
+        if block is None:
+            self.blocks[number] = array('H', (offset,))
+        elif isinstance(block, array):
+            index = bisect_left(block, offset)
+            if index == len(block) or block[index] != offset:
+                block.insert(index, offset)
+                if len(block) > ARRAY_LIMIT:
+                    self.blocks[number] = offsets_to_int(block)
+        else:
+            self.blocks[number] = block | 1 << offset
+
+    def discard_chunk(self, number, offsets, mask):
+        """Убирает из блока смещения offsets; mask — они же битами."""
+        block = self.blocks.get(number)
+        if block is None:
+            return
+        if isinstance(block, array):
+            for offset in offsets:
+                index = bisect_left(block, offset)
+                if index < len(block) and block[index] == offset:
+                    del block[index]
+        else:
+            block &= ~mask
+            self.blocks[number] = block
+        if not block:
+            del self.blocks[number]
+
+    def size(self):
+        """Примерный объём блоков в байтах."""
+        return sum(
+            block.itemsize * len(block) if isinstance(block, array)
+            else (block.bit_length() + 7) // 8
+            for block in self.blocks.values()
+        )
@@ -0,0 +1,158 @@
+import time
+from threading import Lock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404, HttpResponse
+from rest_framework.renderers import JSONRenderer
+
+from recipes.models import Ingredient, Tag
+
+from api.replicas import mark_replica_read, read_from_replica, use_primary
+from api.serializers import IngredientSerializer, TagSerializer
+from api.versions import bump_version, get_version
+
+CATALOG_KEY = 'catalog:{}:{}'
+CATALOG_TIMEOUT = 24 * 60 * 60
+RESPONSE_KEY = 'response:{}'
+RESPONSE_LOCK_KEY = 'response-lock:{}'
+RESPONSE_LOCK_TIMEOUT = 10
+RESPONSE_WAIT = 2
+RESPONSE_POLL_INTERVAL = 0.02
+
+
+class Catalog:
+    """Справочник, заранее сериализованный в JSON."""
+
+    def __init__(self, data):
+        renderer = JSONRenderer()
+        self.data = data
+        self.items = {
+            item['id']: renderer.render(item) for item in data
+        }
+        self.content = b'[' + b','.join(self.items.values()) + b']'
+
+    def list_response(self):
+        return HttpResponse(self.content, content_type='application/json')
+
+    def retrieve_response(self, pk):
+        try:
+            content = self.items[int(pk)]
+        except (KeyError, ValueError):
+            raise Http404
+        return HttpResponse(content, content_type='application/json')
+
+
+class CatalogCache:
+    """Версионный кэш справочника.
+
+    Готовый справочник хранится в общем кэше под ключом с версией и
+    в памяти процесса, чтобы не распаковывать его на каждый запрос.
+    После изменения данных версия меняется и справочник собирается
+    заново.
+    """
+
+    def __init__(self, name, queryset, serializer_class):
+        self.name = name
+        self.queryset = queryset
+        self.serializer_class = serializer_class
+        self._local = None
+        self._local_version = None
+        self._lock = Lock()
+
+    def build(self):
+        with use_primary():
+            serializer = self.serializer_class(
+                self.queryset.all(), many=True
+            )
+            return Catalog([dict(item) for item in serializer.data])
+
+    def get(self):
+        """Справочник текущей версии."""
+        version = get_version(self.name)
+        if self._local_version == version:
+            return self._local
+        with self._lock:
+            if self._local_version != version:
+                key = CATALOG_KEY.format(self.name, version)
+                catalog = cache.get(key)
+                if catalog is None:
+                    catalog = self.build()
+                    cache.set(key, catalog, CATALOG_TIMEOUT)
+                self._local = catalog
+                self._local_version = version
+        return self._local
+
+    def invalidate(self):
+        bump_version(self.name)
+
+
+tags_cache = CatalogCache('tags', Tag.objects.all(), TagSerializer)
+ingredients_cache = CatalogCache(
+    'ingredients',
+    Ingredient.objects.all(),
+    IngredientSerializer
+)
+
+
+def wait_for_response(key):
+    """Ждёт, пока ответ соберёт запрос, первым взявший блокировку.
+
+    Если блокировка снята, а ответа нет — например, первый запрос
+    завершился ошибкой, — ждать дальше нечего.
+    """
+    deadline = time.monotonic() + RESPONSE_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(RESPONSE_POLL_INTERVAL)
+        cached = cache.get_many((
+            RESPONSE_KEY.format(key), RESPONSE_LOCK_KEY.format(key)
+        ))
+        if RESPONSE_KEY.format(key) in cached:
+            return cached[RESPONSE_KEY.format(key)]
+        if RESPONSE_LOCK_KEY.format(key) not in cached:
+            return None
+    return None
+
+
+def get_cached_response(key, build):
+    """Готовый ответ из кэша или собранный функцией build.
+
+    Одновременные промахи по одному ключу не собирают ответ каждый
+    сам: первый берёт блокировку в кэше, остальные ждут его результат
+    и только по истечении ожидания собирают ответ сами.
+
+    Ответ, собранный с реплики, мог застать её до последней записи,
+    поэтому хранится не дольше REPLICA_STICKY_SECONDS и при выдаче
+    из кэша тоже считается прочитанным с реплики.
+    """
+    cached = cache.get(RESPONSE_KEY.format(key))
+    if cached is None:
+        if cache.add(RESPONSE_LOCK_KEY.format(key), True,
+                     RESPONSE_LOCK_TIMEOUT):
+            try:
+                response = build()
+                from_replica = read_from_replica()
+                timeout = settings.RESPONSE_CACHE_TIMEOUT
+                if from_replica:
+                    timeout = min(timeout, settings.REPLICA_STICKY_SECONDS)
+                if response.status_code < 500:
+                    cache.set(
+                        RESPONSE_KEY.format(key),
+                        (
+                            response.status_code,
+                            response.content,
+                            response['Content-Type'],
+                            from_replica
+                        ),
+                        timeout
+                    )
+            finally:
+                cache.delete(RESPONSE_LOCK_KEY.format(key))
+            return response
+        cached = wait_for_response(key)
+        if cached is None:
+            return build()
+    status, content, content_type, from_replica = cached
+    if from_replica:
+        mark_replica_read()
+    return HttpResponse(content, content_type=content_type, status=status)
@@ -0,0 +1,56 @@
+from django.core.cache import cache
+
+from api.versions import bump_version, get_version
+
+JOURNAL_VERSION = 'recipe_changes'
+CHANGES_KEY = 'recipes:changes'
+CHANGE_KEY = 'recipes:change:{}'
+CHANGE_TIMEOUT = 24 * 60 * 60
+# При большем отставании от журнала индекс собирается заново.
+MAX_PENDING_CHANGES = 1000
+
+
+def log_recipe_changes(recipe_ids):
+    """Записывает изменённые рецепты в общий журнал: индексы рецептов
+    во всех процессах применяют его к себе при следующем обращении."""
+    try:
+        number = cache.incr(CHANGES_KEY)
+    except ValueError:
+        # Журнал начинается заново: прежние номера записей больше
+        # ничего не значат, индексы собираются с нуля.
+        if cache.add(CHANGES_KEY, 0, None):
+            bump_version(JOURNAL_VERSION)
+        number = cache.incr(CHANGES_KEY)
+    cache.set(CHANGE_KEY.format(number), list(recipe_ids), CHANGE_TIMEOUT)
+
+
+def get_journal_state():
+    """Версия журнала и номер его последней записи."""
+    version = get_version(JOURNAL_VERSION)
+    changes = cache.get(CHANGES_KEY)
+    if changes is None:
+        # Журнал заводится до первой записи, чтобы её номер не считался
+        # началом нового журнала.
+        cache.add(CHANGES_KEY, 0, None)
+        changes = cache.get(CHANGES_KEY, 0)
+    return version, changes
+
+
+def read_changes(start, end):
+    """Списки id рецептов из записей журнала после start до end.
+
+    Записи читаются подряд до первой отсутствующей: она ещё
+    записывается или вытеснена из кэша. None — если записи прочитать
+    нельзя и индекс нужно собрать заново.
+    """
+    if end < start or end - start > MAX_PENDING_CHANGES:
+        return None
+    numbers = range(start + 1, end + 1)
+    found = cache.get_many([CHANGE_KEY.format(number) for number in numbers])
+    applied = []
+    for number in numbers:
+        recipe_ids = found.get(CHANGE_KEY.format(number))
+        if recipe_ids is None:
+            break
+        applied.append(recipe_ids)
+    return applied or None
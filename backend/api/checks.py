@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core import checks
+
+LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@checks.register(checks.Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """Версии данных и счётчики токенов работают только в общем кэше."""
+    if settings.CACHES['default']['BACKEND'] not in LOCAL_CACHES:
+        return []
+    return [checks.Warning(
+        'Кэш не общий для процессов: после записи остальные воркеры '
+        'будут отдавать устаревшие справочники, ETag и пользователей.',
+        hint='Задайте CACHE_BACKEND и CACHE_LOCATION, например memcached.',
+        id='api.W001',
+    )]
@@ -0,0 +1,136 @@
+import csv
+from functools import lru_cache
+from tempfile import SpooledTemporaryFile
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont, TTFError
+from reportlab.pdfgen import canvas
+
+CHUNK_SIZE = 64 * 1024
+FONT_NAME = 'ShoppingListFont'
+
+
+@lru_cache(maxsize=None)
+def register_font(path):
+    """Регистрирует шрифт в reportlab один раз на процесс. Без файла
+    шрифта используется встроенный Helvetica."""
+    try:
+        pdfmetrics.registerFont(TTFont(FONT_NAME, path))
+    except (OSError, TTFError):
+        return 'Helvetica'
+    return FONT_NAME
+
+
+class Echo:
+    """Псевдобуфер для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+class ShoppingListExporter:
+    """Базовый класс выгрузки списка покупок.
+
+    Строки (название, единица измерения, количество) читаются из
+    итератора по мере отправки ответа, весь список в памяти не хранится.
+    """
+    extension = None
+    content_type = None
+
+    def __init__(self, rows, title):
+        self.rows = rows
+        self.title = title
+
+    def stream(self):
+        raise NotImplementedError
+
+    def get_response(self):
+        response = StreamingHttpResponse(
+            self.stream(),
+            content_type=self.content_type
+        )
+        # Имя не в ASCII Django закодировал бы по RFC 2047, который
+        # браузеры в этом заголовке не понимают.
+        filename = quote(f'{self.title}.{self.extension}')
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_list.{self.extension}"; '
+            f"filename*=UTF-8''{filename}"
+        )
+        return response
+
+
+class CSVExporter(ShoppingListExporter):
+    extension = 'csv'
+    content_type = 'text/csv; charset=utf-8'
+
+    def stream(self):
+        writer = csv.writer(Echo())
+        yield '\ufeff'.encode('utf8')
+        for row in self.rows:
+            yield writer.writerow(row).encode('utf8')
+
+
+class TextExporter(ShoppingListExporter):
+    extension = 'txt'
+    content_type = 'text/plain; charset=utf-8'
+
+    def stream(self):
+        yield f'{self.title}\n\n'.encode('utf8')
+        for name, measurement_unit, amount in self.rows:
+            yield f'• {name} ({measurement_unit}) — {amount}\n'.encode('utf8')
+
+
+class PDFExporter(ShoppingListExporter):
+    """Выгрузка в PDF.
+
+    reportlab собирает документ целиком, поэтому страницы пишутся
+    во временный файл, который переходит на диск при большом размере,
+    и отдаются клиенту частями.
+    """
+    extension = 'pdf'
+    content_type = 'application/pdf'
+    font_size = 12
+    line_height = 18
+    margin = 50
+
+    def get_font(self):
+        return register_font(settings.SHOPPING_LIST_FONT)
+
+    def stream(self):
+        with SpooledTemporaryFile(max_size=CHUNK_SIZE * 16) as buffer:
+            self.write_pdf(buffer)
+            buffer.seek(0)
+            chunk = buffer.read(CHUNK_SIZE)
+            while chunk:
+                yield chunk
+                chunk = buffer.read(CHUNK_SIZE)
+
+    def write_pdf(self, buffer):
+        font = self.get_font()
+        width, height = A4
+        page = canvas.Canvas(buffer, pagesize=A4)
+        page.setTitle(self.title)
+        page.setFont(font, self.font_size + 4)
+        page.drawString(self.margin, height - self.margin, self.title)
+        y = height - self.margin - self.line_height * 2
+        page.setFont(font, self.font_size)
+        for name, measurement_unit, amount in self.rows:
+            if y < self.margin:
+                page.showPage()
+                page.setFont(font, self.font_size)
+                y = height - self.margin
+            page.drawString(
+                self.margin, y, f'• {name} ({measurement_unit}) — {amount}'
+            )
+            y -= self.line_height
+        page.save()
+
+
+EXPORTERS = {
+    exporter.extension: exporter
+    for exporter in (CSVExporter, TextExporter, PDFExporter)
+}
@@ -0,0 +1,42 @@
+from django.core.files.storage import default_storage
+from drf_extra_fields.fields import Base64ImageField
+
+from api.images import content_name, thumbnail_name
+
+
+def thumbnail_url(file, size, request=None):
+    """Ссылка на уменьшенную копию картинки, пока её нет — на оригинал.
+
+    Готовность копий хранится в рецепте, хранилище не опрашивается.
+    """
+    if not file:
+        return None
+    url = (
+        default_storage.url(thumbnail_name(file.name, size))
+        if getattr(file.instance, 'thumbnails_ready', False)
+        else file.url
+    )
+    if request is not None:
+        return request.build_absolute_uri(url)
+    return url
+
+
+class HashedBase64ImageField(Base64ImageField):
+    """Картинка в base64, сохраняемая под именем из хеша содержимого."""
+
+    def get_file_name(self, decoded_file):
+        return content_name(decoded_file)
+
+
+class ThumbnailImageField(HashedBase64ImageField):
+    """Отдаёт ссылку на уменьшенную копию нужного размера.
+
+    Пока копия не создана, отдаётся оригинал.
+    """
+
+    def __init__(self, size, **kwargs):
+        self.size = size
+        super().__init__(**kwargs)
+
+    def to_representation(self, file):
+        return thumbnail_url(file, self.size, self.context.get('request'))
@@ -1,22 +1,32 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db.models import Case, When
 from django_filters import rest_framework as filters
 
-from recipes.models import Ingredient, Recipe, Tag
+from recipes.models import Ingredient, Recipe
+
+from api.autocomplete import get_ingredient_index
+from api.cache import tags_cache
+from api.search import search_recipes
 
 User = get_user_model()
 
 
+def get_tag_choices():
+    return [(tag['slug'], tag['name']) for tag in tags_cache.get().data]
+
+
 class RecipeFilter(filters.FilterSet):
     """ Фильтр для рецептов """
-    tags = filters.ModelMultipleChoiceFilter(
+    tags = filters.MultipleChoiceFilter(
         field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all()
+        choices=get_tag_choices
     )
     is_favorited = filters.BooleanFilter(
         method='get_favorite', label='Favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='get_shopping', label='Is in shopping list')
+    search = filters.CharFilter(method='get_search', label='Search')
 
     class Meta:
         model = Recipe
@@ -24,36 +34,47 @@ class RecipeFilter(filters.FilterSet):
             'is_favorited',
             'author',
             'tags',
-            'is_in_shopping_cart'
+            'is_in_shopping_cart',
+            'search'
         )
 
-    def get_favorite(self, queryset, name, value):
-
+    def filter_user_flag(self, queryset, annotation, value):
+        """ Фильтр по флагу из with_user_flags, дополняющий queryset """
         user = self.request.user
-        if value:
-            return Recipe.objects.filter(
-                favorite_recipe__user=user
-            )
-        return Recipe.objects.all().exclude(
-            favorite_recipe__user=user
-        )
+        if user.is_anonymous:
+            return queryset.none() if value else queryset
+        if annotation not in queryset.query.annotations:
+            queryset = queryset.with_user_flags(user)
+        return queryset.filter(**{annotation: value})
+
+    def get_favorite(self, queryset, name, value):
+        return self.filter_user_flag(queryset, 'is_favorited', value)
 
     def get_shopping(self, queryset, name, value):
-        user = self.request.user
-        if value:
-            return Recipe.objects.filter(
-                shopping_cart__user=user
-            )
-        return Recipe.objects.all().exclude(
-            favorite_recipe__user=user
-        )
+        return self.filter_user_flag(queryset, 'is_in_shopping_cart', value)
+
+    def get_search(self, queryset, name, value):
+        """ Поиск по названию, ингредиентам и описанию """
+        if not value.strip():
+            return queryset
+        return search_recipes(queryset, value)
 
 
 class IngredientFilter(filters.FilterSet):
-    name = filters.CharFilter(
-        lookup_expr='startswith'
-    )
+    """ Подсказки ингредиентов: сначала по началу названия """
+    name = filters.CharFilter(method='get_name')
 
     class Meta:
         model = Ingredient
         fields = ['name', ]
+
+    def get_name(self, queryset, name, value):
+        ids = get_ingredient_index().search(
+            value,
+            settings.INGREDIENT_SEARCH_LIMIT
+        )
+        if not ids:
+            return queryset.none()
+        return queryset.filter(pk__in=ids).order_by(Case(
+            *(When(pk=pk, then=position) for position, pk in enumerate(ids))
+        ))
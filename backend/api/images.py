@@ -0,0 +1,98 @@
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from threading import Lock
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image
+
+THUMBNAILS_DIR = 'recipes/thumbnails'
+# Расширение файла и формат Pillow. JPEG отдаётся всем клиентам,
+# WebP лежит рядом с ним под тем же именем с суффиксом .webp.
+THUMBNAIL_FORMATS = (('jpg', 'JPEG'), ('jpg.webp', 'WEBP'))
+
+_executor = None
+_executor_lock = Lock()
+
+
+def content_name(data):
+    """Имя файла по его содержимому: одинаковые картинки не дублируются,
+    а файл с таким именем никогда не меняется."""
+    return hashlib.sha256(data).hexdigest()[:32]
+
+
+def thumbnail_name(name, size, extension='jpg'):
+    stem = os.path.splitext(os.path.basename(name))[0]
+    return f'{THUMBNAILS_DIR}/{stem}_{size}.{extension}'
+
+
+def thumbnail_names(name):
+    return [
+        (size, extension, image_format, thumbnail_name(name, size, extension))
+        for size in settings.RECIPE_THUMBNAIL_SIZES
+        for extension, image_format in THUMBNAIL_FORMATS
+    ]
+
+
+def open_rgb(name):
+    with default_storage.open(name) as source:
+        image = Image.open(source)
+        image.load()
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def make_thumbnails(name):
+    """Создаёт уменьшенные копии изображения во всех размерах и форматах.
+
+    Готовые копии не пересоздаются. Возвращает True, если была создана
+    хотя бы одна копия.
+    """
+    missing = [
+        item for item in thumbnail_names(name)
+        if not default_storage.exists(item[3])
+    ]
+    if not missing:
+        return False
+    image = open_rgb(name)
+    resized = {}
+    for size, extension, image_format, target in missing:
+        if size not in resized:
+            resized[size] = image.copy()
+            resized[size].thumbnail(
+                settings.RECIPE_THUMBNAIL_SIZES[size], Image.LANCZOS
+            )
+        buffer = BytesIO()
+        resized[size].save(
+            buffer,
+            image_format,
+            quality=settings.RECIPE_THUMBNAIL_QUALITY,
+            optimize=True
+        )
+        if not default_storage.exists(target):
+            default_storage.save(target, ContentFile(buffer.getvalue()))
+    return True
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_WORKERS,
+                thread_name_prefix='thumbnails'
+            )
+    return _executor
+
+
+def schedule_thumbnails(name):
+    """Ставит создание копий в очередь пула потоков, не задерживая
+    ответ на запрос."""
+    return get_executor().submit(make_thumbnails, name)
@@ -0,0 +1,82 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.versions import bump_version
+from scripts.import_data import IMPORT_MODELS, BulkLoader, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает ингредиенты или теги из CSV, JSON или JSON Lines '
+        'пакетами с пропуском дублей.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', choices=sorted(IMPORT_MODELS))
+        parser.add_argument('file_path')
+        parser.add_argument(
+            '--format',
+            dest='file_format',
+            choices=('csv', 'json', 'jsonl'),
+            help='Формат файла, по умолчанию по расширению.'
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Проверить файл и посчитать изменения без записи.'
+        )
+        parser.add_argument(
+            '--upsert',
+            action='store_true',
+            help='Обновлять существующие записи с тем же ключом.'
+        )
+        parser.add_argument(
+            '--no-copy',
+            action='store_true',
+            help='Не использовать COPY на PostgreSQL.'
+        )
+        parser.add_argument(
+            '--show-errors',
+            type=int,
+            default=10,
+            help='Сколько отклонённых строк вывести.'
+        )
+
+    def handle(self, *args, **options):
+        file_path = options['file_path']
+        if not os.path.isfile(file_path):
+            raise CommandError(f'Файл {file_path} не найден.')
+        file_format = options['file_format'] or (
+            os.path.splitext(file_path)[1].lstrip('.').lower() or 'csv'
+        )
+        if file_format not in ('csv', 'json', 'jsonl'):
+            raise CommandError(f'Неизвестный формат: {file_format}.')
+        model, fields, key_fields = IMPORT_MODELS[options['model']]
+        loader = BulkLoader(
+            model,
+            fields,
+            key_fields,
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+            upsert=options['upsert'],
+            use_copy=not options['no_copy'],
+            max_rejected=options['show_errors']
+        )
+        loader.load(read_rows(file_path, fields, file_format))
+        if not options['dry_run']:
+            # Пакетная запись не вызывает сигналы моделей.
+            bump_version(options['model'])
+
+        for number, row, errors in loader.rejected:
+            self.stderr.write(f'Строка {number}: {row} — {errors}')
+        speed = loader.total / loader.elapsed if loader.elapsed else 0
+        prefix = 'Проверка без записи. ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix}Модель: {model.__name__}; строк: {loader.total}; '
+            f'добавлено: {loader.created}; обновлено: {loader.updated}; '
+            f'дублей: {loader.duplicates}; '
+            f'отклонено: {loader.rejected_count}; '
+            f'{speed:.0f} строк/с'
+        ))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+
+from api.versions import bump_version
+from api.images import make_thumbnails
+
+
+class Command(BaseCommand):
+    help = 'Создаёт уменьшенные копии картинок рецептов, которых ещё нет.'
+
+    def handle(self, *args, **options):
+        created = 0
+        names = Recipe.objects.exclude(image='').values_list(
+            'image', flat=True
+        ).distinct()
+        ready = 0
+        for name in names.iterator():
+            try:
+                created += make_thumbnails(name)
+            except (OSError, ValueError) as error:
+                self.stderr.write(f'{name}: {error}')
+                continue
+            ready += Recipe.objects.filter(
+                image=name, thumbnails_ready=False
+            ).update(thumbnails_ready=True)
+        if ready:
+            bump_version('recipes')
+        self.stdout.write(self.style.SUCCESS(
+            f'Картинок с новыми копиями: {created}.'
+        ))
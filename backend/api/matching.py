@@ -0,0 +1,332 @@
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from itertools import chain
+from threading import Lock
+
+from recipes.models import IngredientRecipe, Recipe
+
+from api.bitmaps import CHUNK_BITS, OFFSET_MASK, Bitmap, iter_bits
+from api.changes import get_journal_state, read_changes
+from api.replicas import use_primary
+from api.versions import bump_version, get_version
+
+INDEX_VERSION = 'matching'
+
+_index = None
+_index_lock = Lock()
+
+
+class RecipeIngredientIndex:
+    """Битовые карты рецептов по ингредиентам и тегам.
+
+    Рецепты пронумерованы по возрастанию id, для каждого ингредиента
+    и тега хранится сжатая битовая карта рецептов, где он есть, а для
+    каждого числа ингредиентов — карта рецептов с таким составом.
+    Совпадения считаются побитовыми операциями поблочно, изменения
+    рецептов применяются к картам без пересборки.
+    """
+
+    def __init__(self, recipe_ids, ingredients, tags):
+        self.recipe_ids = array('q', recipe_ids)
+        self.version = None
+        self.changes = 0
+        self.lock = Lock()
+        positions = {pk: number for number, pk in enumerate(self.recipe_ids)}
+        totals = [0] * len(self.recipe_ids)
+        by_ingredient = defaultdict(list)
+        for recipe, ingredient in ingredients:
+            position = positions.get(recipe)
+            if position is not None:
+                by_ingredient[ingredient].append(position)
+                totals[position] += 1
+        by_tag = defaultdict(list)
+        for recipe, tag in tags:
+            position = positions.get(recipe)
+            if position is not None:
+                by_tag[tag].append(position)
+        by_total = defaultdict(list)
+        for position, total in enumerate(totals):
+            if total:
+                by_total[total].append(position)
+        self.ingredients = {
+            key: Bitmap.from_sorted(sorted(set(value)))
+            for key, value in by_ingredient.items()
+        }
+        self.tags = {
+            key: Bitmap.from_sorted(sorted(set(value)))
+            for key, value in by_tag.items()
+        }
+        self.by_total = {
+            key: Bitmap.from_sorted(value) for key, value in by_total.items()
+        }
+
+    def __len__(self):
+        return len(self.recipe_ids)
+
+    def size(self):
+        """Примерный объём битовых карт в байтах."""
+        return sum(
+            bitmap.size() for bitmaps in (
+                self.ingredients, self.tags, self.by_total
+            ) for bitmap in bitmaps.values()
+        ) + self.recipe_ids.itemsize * len(self.recipe_ids)
+
+    @staticmethod
+    def count(bitmaps):
+        """Поразрядные счётчики: бит n числа counters[i] — i-й разряд
+        количества карт, в которых есть рецепт n."""
+        counters = []
+        for carry in bitmaps:
+            for digit, counter in enumerate(counters):
+                counters[digit], carry = counter ^ carry, counter & carry
+                if not carry:
+                    break
+            if carry:
+                counters.append(carry)
+        return counters
+
+    @staticmethod
+    def equal(counters, value, candidates):
+        """Рецепты из candidates, у которых счётчик равен value."""
+        if value >> len(counters):
+            return 0
+        result = candidates
+        for digit, counter in enumerate(counters):
+            result &= counter if value >> digit & 1 else ~counter
+        return result
+
+    @staticmethod
+    def union(bitmaps, number):
+        result = 0
+        for bitmap in bitmaps:
+            result |= bitmap.chunk(number)
+        return result
+
+    def candidates(self, have, required, excluded, tags):
+        """Рецепты хотя бы с одним имеющимся ингредиентом, со всеми
+        обязательными, без исключённых и с любым из тегов — битовые
+        карты по номерам блоков."""
+        have = [self.ingredients[pk] for pk in have if pk in self.ingredients]
+        required = [self.ingredients.get(pk) for pk in required]
+        excluded = [
+            self.ingredients[pk] for pk in excluded if pk in self.ingredients
+        ]
+        tag_bitmaps = [self.tags[slug] for slug in tags if slug in self.tags]
+        if not all(required) or (tags and not tag_bitmaps):
+            return {}
+        chunks = set().union(*(bitmap.chunks() for bitmap in have))
+        for bitmap in required:
+            chunks &= bitmap.chunks()
+        if tags:
+            chunks &= set().union(
+                *(bitmap.chunks() for bitmap in tag_bitmaps)
+            )
+        result = {}
+        for number in chunks:
+            bits = self.union(have, number)
+            for bitmap in required:
+                bits &= bitmap.chunk(number)
+            bits &= ~self.union(excluded, number)
+            if tags:
+                bits &= self.union(tag_bitmaps, number)
+            if bits:
+                result[number] = bits
+        return result
+
+    def match(self, ingredients, required=(), excluded=(), tags=(),
+              limit=10):
+        """Рецепты с наибольшей долей имеющихся ингредиентов.
+
+        Возвращает список (id рецепта, совпало ингредиентов, всего
+        ингредиентов). При равной доле выше рецепты с большим числом
+        совпадений, затем более новые.
+        """
+        have = set(ingredients) | set(required)
+        if limit < 1:
+            return []
+        with self.lock:
+            candidates = self.candidates(have, required, excluded, tags)
+            if not candidates:
+                return []
+            have = [
+                self.ingredients[pk] for pk in have if pk in self.ingredients
+            ]
+            counters = {
+                number: self.count(
+                    bitmap.chunk(number) & bits for bitmap in have
+                )
+                for number, bits in candidates.items()
+            }
+            chunks = sorted(candidates, reverse=True)
+            pairs = sorted(
+                (
+                    (matched, total) for total in self.by_total
+                    for matched in range(1, min(total, len(have)) + 1)
+                ),
+                key=lambda pair: (-pair[0] / pair[1], -pair[0])
+            )
+            equal = {}
+            result = []
+            for matched, total in pairs:
+                by_total = self.by_total[total]
+                for number in chunks:
+                    if (number, matched) not in equal:
+                        equal[number, matched] = self.equal(
+                            counters[number], matched, candidates[number]
+                        )
+                    bucket = equal[number, matched] & by_total.chunk(number)
+                    for offset in iter_bits(bucket):
+                        result.append((
+                            self.recipe_ids[number << CHUNK_BITS | offset],
+                            matched,
+                            total
+                        ))
+                        if len(result) == limit:
+                            return result
+            return result
+
+    def get_positions(self, recipes):
+        """Позиции изменённых рецептов, новые рецепты дописываются
+        в конец. None — если новый рецепт старше последнего в индексе
+        и порядок позиций нарушился бы."""
+        positions = {}
+        added = []
+        for pk, state in recipes.items():
+            position = bisect_left(self.recipe_ids, pk)
+            if (
+                position < len(self.recipe_ids)
+                and self.recipe_ids[position] == pk
+            ):
+                positions[pk] = position
+            elif state is not None:
+                if position < len(self.recipe_ids):
+                    return None
+                added.append(pk)
+        for pk in sorted(added):
+            positions[pk] = len(self.recipe_ids)
+            self.recipe_ids.append(pk)
+        return positions
+
+    def discard(self, positions):
+        """Убирает позиции из всех карт."""
+        blocks = defaultdict(list)
+        for position in sorted(positions):
+            blocks[position >> CHUNK_BITS].append(position & OFFSET_MASK)
+        masks = {
+            number: sum(1 << offset for offset in offsets)
+            for number, offsets in blocks.items()
+        }
+        for bitmaps in (self.ingredients, self.tags, self.by_total):
+            for key, bitmap in list(bitmaps.items()):
+                for number, offsets in blocks.items():
+                    bitmap.discard_chunk(number, offsets, masks[number])
+                if not bitmap:
+                    del bitmaps[key]
+
+    def update(self, recipes):
+        """Применяет текущее состояние рецептов.
+
+        recipes — словарь: id рецепта → (id ингредиентов, slug тегов)
+        или None для удалённого рецепта. False — если индекс нужно
+        собрать заново.
+        """
+        with self.lock:
+            positions = self.get_positions(recipes)
+            if positions is None:
+                return False
+            self.discard(positions.values())
+            for pk, state in recipes.items():
+                if state is None or pk not in positions:
+                    continue
+                position = positions[pk]
+                ingredients, tags = state
+                for ingredient in ingredients:
+                    self.ingredients.setdefault(ingredient, Bitmap()).add(
+                        position
+                    )
+                for tag in tags:
+                    self.tags.setdefault(tag, Bitmap()).add(position)
+                if ingredients:
+                    self.by_total.setdefault(
+                        len(ingredients), Bitmap()
+                    ).add(position)
+            return True
+
+
+def load_index():
+    return RecipeIngredientIndex(
+        Recipe.objects.order_by('pk').values_list('pk', flat=True),
+        IngredientRecipe.objects.values_list(
+            'recipe', 'ingredient'
+        ).order_by().iterator(),
+        Recipe.tags.through.objects.values_list(
+            'recipe', 'tag__slug'
+        ).order_by().iterator()
+    )
+
+
+def load_recipes(recipe_ids):
+    """Текущие ингредиенты и теги рецептов, None — для удалённых."""
+    recipes = dict.fromkeys(recipe_ids)
+    for pk in Recipe.objects.filter(pk__in=recipes).values_list(
+        'pk', flat=True
+    ):
+        recipes[pk] = ([], [])
+    existing = [pk for pk, state in recipes.items() if state is not None]
+    for recipe, ingredient in IngredientRecipe.objects.filter(
+        recipe__in=existing
+    ).values_list('recipe', 'ingredient'):
+        recipes[recipe][0].append(ingredient)
+    for recipe, tag in Recipe.tags.through.objects.filter(
+        recipe__in=existing
+    ).values_list('recipe', 'tag__slug'):
+        recipes[recipe][1].append(tag)
+    return recipes
+
+
+def invalidate_recipe_ingredient_index():
+    """Индексы всех процессов соберутся заново, например после
+    изменения slug тега."""
+    bump_version(INDEX_VERSION)
+
+
+def catch_up(index, changes):
+    """Применяет к индексу записи журнала изменений рецептов до номера
+    changes. False — если применить нечего и индекс нужно собрать
+    заново."""
+    applied = read_changes(index.changes, changes)
+    if applied is None:
+        return False
+    with use_primary():
+        recipes = load_recipes(set(chain.from_iterable(applied)))
+    if not index.update(recipes):
+        return False
+    index.changes += len(applied)
+    return True
+
+
+def get_recipe_ingredient_index():
+    """Индекс, догнавший журнал изменений рецептов."""
+    global _index
+    journal_version, changes = get_journal_state()
+    version = (get_version(INDEX_VERSION), journal_version)
+    index = _index
+    if (
+        index is not None
+        and index.version == version
+        and index.changes == changes
+    ):
+        return index
+    with _index_lock:
+        index = _index
+        if (
+            index is None
+            or index.version != version
+            or index.changes != changes and not catch_up(index, changes)
+        ):
+            with use_primary():
+                index = load_index()
+            index.version, index.changes = version, changes
+            _index = index
+    return _index
@@ -0,0 +1,258 @@
+import logging
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+from threading import Lock
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+from rest_framework.renderers import JSONRenderer
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0
+
+    def observe(self, value):
+        for number, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[number] += 1
+        self.total += 1
+        self.sum += value
+
+
+class EndpointMetrics:
+    def __init__(self):
+        self.requests = 0
+        self.queries = 0
+        self.db_seconds = 0
+        self.serialize_seconds = 0
+        self.render_seconds = 0
+        self.response_bytes = 0
+        self.duration = Histogram(DURATION_BUCKETS)
+        self.queries_per_request = Histogram(QUERY_BUCKETS)
+
+
+class Registry:
+    """Накопленные метрики процесса по представлениям и методам."""
+
+    def __init__(self):
+        self.endpoints = defaultdict(EndpointMetrics)
+        self.lock = Lock()
+
+    def record(self, view, method, status, request_metrics, duration,
+               size):
+        with self.lock:
+            endpoint = self.endpoints[(view, method, status)]
+            endpoint.requests += 1
+            endpoint.queries += request_metrics.queries
+            endpoint.db_seconds += request_metrics.db_seconds
+            endpoint.serialize_seconds += request_metrics.serialize_seconds
+            endpoint.render_seconds += request_metrics.render_seconds
+            endpoint.response_bytes += size
+            endpoint.duration.observe(duration)
+            endpoint.queries_per_request.observe(request_metrics.queries)
+
+    def render(self):
+        """Метрики в текстовом формате Prometheus."""
+        with self.lock:
+            endpoints = sorted(self.endpoints.items())
+            lines = []
+            counters = (
+                ('requests_total', 'Количество запросов.', 'requests'),
+                ('db_queries_total', 'Количество SQL-запросов.', 'queries'),
+                ('db_seconds_total', 'Время в базе данных.', 'db_seconds'),
+                ('serialize_seconds_total', 'Время сериализации ответа.',
+                 'serialize_seconds'),
+                ('render_seconds_total', 'Время кодирования ответа в JSON.',
+                 'render_seconds'),
+                ('response_bytes_total', 'Размер ответов.',
+                 'response_bytes'),
+            )
+            for name, description, attribute in counters:
+                lines.append(f'# HELP foodgram_{name} {description}')
+                lines.append(f'# TYPE foodgram_{name} counter')
+                for labels, endpoint in endpoints:
+                    lines.append(
+                        f'foodgram_{name}{{{self.labels(*labels)}}} '
+                        f'{getattr(endpoint, attribute)}'
+                    )
+            histograms = (
+                ('request_duration_seconds', 'Время ответа.', 'duration'),
+                ('db_queries_per_request', 'SQL-запросов на один запрос.',
+                 'queries_per_request'),
+            )
+            for name, description, attribute in histograms:
+                lines.append(f'# HELP foodgram_{name} {description}')
+                lines.append(f'# TYPE foodgram_{name} histogram')
+                for labels, endpoint in endpoints:
+                    lines.extend(self.histogram_lines(
+                        f'foodgram_{name}',
+                        self.labels(*labels),
+                        getattr(endpoint, attribute)
+                    ))
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def labels(view, method, status):
+        return f'view="{view}",method="{method}",status="{status}"'
+
+    @staticmethod
+    def histogram_lines(name, labels, histogram):
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {count}'
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {histogram.total}'
+        yield f'{name}_sum{{{labels}}} {histogram.sum}'
+        yield f'{name}_count{{{labels}}} {histogram.total}'
+
+
+registry = Registry()
+
+
+class RequestMetrics:
+    """Метрики одного запроса и обёртка для выполнения SQL."""
+
+    def __init__(self, keep_sql=False):
+        self.queries = 0
+        self.db_seconds = 0
+        self.serialize_seconds = 0
+        self.serializing = False
+        self.render_seconds = 0
+        self.keep_sql = keep_sql
+        self.sql = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_seconds += time.perf_counter() - started
+            self.queries += 1
+            if self.keep_sql:
+                self.sql.append(sql)
+
+
+class TimedSerializerMixin:
+    """Отмечает в метриках запроса время, за которое сериализатор
+    строит данные ответа, вместе с SQL-запросами, которые он делает сам.
+
+    Вложенные сериализаторы, в том числе вызванные из методов полей,
+    не считаются второй раз.
+    """
+
+    def to_representation(self, instance):
+        request = self.context.get('request')
+        request_metrics = getattr(request, 'metrics', None)
+        if request_metrics is None or request_metrics.serializing:
+            return super().to_representation(instance)
+        request_metrics.serializing = True
+        started = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            request_metrics.serialize_seconds += (
+                time.perf_counter() - started
+            )
+            request_metrics.serializing = False
+
+
+class TimedJSONRenderer(JSONRenderer):
+    """JSONRenderer, отмечающий в метриках запроса время кодирования
+    данных ответа в JSON."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        started = time.perf_counter()
+        try:
+            return super().render(data, accepted_media_type, renderer_context)
+        finally:
+            request = (renderer_context or {}).get('request')
+            request_metrics = getattr(request, 'metrics', None)
+            if request_metrics is not None:
+                request_metrics.render_seconds += (
+                    time.perf_counter() - started
+                )
+
+
+class MetricsMiddleware:
+    """Количество и время SQL-запросов, время сериализации, время
+    кодирования в JSON и размер ответа по каждому представлению.
+
+    Для запросов, превысивших QUERY_LOG_THRESHOLD SQL-запросов,
+    в лог пишется их SQL. При SERVER_TIMING те же данные отдаются
+    в заголовке Server-Timing.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        threshold = settings.QUERY_LOG_THRESHOLD
+        request.metrics = RequestMetrics(keep_sql=threshold > 0)
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(request.metrics)
+                )
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+        view = self.get_view_name(request)
+        size = (
+            int(response.get('Content-Length', 0)) if response.streaming
+            else len(response.content)
+        )
+        registry.record(
+            view,
+            request.method,
+            response.status_code,
+            request.metrics,
+            duration,
+            size
+        )
+        if 0 < threshold < request.metrics.queries:
+            logger.warning(
+                '%s %s: %s SQL-запросов\n%s',
+                request.method,
+                view,
+                request.metrics.queries,
+                '\n'.join(request.metrics.sql)
+            )
+        if settings.SERVER_TIMING:
+            response['Server-Timing'] = self.server_timing(
+                request.metrics, duration
+            )
+        return response
+
+    @staticmethod
+    def get_view_name(request):
+        match = getattr(request, 'resolver_match', None)
+        if match is None or not match.url_name:
+            return 'unmatched'
+        return match.url_name
+
+    @staticmethod
+    def server_timing(request_metrics, duration):
+        return (
+            f'db;dur={request_metrics.db_seconds * 1000:.1f};'
+            f'desc="{request_metrics.queries} queries", '
+            f'serialize;dur={request_metrics.serialize_seconds * 1000:.1f}, '
+            f'render;dur={request_metrics.render_seconds * 1000:.1f}, '
+            f'total;dur={duration * 1000:.1f}'
+        )
+
+
+def metrics_view(request):
+    """Метрики для Prometheus. Nginx не проксирует этот адрес наружу."""
+    return HttpResponse(
+        registry.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
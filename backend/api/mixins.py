@@ -1,9 +1,149 @@
+import hashlib
+from urllib.parse import urlencode
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import quote_etag
 from rest_framework import mixins, viewsets
 
+from api.cache import get_cached_response
 from api.permissions import IsAuthorAdminOrReadOnly
+from api.replicas import read_from_replica
+from api.versions import get_versions, user_version_name
+
+
+class ConditionalGetMixin:
+    """ETag для list и retrieve.
+
+    ETag строится из версий данных в кэше, поэтому ответ 304 отдаётся
+    без запросов к базе и сериализации. В него входят формат ответа,
+    а для personalized — пользователь и версия его отметок.
+    Last-Modified не отдаётся: версии — время записи с точностью
+    до секунды и по часам разных процессов, две записи за секунду
+    дали бы ложный 304 на If-Modified-Since.
+
+    Ответ, прочитанный с реплики, отдаётся без валидаторов: отстающая
+    реплика вернула бы старые данные под ETag новых версий, и клиент
+    получал бы на них 304, пока версии не сменятся.
+    """
+    version_names = ()
+    personalized = False
+
+    def get_etag(self, request):
+        names = list(self.version_names)
+        user = request.user
+        if self.personalized and user.is_authenticated:
+            names.append(user_version_name(user))
+        parts = [
+            request.path,
+            request.GET.urlencode(),
+            request.accepted_renderer.format
+        ]
+        if self.personalized:
+            parts.append(str(user.pk))
+        parts.extend(repr(version) for version in get_versions(*names))
+        return quote_etag(hashlib.md5('|'.join(parts).encode()).hexdigest())
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        etag = self.get_etag(request)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304) and not read_from_replica():
+            response['ETag'] = etag
+        patch_vary_headers(response, ('Accept',))
+        if self.personalized:
+            patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+
+class AnonymousResponseCacheMixin:
+    """Готовые ответы list и retrieve для анонимных пользователей.
+
+    У анонимного пользователя все отметки в ответе ложные, поэтому
+    ответ общий для всех. Ключ — адрес с параметрами в порядке имён
+    и версии данных из version_names: любая запись меняет версию,
+    и старые ответы больше не читаются. Ответ собирается с той базы,
+    которую выбрал запрос, в том числе с реплики.
+    """
+    version_names = ()
+
+    def get_response_key(self, request):
+        parts = [
+            request.get_host(),
+            request.path,
+            urlencode(sorted(request.query_params.lists()), doseq=True)
+        ]
+        parts.extend(
+            repr(version) for version in get_versions(*self.version_names)
+        )
+        return hashlib.md5('|'.join(parts).encode()).hexdigest()
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if (
+            request.user.is_authenticated
+            or request.accepted_renderer.format != 'json'
+        ):
+            return handler(request, *args, **kwargs)
+
+        def build():
+            response = handler(request, *args, **kwargs)
+            response.accepted_renderer = request.accepted_renderer
+            response.accepted_media_type = request.accepted_media_type
+            response.renderer_context = self.get_renderer_context()
+            return response.render()
+
+        return get_cached_response(self.get_response_key(request), build)
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+
+class CatalogCacheMixin:
+    """Справочник из кэша для JSON-запросов без параметров.
+
+    Готовый JSON отдаётся без обращения к базе. Остальные форматы,
+    например Browsable API, собираются сериализатором.
+    """
+    catalog_cache = None
+
+    def use_catalog(self, request):
+        return (
+            self.catalog_cache is not None
+            and not request.query_params
+            and request.accepted_renderer.format == 'json'
+        )
+
+    def list(self, request, *args, **kwargs):
+        if not self.use_catalog(request):
+            return super().list(request, *args, **kwargs)
+        return self.catalog_cache.get().list_response()
+
+    def retrieve(self, request, *args, **kwargs):
+        if not self.use_catalog(request):
+            return super().retrieve(request, *args, **kwargs)
+        return self.catalog_cache.get().retrieve_response(
+            kwargs[self.lookup_url_kwarg or self.lookup_field]
+        )
 
 
 class RetrieveListViewSet(
+    ConditionalGetMixin,
+    CatalogCacheMixin,
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
     viewsets.GenericViewSet
@@ -1,5 +1,200 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from base64 import b64decode, b64encode
+from binascii import Error as BinasciiError
+from collections import OrderedDict
+from datetime import datetime
 
+from django.db import models
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
-class FollowPagination(PageNumberPagination):
+from recipes.models import TimelineEntry
+
+
+def parse_cursor_value(field, value):
+    """Значение из курсора в типе поля модели, None — если оно
+    не подходит к полю."""
+    if isinstance(field, models.DateTimeField):
+        if not isinstance(value, str):
+            return None
+        try:
+            return parse_datetime(value)
+        except ValueError:
+            return None
+    if isinstance(field, (models.AutoField, models.IntegerField)):
+        if isinstance(value, int) and not isinstance(value, bool):
+            return value
+    return None
+
+
+class KeysetPagination(BasePagination):
+    """Курсорная пагинация по набору полей сортировки.
+
+    Курсор хранит значения полей последней записи страницы, следующая
+    страница выбирается условием по этим значениям, а не OFFSET.
+    Поэтому глубокие страницы не замедляются, а новые записи не
+    сдвигают уже выданные. Общее количество записей не считается.
+
+    Курсор работает только с сортировкой ordering: с другой, например
+    по релевантности поиска, запрос отклоняется.
+    """
+    ordering = ('-pub_date', '-id')
+    page_size = api_settings.PAGE_SIZE
+    max_page_size = 100
+    cursor_query_param = 'cursor'
     page_size_query_param = 'limit'
+    invalid_cursor_message = 'Неверный курсор.'
+    ordering_message = 'Курсор недоступен при сортировке по релевантности.'
+
+    def get_page_size(self, request):
+        value = request.query_params.get(self.page_size_query_param, '')
+        if value.isdigit() and int(value) > 0:
+            return min(int(value), self.max_page_size)
+        return self.page_size
+
+    def decode_cursor(self, request, model):
+        """Значения полей сортировки из курсора, проверенные по типам
+        полей модели."""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            values = json.loads(b64decode(encoded.encode()).decode())
+        except (BinasciiError, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        parsed = [
+            parse_cursor_value(model._meta.get_field(field.lstrip('-')), value)
+            for field, value in zip(self.ordering, values)
+        ]
+        if None in parsed:
+            raise NotFound(self.invalid_cursor_message)
+        return parsed
+
+    def encode_cursor(self, instance):
+        values = []
+        for field in self.ordering:
+            value = getattr(instance, field.lstrip('-'))
+            if isinstance(value, datetime):
+                value = value.isoformat()
+            values.append(value)
+        return b64encode(json.dumps(values).encode()).decode()
+
+    def get_cursor_filter(self, values):
+        """Условие «после курсора» для составного ключа сортировки."""
+        condition = Q()
+        equal = {}
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        order_by = tuple(queryset.query.order_by)
+        if order_by and order_by != self.ordering:
+            raise ValidationError({
+                self.cursor_query_param: self.ordering_message
+            })
+        queryset = queryset.order_by(*self.ordering)
+        cursor = self.decode_cursor(request, queryset.model)
+        if cursor is not None:
+            queryset = queryset.filter(self.get_cursor_filter(cursor))
+        results = list(queryset[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), 'page')
+        return replace_query_param(
+            url,
+            self.cursor_query_param,
+            self.encode_cursor(self.page[-1])
+        )
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data)
+        ]))
+
+
+class TimelinePagination(KeysetPagination):
+    """Курсорная пагинация ленты подписок.
+
+    Страница собирается из записей ленты и рецептов популярных авторов,
+    поэтому вместо фильтра по курсору запрашиваются id рецептов
+    после него. Рецептов, которых нет в queryset, на странице нет:
+    вместо них дочитываются следующие, пока страница не заполнится
+    или лента не закончится.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request, queryset.model)
+        after = None if cursor is None else tuple(cursor)
+        self.page = []
+        self.has_next = True
+        while self.has_next and len(self.page) < self.page_size:
+            size = self.page_size - len(self.page)
+            keys = TimelineEntry.objects.page(request.user, after, size + 1)
+            recipes = queryset.in_bulk([pk for _, pk in keys[:size]])
+            self.page.extend(
+                recipes[pk] for _, pk in keys[:size] if pk in recipes
+            )
+            self.has_next = len(keys) > size
+            after = keys[size - 1] if self.has_next else None
+        return self.page
+
+
+class SwitchablePagination(BasePagination):
+    """Постраничная пагинация с переходом на курсорную по запросу.
+
+    Курсорная включается параметром cursor или pagination=cursor.
+    """
+    page_number_class = PageNumberPagination
+    keyset_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        use_keyset = (
+            self.keyset_class.cursor_query_param in request.query_params
+            or request.query_params.get('pagination') == 'cursor'
+        )
+        paginator_class = (
+            self.keyset_class if use_keyset else self.page_number_class
+        )
+        self.paginator = paginator_class()
+        return self.paginator.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
+
+
+class LimitPageNumberPagination(PageNumberPagination):
+    page_size_query_param = 'limit'
+
+
+class FollowKeysetPagination(KeysetPagination):
+    ordering = ('id',)
+
+
+class RecipePagination(SwitchablePagination):
+    page_number_class = LimitPageNumberPagination
+
+
+class FollowPagination(SwitchablePagination):
+    page_number_class = LimitPageNumberPagination
+    keyset_class = FollowKeysetPagination
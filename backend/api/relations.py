@@ -0,0 +1,76 @@
+from django.core.cache import cache
+from django.db.models import IntegerField, Value
+
+from recipes.models import Favorite, ShoppingCart
+from users.models import Follow
+
+from api.replicas import use_primary
+from api.versions import bump_version, get_version, user_version_name
+
+RELATIONS_KEY = 'relations:{}:{}'
+RELATIONS_TIMEOUT = 60 * 60
+REQUEST_ATTRIBUTE = '_user_relations'
+FAVORITES, CART, FOLLOWING = range(3)
+
+
+class UserRelations:
+    """id избранных рецептов, рецептов в списке покупок и авторов,
+    на которых подписан пользователь."""
+
+    def __init__(self, favorites=(), cart=(), following=()):
+        self.favorites = frozenset(favorites)
+        self.cart = frozenset(cart)
+        self.following = frozenset(following)
+
+    @classmethod
+    def load(cls, user):
+        """Все три множества одним запросом."""
+        sets = ([], [], [])
+        kinds = (
+            (Favorite.objects.filter(user=user), 'recipe', FAVORITES),
+            (ShoppingCart.objects.filter(user=user), 'recipe', CART),
+            (Follow.objects.filter(user=user), 'author', FOLLOWING),
+        )
+        queries = [
+            queryset.annotate(
+                kind=Value(kind, output_field=IntegerField())
+            ).values_list(field, 'kind').order_by()
+            for queryset, field, kind in kinds
+        ]
+        for pk, kind in queries[0].union(*queries[1:], all=True):
+            sets[kind].append(pk)
+        return cls(*sets)
+
+
+ANONYMOUS_RELATIONS = UserRelations()
+
+
+def get_user_relations(request):
+    """Связи текущего пользователя.
+
+    В пределах запроса загружаются один раз, между запросами хранятся
+    в кэше под версией пользователя, которая меняется при каждой записи.
+    """
+    if request is None or request.user.is_anonymous:
+        return ANONYMOUS_RELATIONS
+    relations = getattr(request, REQUEST_ATTRIBUTE, None)
+    if relations is None:
+        user = request.user
+        key = RELATIONS_KEY.format(
+            user.pk,
+            get_version(user_version_name(user))
+        )
+        relations = cache.get(key)
+        if relations is None:
+            with use_primary():
+                relations = UserRelations.load(user)
+            cache.set(key, relations, RELATIONS_TIMEOUT)
+        setattr(request, REQUEST_ATTRIBUTE, relations)
+    return relations
+
+
+def invalidate_user_relations(request):
+    """Сбрасывает связи пользователя после изменения избранного,
+    списка покупок или подписок."""
+    bump_version(user_version_name(request.user))
+    setattr(request, REQUEST_ATTRIBUTE, None)
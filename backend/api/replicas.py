@@ -0,0 +1,121 @@
+"""Чтение с реплик PostgreSQL.
+
+Безопасные запросы к представлениям из REPLICA_VIEWS читают с одной
+реплики, выбранной на весь запрос, остальные запросы и все записи
+работают с основной базой. После собственных записей пользователь
+REPLICA_STICKY_SECONDS читает с основной базы, чтобы сразу видеть
+свои изменения, пока реплики их догоняют.
+"""
+import hashlib
+import random
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.permissions import SAFE_METHODS
+
+STICKY_KEY = 'primary:{}'
+PRIMARY = 'default'
+# Токены проверяются по основной базе: только что выданный токен
+# может ещё не дойти до реплики.
+PRIMARY_MODELS = {'authtoken.token'}
+
+_state = threading.local()
+
+
+def get_replica():
+    return getattr(_state, 'replica', None)
+
+
+def read_from_replica():
+    """Читал ли текущий запрос что-то с реплики."""
+    return getattr(_state, 'replica_reads', False)
+
+
+def mark_replica_read():
+    """Ответ запроса собран по данным с реплики, хотя сам запрос
+    базу не читал, — например, взят из кэша."""
+    _state.replica_reads = True
+
+
+@contextmanager
+def use_primary():
+    """Чтение с основной базы внутри блока.
+
+    Кэши, собираемые под версией данных, строятся с основной базы:
+    иначе отстающая реплика сохранила бы под новой версией старые
+    данные.
+    """
+    replica = get_replica()
+    _state.replica = None
+    try:
+        yield
+    finally:
+        _state.replica = replica
+
+
+class PrimaryReplicaRouter:
+    """Запись — в основную базу, чтение — с реплики, если запрос её
+    разрешил."""
+
+    def db_for_read(self, model, **hints):
+        replica = get_replica()
+        if replica is None or model._meta.label_lower in PRIMARY_MODELS:
+            return PRIMARY
+        _state.replica_reads = True
+        return replica
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
+
+
+def get_sticky_key(request):
+    authorization = request.META.get('HTTP_AUTHORIZATION')
+    if not authorization:
+        return None
+    return STICKY_KEY.format(
+        hashlib.sha256(authorization.encode()).hexdigest()
+    )
+
+
+class ReplicaRoutingMiddleware:
+    """Выбирает базу для чтения на время запроса и запоминает
+    пользователей, которые только что писали."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _state.replica_reads = False
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.replica = None
+        sticky_key = get_sticky_key(request)
+        if (
+            request.method not in SAFE_METHODS
+            and response.status_code < 400
+            and sticky_key is not None
+            and settings.DATABASE_REPLICAS
+        ):
+            cache.set(sticky_key, True, settings.REPLICA_STICKY_SECONDS)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (
+            not settings.DATABASE_REPLICAS
+            or request.method not in SAFE_METHODS
+            or request.resolver_match.url_name not in settings.REPLICA_VIEWS
+        ):
+            return
+        sticky_key = get_sticky_key(request)
+        if sticky_key is not None and cache.get(sticky_key):
+            return
+        _state.replica = random.choice(settings.DATABASE_REPLICAS)
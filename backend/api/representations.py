@@ -0,0 +1,106 @@
+"""Представления рецептов и подписок только для чтения.
+
+Сериализаторы DRF на каждый объект обходят свои поля и вызывают
+to_representation каждого поля. Здесь то же представление собирается
+функциями по заранее составленным спискам полей. Результат совпадает
+с DRF до байта, это проверяет tests/test_representations.py.
+"""
+from operator import attrgetter
+
+from api.fields import thumbnail_url
+from api.relations import get_user_relations
+from api.services import get_recipes_limit
+
+
+def compile_fields(*names):
+    """Пары (ключ, функция чтения атрибута) в порядке полей ответа."""
+    return tuple((name, attrgetter(name)) for name in names)
+
+
+USER_FIELDS = compile_fields(
+    'email', 'id', 'username', 'first_name', 'last_name'
+)
+TAG_FIELDS = compile_fields('id', 'name', 'color', 'slug')
+
+
+def represent(instance, fields):
+    return {name: get(instance) for name, get in fields}
+
+
+def represent_ingredient(item):
+    ingredient = item.ingredient
+    return {
+        'id': ingredient.id,
+        'name': ingredient.name,
+        'measurement_unit': ingredient.measurement_unit,
+        'amount': item.amount,
+    }
+
+
+def represent_user(user, relations):
+    data = represent(user, USER_FIELDS)
+    data['is_subscribed'] = user.id in relations.following
+    return data
+
+
+def represent_short_recipe(recipe, size, request=None):
+    return {
+        'id': recipe.id,
+        'name': recipe.name,
+        'image': thumbnail_url(recipe.image, size, request),
+        'cooking_time': recipe.cooking_time,
+    }
+
+
+def represent_recipe(recipe, size, request):
+    relations = get_user_relations(request)
+    return {
+        'id': recipe.id,
+        'tags': [represent(tag, TAG_FIELDS) for tag in recipe.tags.all()],
+        'author': represent_user(recipe.author, relations),
+        'ingredients': [
+            represent_ingredient(item)
+            for item in recipe.ingredient_recipe.all()
+        ],
+        'is_favorited': recipe.id in relations.favorites,
+        'is_in_shopping_cart': recipe.id in relations.cart,
+        'name': recipe.name,
+        'image': thumbnail_url(recipe.image, size, request),
+        'text': recipe.text,
+        'cooking_time': recipe.cooking_time,
+    }
+
+
+def represent_subscription(author, recipe_size, request):
+    """Автор из подписок с рецептами. Картинки рецептов, как и у
+    SubscriptionsRecipeSerializer без контекста, — относительные ссылки."""
+    data = represent_user(author, get_user_relations(request))
+    limit = get_recipes_limit(request)
+    recipes = author.recipes.all()
+    if limit:
+        recipes = recipes[:limit]
+    data['recipes'] = [
+        represent_short_recipe(recipe, recipe_size) for recipe in recipes
+    ]
+    data['recipes_count'] = (
+        author.recipes_count if hasattr(author, 'recipes_count')
+        else author.recipes.count()
+    )
+    return data
+
+
+class CompiledRepresentationMixin:
+    """Сериализатор отдаёт данные через represent, а не через поля DRF.
+
+    Поля DRF остаются описанием формата: по ним работают Browsable API
+    и сравнение в tests/test_representations.py, которое выключает
+    быстрый путь параметром контекста compiled=False.
+    """
+
+    def represent(self, instance):
+        raise NotImplementedError
+
+    def to_representation(self, instance):
+        if self.context.get('compiled', True):
+            return self.represent(instance)
+        return super().to_representation(instance)
@@ -0,0 +1,200 @@
+import heapq
+import re
+from array import array
+from collections import defaultdict
+from functools import lru_cache
+from itertools import chain
+from threading import Lock
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Case, When
+
+from recipes.models import IngredientRecipe, Recipe
+
+from api.changes import get_journal_state, read_changes
+from api.replicas import use_primary
+
+WORD_RE = re.compile(r'\w+')
+# Окончания, которые отбрасываются при приведении слова к основе.
+# Длинные проверяются раньше коротких.
+ENDINGS = sorted((
+    'ами', 'ями', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ой', 'ей',
+    'ий', 'ый', 'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ую', 'юю', 'ом',
+    'ем', 'ам', 'ям', 'ах', 'ях', 'ов', 'ев', 'ью', 'а', 'я', 'о', 'е',
+    'ы', 'и', 'у', 'ю', 'ь', 'й',
+), key=len, reverse=True)
+MIN_STEM = 3
+# Вес слов из названия, ингредиентов и описания.
+WEIGHTS = (3, 2, 1)
+
+_index = None
+_index_lock = Lock()
+
+
+@lru_cache(maxsize=100000)
+def stem(word):
+    """Грубая основа русского слова: без окончания и с «е» вместо «ё»."""
+    word = word.replace('ё', 'е')
+    for ending in ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM:
+            return word[:-len(ending)]
+    return word
+
+
+def tokenize(text):
+    return [stem(word) for word in WORD_RE.findall(text.lower())]
+
+
+class RecipeSearchIndex:
+    """Обратный индекс рецептов для баз без полнотекстового поиска.
+
+    Для каждой основы слова хранятся id рецептов и вес слова в каждом
+    из них в компактных массивах. Рецепт находится, если в нём есть все
+    слова запроса, и ранжируется по сумме весов, затем по новизне.
+    Изменённые рецепты переиндексируются по одному, без пересборки.
+    """
+
+    def __init__(self, recipes):
+        self.postings = {}
+        # Основы слов каждого рецепта: по ним рецепт убирается
+        # из индекса при изменении.
+        self.tokens = {}
+        self.version = None
+        self.changes = 0
+        self.lock = Lock()
+        for pk, *fields in recipes:
+            self.add(pk, fields)
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def add(self, pk, fields):
+        weights = defaultdict(int)
+        for weight, text in zip(WEIGHTS, fields):
+            for token in tokenize(text or ''):
+                weights[token] += weight
+        for token, weight in weights.items():
+            if token not in self.postings:
+                self.postings[token] = (array('I'), array('H'))
+            ids, token_weights = self.postings[token]
+            ids.append(pk)
+            token_weights.append(min(weight, 0xFFFF))
+        self.tokens[pk] = tuple(weights)
+
+    def remove(self, pk):
+        for token in self.tokens.pop(pk, ()):
+            ids, weights = self.postings[token]
+            position = ids.index(pk)
+            del ids[position]
+            del weights[position]
+            if not ids:
+                del self.postings[token]
+
+    def update(self, recipes):
+        """Применяет текущее состояние рецептов: словарь id рецепта →
+        (название, ингредиенты, описание) или None для удалённого."""
+        with self.lock:
+            for pk, fields in recipes.items():
+                self.remove(pk)
+                if fields is not None:
+                    self.add(pk, fields)
+
+    def search(self, query, limit):
+        tokens = set(tokenize(query))
+        if not tokens or limit < 1:
+            return []
+        with self.lock:
+            postings = [self.postings.get(token) for token in tokens]
+            if None in postings:
+                return []
+            postings.sort(key=lambda posting: len(posting[0]))
+            ranks = dict(zip(*postings[0]))
+            for ids, weights in postings[1:]:
+                ranks = {
+                    pk: ranks[pk] + weight
+                    for pk, weight in zip(ids, weights) if pk in ranks
+                }
+                if not ranks:
+                    return []
+        return heapq.nsmallest(
+            limit, ranks, key=lambda pk: (-ranks[pk], -pk)
+        )
+
+
+def load_recipes(recipe_ids=None):
+    """Название, ингредиенты и описание рецептов, всех или из
+    recipe_ids."""
+    recipes = Recipe.objects.order_by()
+    ingredient_recipes = IngredientRecipe.objects.all()
+    if recipe_ids is not None:
+        recipes = recipes.filter(pk__in=recipe_ids)
+        ingredient_recipes = ingredient_recipes.filter(recipe__in=recipe_ids)
+    ingredients = defaultdict(list)
+    for recipe, name in ingredient_recipes.values_list(
+        'recipe', 'ingredient__name'
+    ).iterator():
+        ingredients[recipe].append(name)
+    for pk, name, text in recipes.values_list(
+        'pk', 'name', 'text'
+    ).iterator():
+        yield pk, name, ' '.join(ingredients[pk]), text
+
+
+def catch_up(index, changes):
+    """Применяет к индексу записи журнала изменений рецептов до номера
+    changes. False — если индекс нужно собрать заново."""
+    applied = read_changes(index.changes, changes)
+    if applied is None:
+        return False
+    recipes = dict.fromkeys(chain.from_iterable(applied))
+    with use_primary():
+        for pk, *fields in load_recipes(list(recipes)):
+            recipes[pk] = fields
+    index.update(recipes)
+    index.changes += len(applied)
+    return True
+
+
+def get_recipe_search_index():
+    """Индекс, догнавший журнал изменений рецептов."""
+    global _index
+    version, changes = get_journal_state()
+    index = _index
+    if (
+        index is not None
+        and index.version == version
+        and index.changes == changes
+    ):
+        return index
+    with _index_lock:
+        index = _index
+        if (
+            index is None
+            or index.version != version
+            or index.changes != changes and not catch_up(index, changes)
+        ):
+            with use_primary():
+                index = RecipeSearchIndex(load_recipes())
+            index.version, index.changes = version, changes
+            _index = index
+    return _index
+
+
+def search_recipes(queryset, query):
+    """Рецепты по поисковому запросу, сначала самые релевантные.
+
+    В PostgreSQL ищет по поисковому вектору с GIN-индексом, в остальных
+    базах — по индексу в памяти процесса.
+    """
+    if connections[queryset.db].vendor == 'postgresql':
+        return queryset.search(query)
+    ids = get_recipe_search_index().search(
+        query,
+        settings.RECIPE_SEARCH_LIMIT
+    )
+    if not ids:
+        return queryset.none()
+    return queryset.filter(pk__in=ids).order_by(Case(
+        *(When(pk=pk, then=position) for position, pk in enumerate(ids))
+    ))
@@ -1,19 +1,29 @@
 from collections import defaultdict
 
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from djoser.serializers import UserCreateSerializer, UserSerializer
-from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 
 from recipes.models import (
-    Favorite,
     Ingredient,
     IngredientRecipe,
     Recipe,
     Tag,
-    ShoppingCart
+    ShoppingListItem
 )
-from users.models import Follow
+
+from api.fields import HashedBase64ImageField, ThumbnailImageField
+from api.metrics import TimedSerializerMixin
+from api.relations import get_user_relations
+from api.representations import (
+    CompiledRepresentationMixin,
+    represent_recipe,
+    represent_short_recipe,
+    represent_subscription,
+    represent_user
+)
+from api.services import get_recipes_limit
 
 User = get_user_model()
 
@@ -31,17 +41,19 @@ class UserSignUpSerializer(UserCreateSerializer):
         )
 
 
-class UserListSerializer(UserSerializer):
+class UserListSerializer(
+    TimedSerializerMixin, CompiledRepresentationMixin, UserSerializer
+):
     is_subscribed = serializers.SerializerMethodField()
 
     def get_is_subscribed(self, obj):
-        user = self.context['request'].user
-        if user.is_anonymous:
-            return False
-        return Follow.objects.filter(
-            user=user,
-            author=obj.id
-        ).exists()
+        relations = get_user_relations(self.context.get('request'))
+        return obj.id in relations.following
+
+    def represent(self, instance):
+        return represent_user(
+            instance, get_user_relations(self.context.get('request'))
+        )
 
     class Meta:
         model = User
@@ -60,8 +72,50 @@ class PasswordSerializer(serializers.Serializer):
     new_password = serializers.CharField(required=True)
 
 
-class SubscriptionsRecipeSerializer(serializers.ModelSerializer):
-    image = Base64ImageField()
+class RecipeIdsSerializer(serializers.Serializer):
+    """ Список id рецептов для пакетных операций """
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=100
+    )
+
+
+class RecipeMatchQuerySerializer(serializers.Serializer):
+    """ Параметры подбора рецептов по имеющимся ингредиентам """
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=100
+    )
+    required = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        required=False,
+        max_length=100
+    )
+    excluded = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        required=False,
+        max_length=100
+    )
+    tags = serializers.ListField(
+        child=serializers.SlugField(),
+        required=False,
+        max_length=100
+    )
+    limit = serializers.IntegerField(
+        min_value=1,
+        max_value=100,
+        default=10
+    )
+
+
+class SubscriptionsRecipeSerializer(
+    TimedSerializerMixin,
+    CompiledRepresentationMixin,
+    serializers.ModelSerializer
+):
+    image = ThumbnailImageField('small')
 
     class Meta:
         model = Recipe
@@ -72,49 +126,55 @@ class SubscriptionsRecipeSerializer(serializers.ModelSerializer):
             'cooking_time'
         )
 
+    def represent(self, instance):
+        return represent_short_recipe(
+            instance,
+            self._declared_fields['image'].size,
+            self.context.get('request')
+        )
 
-class SubscribeSerializer(serializers.ModelSerializer):
-    id = serializers.ReadOnlyField(source='author.id')
-    email = serializers.ReadOnlyField(source='author.email')
-    username = serializers.ReadOnlyField(source='author.username')
-    first_name = serializers.ReadOnlyField(source='author.first_name')
-    last_name = serializers.ReadOnlyField(source='author.last_name')
-    is_subscribed = serializers.SerializerMethodField()
+
+class SubscribeSerializer(UserListSerializer):
     recipes = serializers.SerializerMethodField()
     recipes_count = serializers.SerializerMethodField()
 
-    class Meta:
-        model = User
-        fields = (
-            'email',
-            'id',
-            'username',
-            'first_name',
-            'last_name',
-            'is_subscribed',
+    class Meta(UserListSerializer.Meta):
+        fields = UserListSerializer.Meta.fields + (
             'recipes',
             'recipes_count'
         )
 
-    def get_is_subscribed(self, obj):
-        return Follow.objects.filter(
-            user=obj.user,
-            author=obj.author
-        ).exists()
-
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        limit = request.GET.get('recipes_limit')
-        queryset = Recipe.objects.filter(author=obj.author)
+        limit = get_recipes_limit(self.context.get('request'))
+        queryset = obj.recipes.all()
         if limit:
-            queryset = queryset[:int(limit)]
-        return SubscriptionsRecipeSerializer(queryset, many=True).data
+            queryset = queryset[:limit]
+        return SubscriptionsRecipeSerializer(
+            queryset,
+            many=True,
+            context={'compiled': self.context.get('compiled', True)}
+        ).data
 
     def get_recipes_count(self, obj):
-        return obj.author.recipes.count()
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
+        return obj.recipes.count()
+
+    def represent(self, instance):
+        return represent_subscription(
+            instance,
+            SubscriptionsRecipeSerializer._declared_fields['image'].size,
+            self.context.get('request')
+        )
 
 
-class FavoriteSerializer(serializers.ModelSerializer):
+class FavoriteSerializer(
+    TimedSerializerMixin,
+    CompiledRepresentationMixin,
+    serializers.ModelSerializer
+):
+    image = ThumbnailImageField('small')
+
     class Meta:
         model = Recipe
         fields = (
@@ -124,8 +184,15 @@ class FavoriteSerializer(serializers.ModelSerializer):
             'cooking_time'
         )
 
+    def represent(self, instance):
+        return represent_short_recipe(
+            instance,
+            self._declared_fields['image'].size,
+            self.context.get('request')
+        )
+
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Tag
         fields = (
@@ -136,7 +203,7 @@ class TagSerializer(serializers.ModelSerializer):
         )
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Ingredient
         fields = (
@@ -175,14 +242,16 @@ class IngredientRecipeCreateSerializer(serializers.ModelSerializer):
         )
 
 
-class RecipeCreateSerializer(serializers.ModelSerializer):
+class RecipeCreateSerializer(
+    TimedSerializerMixin, serializers.ModelSerializer
+):
     author = serializers.HiddenField(default=serializers.CurrentUserDefault())
     tags = serializers.PrimaryKeyRelatedField(
         queryset=Tag.objects.all(),
         many=True
     )
     ingredients = IngredientRecipeCreateSerializer(many=True)
-    image = Base64ImageField()
+    image = HashedBase64ImageField()
 
     class Meta:
         model = Recipe
@@ -221,35 +290,62 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
-        recipe = Recipe.objects.create(**validated_data)
-        obj = [
+        with transaction.atomic():
+            recipe = Recipe.objects.create(**validated_data)
+            obj = [
+                IngredientRecipe(
+                    recipe=recipe,
+                    ingredient=ingredient['id'],
+                    amount=ingredient['amount']
+                )
+                for ingredient in ingredients
+            ]
+            IngredientRecipe.objects.bulk_create(obj)
+            recipe.tags.set(tags)
+        return recipe
+
+    def update_ingredients(self, recipe, ingredients):
+        """ Приводит состав рецепта к переданному, изменяя только
+        отличающиеся строки. Возвращает id изменённых ингредиентов. """
+        current = {
+            item.ingredient_id: item
+            for item in IngredientRecipe.objects.filter(recipe=recipe)
+        }
+        submitted = {
+            ingredient['id'].id: ingredient['amount']
+            for ingredient in ingredients
+        }
+        removed = current.keys() - submitted.keys()
+        if removed:
+            recipe.ingredient_recipe.filter(ingredient__in=removed).delete()
+        added = submitted.keys() - current.keys()
+        IngredientRecipe.objects.bulk_create(
             IngredientRecipe(
                 recipe=recipe,
-                ingredient=ingredient['id'],
-                amount=ingredient['amount']
+                ingredient_id=ingredient,
+                amount=submitted[ingredient]
             )
-            for ingredient in ingredients
-        ]
-        IngredientRecipe.objects.bulk_create(obj)
-        recipe.tags.set(tags)
-        return recipe
+            for ingredient in added
+        )
+        changed = []
+        for ingredient, item in current.items():
+            amount = submitted.get(ingredient)
+            if amount is not None and item.amount != amount:
+                item.amount = amount
+                changed.append(item)
+        IngredientRecipe.objects.bulk_update(changed, ('amount',))
+        return removed | added | {item.ingredient_id for item in changed}
 
     def update(self, instance, validated_data):
         tags = validated_data.pop('tags', None)
         ingredients = validated_data.pop('ingredients', None)
-        instance.ingredient_recipe.all().delete()
-        if tags is not None:
-            instance.tags.set(tags)
-        obj = [
-            IngredientRecipe(
-                recipe=instance,
-                ingredient=ingredient['id'],
-                amount=ingredient['amount']
-            )
-            for ingredient in ingredients
-        ]
-        IngredientRecipe.objects.bulk_create(obj)
-        return super().update(instance, validated_data)
+        with transaction.atomic():
+            if tags is not None:
+                instance.tags.set(tags)
+            if ingredients is not None:
+                changed = self.update_ingredients(instance, ingredients)
+                ShoppingListItem.objects.sync_recipe(instance, changed)
+            return super().update(instance, validated_data)
 
     def to_representation(self, instance):
         serializer = RecipeListSerializer(
@@ -259,7 +355,11 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         return serializer.data
 
 
-class RecipeListSerializer(serializers.ModelSerializer):
+class RecipeListSerializer(
+    TimedSerializerMixin,
+    CompiledRepresentationMixin,
+    serializers.ModelSerializer
+):
     tags = TagSerializer(many=True)
     author = UserListSerializer()
     ingredients = IngredientRecipeListSerializer(
@@ -268,6 +368,7 @@ class RecipeListSerializer(serializers.ModelSerializer):
     )
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
+    image = ThumbnailImageField('card')
 
     class Meta:
         model = Recipe
@@ -284,20 +385,54 @@ class RecipeListSerializer(serializers.ModelSerializer):
             'cooking_time'
         )
 
-    def __get_is_any(self, obj, model):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return model.objects.filter(recipe=obj, user=user).exists()
-
     def get_is_favorited(self, obj):
-        return self.__get_is_any(obj, Favorite)
+        relations = get_user_relations(self.context.get('request'))
+        return obj.id in relations.favorites
 
     def get_is_in_shopping_cart(self, obj):
-        return self.__get_is_any(obj, ShoppingCart)
+        relations = get_user_relations(self.context.get('request'))
+        return obj.id in relations.cart
+
+    def represent(self, instance):
+        return represent_recipe(
+            instance,
+            self._declared_fields['image'].size,
+            self.context.get('request')
+        )
 
 
-class ShoppingCartSerializer(serializers.ModelSerializer):
+class RecipeDetailSerializer(RecipeListSerializer):
+    image = ThumbnailImageField('large')
+
+
+class RecipeMatchSerializer(RecipeListSerializer):
+    """ Рецепт с долей имеющихся ингредиентов """
+    matched_ingredients = serializers.IntegerField(read_only=True)
+    missing_ingredients = serializers.IntegerField(read_only=True)
+    match_ratio = serializers.FloatField(read_only=True)
+
+    class Meta(RecipeListSerializer.Meta):
+        fields = RecipeListSerializer.Meta.fields + (
+            'matched_ingredients',
+            'missing_ingredients',
+            'match_ratio'
+        )
+
+    def represent(self, instance):
+        data = super().represent(instance)
+        data['matched_ingredients'] = instance.matched_ingredients
+        data['missing_ingredients'] = instance.missing_ingredients
+        data['match_ratio'] = instance.match_ratio
+        return data
+
+
+class ShoppingCartSerializer(
+    TimedSerializerMixin,
+    CompiledRepresentationMixin,
+    serializers.ModelSerializer
+):
+    image = ThumbnailImageField('small')
+
     class Meta:
         model = Recipe
         fields = (
@@ -306,3 +441,10 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
             'image',
             'cooking_time'
         )
+
+    def represent(self, instance):
+        return represent_short_recipe(
+            instance,
+            self._declared_fields['image'].size,
+            self.context.get('request')
+        )
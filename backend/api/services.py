@@ -1,31 +1,158 @@
-import csv
-
-from django.db.models import Sum
-from django.http import HttpResponse
-from requests import Response
-from rest_framework import status
-
-from recipes.models import IngredientRecipe
-
-
-def get_send_file(user):
-    """ файл для скачивания"""
-    filename = f'Список покупок: {user}.csv'
-    if user.is_anonymous:
-        return Response(status=status.HTTP_401_UNAUTHORIZED)
-    ingredients = IngredientRecipe.objects.filter(
-        recipe__shopping_cart__user=user
-    ).values(
-        'ingredient__name', 'ingredient__measurement_unit'
-    ).annotate(ingredient_amount=Sum('amount')).values_list(
+from django.db import connections, router
+from django.db.models.signals import post_save
+from django.db.models.sql import InsertQuery
+from rest_framework.exceptions import ValidationError
+
+from recipes.models import Recipe, ShoppingListItem
+
+from api.exports import EXPORTERS
+
+EXPORT_CHUNK_SIZE = 2000
+
+
+def get_recipes_limit(request):
+    """ Количество рецептов автора из параметра recipes_limit """
+    limit = request.GET.get('recipes_limit', '')
+    if limit.isdigit() and int(limit) > 0:
+        return int(limit)
+    return None
+
+
+def insert_ignoring_conflicts(model, objs, returning=None):
+    """ Вставляет строки одним INSERT, пропуская нарушающие уникальность
+
+    Тот же запрос, что у bulk_create(ignore_conflicts=True), но
+    возвращает число действительно вставленных строк, а с returning —
+    значения этого столбца у вставленных строк (только PostgreSQL).
+    """
+    using = router.db_for_write(model)
+    connection = connections[using]
+    query = InsertQuery(model, ignore_conflicts=True)
+    query.insert_values(
+        [field for field in model._meta.concrete_fields
+         if not field.primary_key],
+        objs
+    )
+    inserted = []
+    with connection.cursor() as cursor:
+        for sql, params in query.get_compiler(using).as_sql():
+            if returning is None:
+                cursor.execute(sql, params)
+                inserted.append(cursor.rowcount)
+                continue
+            cursor.execute(
+                f'{sql} RETURNING {connection.ops.quote_name(returning)}',
+                params
+            )
+            inserted.extend(row[0] for row in cursor.fetchall())
+    return sum(inserted) if returning is None else inserted
+
+
+def add_relation(model, **fields):
+    """ Добавляет связь одним INSERT, False — если она уже есть
+
+    Уникальность проверяет база, поэтому одновременные запросы
+    не создают дублей: у второго INSERT не вставляет ни одной строки.
+    Сигнал post_save отправляется вручную, на нём держатся счётчик
+    подписчиков и лента подписок.
+    """
+    instance = model(**fields)
+    if not insert_ignoring_conflicts(model, [instance]):
+        return False
+    post_save.send(
+        sender=model,
+        instance=instance,
+        created=True,
+        update_fields=None,
+        raw=False,
+        using=router.db_for_write(model)
+    )
+    return True
+
+
+def remove_relation(model, **fields):
+    """ Удаляет связь одним DELETE, False — если её не было """
+    deleted, _ = model.objects.filter(**fields).delete()
+    return bool(deleted)
+
+
+def insert_relations(model, user, recipe_ids):
+    """ id рецептов, связи с которыми вставлены этим запросом
+
+    На PostgreSQL это один INSERT ... RETURNING, на остальных базах
+    по INSERT на рецепт: число строк есть только у запроса целиком.
+    """
+    objs = [model(user=user, recipe_id=recipe_id) for recipe_id in recipe_ids]
+    if not objs:
+        return set()
+    if connections[router.db_for_write(model)].vendor == 'postgresql':
+        return set(insert_ignoring_conflicts(model, objs, 'recipe_id'))
+    return {
+        obj.recipe_id for obj in objs
+        if insert_ignoring_conflicts(model, [obj])
+    }
+
+
+def add_relations(model, user, recipe_ids):
+    """ Добавляет связи с рецептами
+
+    Возвращает результат по каждому id: added, exists или not_found.
+    """
+    recipe_ids = list(dict.fromkeys(recipe_ids))
+    found = set(Recipe.objects.filter(
+        id__in=recipe_ids
+    ).values_list('id', flat=True))
+    # Уже существующие связи не вставляются, но статус added дают
+    # только строки, которые вставил INSERT.
+    existing = set(model.objects.filter(
+        user=user,
+        recipe_id__in=found
+    ).values_list('recipe_id', flat=True))
+    added = insert_relations(model, user, [
+        recipe_id for recipe_id in recipe_ids
+        if recipe_id in found and recipe_id not in existing
+    ])
+    results = {}
+    for recipe_id in recipe_ids:
+        if recipe_id not in found:
+            results[recipe_id] = 'not_found'
+        elif recipe_id in added:
+            results[recipe_id] = 'added'
+        else:
+            results[recipe_id] = 'exists'
+    return results
+
+
+def remove_relations(model, user, recipe_ids):
+    """ Удаляет связи с рецептами одним DELETE ... IN
+
+    Возвращает результат по каждому id: removed или absent.
+    """
+    recipe_ids = list(dict.fromkeys(recipe_ids))
+    relations = model.objects.filter(user=user, recipe_id__in=recipe_ids)
+    existing = set(relations.values_list('recipe_id', flat=True))
+    if existing:
+        relations.filter(recipe_id__in=existing).delete()
+    return {
+        recipe_id: 'removed' if recipe_id in existing else 'absent'
+        for recipe_id in recipe_ids
+    }
+
+
+def get_send_file(user, file_type='csv'):
+    """ Файл со списком покупок для скачивания """
+    exporter_class = EXPORTERS.get(file_type)
+    if exporter_class is None:
+        raise ValidationError({
+            'type': f'Доступные форматы: {", ".join(EXPORTERS)}.'
+        })
+    ingredients = ShoppingListItem.objects.filter(user=user).values_list(
         'ingredient__name',
         'ingredient__measurement_unit',
-        'ingredient_amount'
+        'amount'
+    ).order_by('ingredient__name')
+    exporter = exporter_class(
+        ingredients.iterator(chunk_size=EXPORT_CHUNK_SIZE),
+        f'Список покупок: {user}'
     )
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    response.write(u'\ufeff'.encode('utf8'))
-    writer = csv.writer(response)
-    for item in list(ingredients):
-        writer.writerow(item)
-    return response
+    return exporter.get_response()
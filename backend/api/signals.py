@@ -0,0 +1,247 @@
+import logging
+import time
+from functools import partial
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.signals import request_finished, request_started
+from django.db import connections, transaction
+from django.db.models import F
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_save
+)
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from recipes.models import (
+    Ingredient,
+    IngredientRecipe,
+    Recipe,
+    Tag,
+    TimelineEntry
+)
+from users.models import Follow
+
+from api.authentication import invalidate_user_tokens
+from api.cache import ingredients_cache, tags_cache
+from api.images import schedule_thumbnails
+from api.changes import log_recipe_changes
+from api.matching import invalidate_recipe_ingredient_index
+from api.versions import bump_version
+
+logger = logging.getLogger(__name__)
+User = get_user_model()
+# Поля пользователя в карточке автора рецепта.
+AUTHOR_CARD_FIELDS = ('email', 'username', 'first_name', 'last_name')
+
+
+def bump_version_on_commit(name):
+    """Версия меняется после коммита: иначе запрос, пришедший до
+    коммита, собрал бы кэш под новой версией из старых данных."""
+    transaction.on_commit(lambda: bump_version(name))
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def tag_changed(**kwargs):
+    transaction.on_commit(tags_cache.invalidate)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredient_changed(**kwargs):
+    transaction.on_commit(ingredients_cache.invalidate)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=IngredientRecipe)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_changed(**kwargs):
+    bump_version_on_commit('recipes')
+
+
+def log_recipe_changes_on_commit(recipe_ids):
+    transaction.on_commit(lambda: log_recipe_changes(recipe_ids))
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def recipe_logged(instance, **kwargs):
+    log_recipe_changes_on_commit([instance.pk])
+
+
+@receiver((post_save, post_delete), sender=IngredientRecipe)
+def recipe_ingredient_logged(instance, **kwargs):
+    log_recipe_changes_on_commit([instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_logged(instance, action, reverse, pk_set, **kwargs):
+    """Со стороны тега изменённые рецепты известны только для add
+    и remove, после clear индекс собирается заново."""
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        log_recipe_changes_on_commit([instance.pk])
+    elif action == 'post_clear':
+        transaction.on_commit(invalidate_recipe_ingredient_index)
+    elif pk_set:
+        log_recipe_changes_on_commit(sorted(pk_set))
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def tag_matching_changed(**kwargs):
+    """Подбор фильтрует по slug тега, который хранится в индексе."""
+    transaction.on_commit(invalidate_recipe_ingredient_index)
+
+
+def thumbnails_done(name, future):
+    """Копии готовы: рецепты с этой картинкой начинают их отдавать."""
+    error = future.exception()
+    if error is not None:
+        logger.warning('Не удалось создать копии картинки: %s', error)
+    elif Recipe.objects.filter(
+        image=name, thumbnails_ready=False
+    ).update(thumbnails_ready=True):
+        bump_version('recipes')
+
+
+def update_search_vector(recipes):
+    transaction.on_commit(lambda: recipes.update_search_vector())
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_saved(instance, created, **kwargs):
+    """Название ингредиента входит в поиск по его рецептам."""
+    recipes = Recipe.objects.filter(ingredients=instance)
+    update_search_vector(recipes)
+    if not created:
+        recipe_ids = list(recipes.values_list('pk', flat=True))
+        if recipe_ids:
+            log_recipe_changes_on_commit(recipe_ids)
+
+
+@receiver((post_save, post_delete), sender=IngredientRecipe)
+def recipe_ingredient_changed(instance, **kwargs):
+    update_search_vector(Recipe.objects.filter(pk=instance.recipe_id))
+
+
+@receiver(pre_save, sender=Recipe)
+def recipe_image_changed(instance, **kwargs):
+    """У новой картинки ещё нет уменьшенных копий."""
+    previous = None
+    if instance.pk is not None:
+        previous = Recipe.objects.filter(pk=instance.pk).values_list(
+            'image', flat=True
+        ).first()
+    if previous != instance.image.name:
+        instance.thumbnails_ready = False
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(instance, created, **kwargs):
+    """Поисковый вектор пересчитывается после коммита, когда
+    ингредиенты рецепта уже сохранены. Уменьшенные копии картинки
+    создаются в фоне, только пока они не готовы, а когда готовы —
+    лента перестаёт отдавать оригинал. Новый рецепт попадает в ленты
+    подписчиков."""
+    update_search_vector(Recipe.objects.filter(pk=instance.pk))
+    if created:
+        transaction.on_commit(
+            lambda: TimelineEntry.objects.fan_out(instance)
+        )
+    if instance.image and not instance.thumbnails_ready:
+        name = instance.image.name
+        transaction.on_commit(
+            lambda: schedule_thumbnails(name).add_done_callback(
+                partial(thumbnails_done, name)
+            )
+        )
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(instance, created, **kwargs):
+    if not created:
+        return
+    User.objects.filter(pk=instance.author_id).update(
+        followers_count=F('followers_count') + 1
+    )
+    transaction.on_commit(lambda: TimelineEntry.objects.follow(
+        instance.user_id, instance.author_id
+    ))
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(instance, **kwargs):
+    User.objects.filter(
+        pk=instance.author_id, followers_count__gt=0
+    ).update(followers_count=F('followers_count') - 1)
+    transaction.on_commit(lambda: TimelineEntry.objects.unfollow(
+        instance.user_id, instance.author_id
+    ))
+
+
+@receiver((post_save, post_delete), sender=User)
+def user_changed(instance, **kwargs):
+    """Смена пароля, деактивация и удаление пользователя сбрасывают
+    кэш его токенов."""
+    invalidate_user_tokens(instance.pk)
+
+
+@receiver(pre_save, sender=User)
+def user_author_card_changed(instance, update_fields=None, **kwargs):
+    """Отмечает, меняются ли данные, которые видны в рецептах как
+    автор. У нового пользователя рецептов ещё нет."""
+    fields = [
+        field for field in AUTHOR_CARD_FIELDS
+        if update_fields is None or field in update_fields
+    ]
+    instance._author_card_changed = False
+    if instance.pk is None or not fields:
+        return
+    previous = User.objects.filter(pk=instance.pk).values_list(
+        *fields
+    ).first()
+    instance._author_card_changed = previous != tuple(
+        getattr(instance, field) for field in fields
+    )
+
+
+@receiver(post_save, sender=User)
+def user_saved(instance, created, **kwargs):
+    """Версия пользователей меняется только вместе с карточкой автора:
+    удалённый автор уходит из ответов вместе со своими рецептами."""
+    if not created and instance._author_card_changed:
+        bump_version_on_commit('users')
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(instance, **kwargs):
+    """Выход через auth/token/logout удаляет токен."""
+    invalidate_user_tokens(instance.user_id)
+
+
+@receiver(request_finished)
+def mark_connections_idle(**kwargs):
+    now = time.monotonic()
+    for connection in connections.all():
+        if connection.connection is not None:
+            connection.idle_since = now
+
+
+@receiver(request_started)
+def check_connections(**kwargs):
+    """Постоянное соединение, которое простояло дольше
+    DB_CONN_HEALTH_CHECK_IDLE и оборвалось за это время, закрывается
+    до того, как запрос его получит."""
+    if not settings.DB_CONN_HEALTH_CHECKS:
+        return
+    idle_before = time.monotonic() - settings.DB_CONN_HEALTH_CHECK_IDLE
+    for connection in connections.all():
+        if connection.connection is None:
+            continue
+        idle_since = getattr(connection, 'idle_since', None)
+        if idle_since is not None and idle_since > idle_before:
+            continue
+        if not connection.is_usable():
+            connection.close()
@@ -0,0 +1,38 @@
+import time
+
+from django.core.cache import cache
+
+VERSION_KEY = 'version:{}'
+
+
+def get_versions(*names):
+    """Текущие версии наборов данных за одно обращение к кэшу.
+
+    Версия — время последнего изменения. Если ключа нет в кэше,
+    начинается новая версия.
+    """
+    keys = [VERSION_KEY.format(name) for name in names]
+    found = cache.get_many(keys)
+    versions = []
+    for key in keys:
+        version = found.get(key)
+        if version is None:
+            version = time.time()
+            if not cache.add(key, version, None):
+                version = cache.get(key, version)
+        versions.append(version)
+    return versions
+
+
+def get_version(name):
+    return get_versions(name)[0]
+
+
+def bump_version(name):
+    """Делает устаревшими все данные, закэшированные по версии."""
+    cache.set(VERSION_KEY.format(name), time.time(), None)
+
+
+def user_version_name(user):
+    """Версия избранного, списка покупок и подписок пользователя."""
+    return f'user:{user.pk}'
@@ -1,4 +1,6 @@
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, OuterRef, Prefetch, Subquery
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
@@ -10,28 +12,52 @@ from rest_framework.response import Response
 from recipes.models import (
     Favorite,
     Ingredient,
+    IngredientRecipe,
     Recipe,
     ShoppingCart,
+    ShoppingListItem,
     Tag
 )
 from users.models import Follow
 
+from api.cache import ingredients_cache, tags_cache
 from api.filters import IngredientFilter, RecipeFilter
-from api.mixins import RetrieveListViewSet
-from api.pagination import FollowPagination
+from api.matching import get_recipe_ingredient_index
+from api.mixins import (
+    AnonymousResponseCacheMixin,
+    ConditionalGetMixin,
+    RetrieveListViewSet
+)
+from api.pagination import (
+    FollowPagination,
+    RecipePagination,
+    TimelinePagination
+)
 from api.permissions import IsAuthorAdminOrReadOnly
+from api.relations import invalidate_user_relations
 from api.serializers import (
     FavoriteSerializer,
     IngredientSerializer,
     PasswordSerializer,
     RecipeCreateSerializer,
+    RecipeDetailSerializer,
+    RecipeIdsSerializer,
     RecipeListSerializer,
+    RecipeMatchQuerySerializer,
+    RecipeMatchSerializer,
     ShoppingCartSerializer,
     SubscribeSerializer,
     TagSerializer,
     UserListSerializer
 )
-from api.services import get_send_file
+from api.services import (
+    add_relation,
+    add_relations,
+    get_recipes_limit,
+    get_send_file,
+    remove_relation,
+    remove_relations
+)
 
 User = get_user_model()
 
@@ -40,6 +66,20 @@ class UserListViewSet(UserViewSet):
     queryset = User.objects.all()
     serializer_class = UserListSerializer
 
+    def get_subscriptions_queryset(self, user):
+        """ Авторы из подписок с рецептами и их количеством """
+        recipes = Recipe.objects.all()
+        limit = get_recipes_limit(self.request)
+        if limit:
+            recipes = recipes.filter(id__in=Subquery(
+                Recipe.objects.filter(
+                    author=OuterRef('author')
+                ).values('id')[:limit]
+            ))
+        return User.objects.filter(following__user=user).annotate(
+            recipes_count=Count('recipes')
+        ).prefetch_related(Prefetch('recipes', queryset=recipes))
+
     @action(
         detail=False,
         methods=['post'],
@@ -55,7 +95,7 @@ class UserListViewSet(UserViewSet):
         )
         if serializer.is_valid():
             user.set_password(serializer.data['new_password'])
-            user.save()
+            user.save(update_fields=['password'])
             return Response(status=status.HTTP_204_NO_CONTENT)
         else:
             return Response(
@@ -70,8 +110,7 @@ class UserListViewSet(UserViewSet):
         pagination_class=FollowPagination
     )
     def subscriptions(self, request):
-        user = request.user
-        queryset = Follow.objects.filter(user=user)
+        queryset = self.get_subscriptions_queryset(request.user)
         pages = self.paginate_queryset(queryset)
         serializer = SubscribeSerializer(
             pages,
@@ -80,30 +119,51 @@ class UserListViewSet(UserViewSet):
         )
         return self.get_paginated_response(serializer.data)
 
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=(IsAuthenticated,),
+        pagination_class=TimelinePagination
+    )
+    def timeline(self, request):
+        """ Новые рецепты авторов из подписок """
+        pages = self.paginate_queryset(
+            Recipe.objects.for_feed(request.user)
+        )
+        serializer = RecipeListSerializer(
+            pages,
+            many=True,
+            context={'request': request}
+        )
+        return self.get_paginated_response(serializer.data)
+
     @action(
         methods=['post', 'delete'],
         detail=True,
         permission_classes=(IsAuthenticated,)
     )
     def subscribe(self, request, id):
+        """ Подписка и отписка одним запросом на запись """
         user = self.request.user
-        author = get_object_or_404(User, id=id)
-        subscribe = Follow.objects.filter(user=user, author=author)
-        if user.is_anonymous:
-            return Response(status=status.HTTP_401_UNAUTHORIZED)
         if request.method == 'POST':
-            if subscribe.exists():
-                data = {
-                    'errors': (
-                        'Вы подписаны на этого автора, '
-                        'или пытаетесь подписаться на себя.'
-                    )
-                }
+            if str(user.id) == str(id):
+                data = {'errors': 'Нельзя подписаться на себя.'}
+                return Response(
+                    data=data,
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if not add_relation(Follow, user=user, author_id=id):
+                get_object_or_404(User, id=id)
+                data = {'errors': 'Вы уже подписаны на этого автора.'}
                 return Response(
                     data=data,
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            Follow.objects.create(user=user, author=author)
+            invalidate_user_relations(request)
+            author = get_object_or_404(
+                self.get_subscriptions_queryset(user),
+                id=id
+            )
             serializer = SubscribeSerializer(
                 author,
                 context={'request': request}
@@ -112,37 +172,54 @@ class UserListViewSet(UserViewSet):
                 serializer.data,
                 status=status.HTTP_201_CREATED
             )
-        elif request.method == 'DELETE':
-            if not subscribe.exists():
-                data = {'errors': 'Вы не подписаны на данного автора.'}
-                return Response(
-                    data=data,
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            subscribe.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
+        if not remove_relation(Follow, user=user, author_id=id):
+            get_object_or_404(User, id=id)
+            data = {'errors': 'Вы не подписаны на данного автора.'}
+            return Response(
+                data=data,
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        invalidate_user_relations(request)
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
 
 class TagsViewSet(RetrieveListViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
+    catalog_cache = tags_cache
+    version_names = ('tags',)
 
 
 class IngredientsViewSet(RetrieveListViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
+    catalog_cache = ingredients_cache
+    version_names = ('ingredients',)
     filter_backends = (DjangoFilterBackend, )
     filterset_class = IngredientFilter
 
 
-class RecipesViewSet(viewsets.ModelViewSet):
+class RecipesViewSet(
+    ConditionalGetMixin,
+    AnonymousResponseCacheMixin,
+    viewsets.ModelViewSet
+):
     queryset = Recipe.objects.all()
     serializer_class = RecipeListSerializer
     permission_classes = (IsAuthorAdminOrReadOnly,)
     filter_backends = (DjangoFilterBackend, )
     filterset_class = RecipeFilter
+    pagination_class = RecipePagination
+    version_names = ('recipes', 'tags', 'ingredients', 'users')
+    personalized = True
+
+    def get_queryset(self):
+        """ Лента рецептов без запросов на каждый рецепт """
+        return Recipe.objects.for_feed(self.request.user)
 
     def get_serializer_class(self):
+        if self.action == 'retrieve':
+            return RecipeDetailSerializer
         if self.request.method == 'GET':
             return RecipeListSerializer
         return RecipeCreateSerializer
@@ -150,34 +227,49 @@ class RecipesViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            users = list(ShoppingCart.objects.filter(
+                recipe=instance
+            ).values_list('user', flat=True))
+            ShoppingListItem.objects.lock_users(users)
+            ingredients = list(
+                instance.ingredients.values_list('id', flat=True)
+            )
+            instance.delete()
+            ShoppingListItem.objects.sync(users, ingredients)
+
     @action(
         methods=['post', 'delete'],
         detail=True,
         permission_classes=(IsAuthenticated,)
     )
     def favorite(self, request, pk=None):
+        """ Добавление и удаление из избранного одним запросом на запись """
         user = self.request.user
-        recipe = get_object_or_404(Recipe, pk=pk)
-        in_favorite = Favorite.objects.filter(user=user, recipe=recipe)
-        if user.is_anonymous:
-            return Response(status=status.HTTP_401_UNAUTHORIZED)
         if request.method == 'POST':
-            if not in_favorite:
-                favorite = Favorite.objects.create(user=user, recipe=recipe)
-                serializer = FavoriteSerializer(favorite.recipe)
-                return Response(
-                    data=serializer.data,
-                    status=status.HTTP_201_CREATED
-                )
-        elif request.method == 'DELETE':
-            if not in_favorite:
-                data = {'errors': 'Такого рецепта нет в избранных.'}
+            if not add_relation(Favorite, user=user, recipe_id=pk):
+                get_object_or_404(Recipe, pk=pk)
+                data = {'errors': 'Рецепт уже в избранном.'}
                 return Response(
                     data=data,
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            in_favorite.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
+            invalidate_user_relations(request)
+            serializer = FavoriteSerializer(get_object_or_404(Recipe, pk=pk))
+            return Response(
+                data=serializer.data,
+                status=status.HTTP_201_CREATED
+            )
+        if not remove_relation(Favorite, user=user, recipe_id=pk):
+            get_object_or_404(Recipe, pk=pk)
+            data = {'errors': 'Такого рецепта нет в избранных.'}
+            return Response(
+                data=data,
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        invalidate_user_relations(request)
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
         detail=True,
@@ -185,34 +277,153 @@ class RecipesViewSet(viewsets.ModelViewSet):
         permission_classes=(IsAuthenticated, ),
     )
     def shopping_cart(self, request, pk=None):
+        """ Добавление и удаление из списка покупок одним запросом
+        на запись, сводный список пересчитывается по ингредиентам рецепта """
         user = self.request.user
-        recipe = get_object_or_404(Recipe, pk=pk)
-        in_shopping_cart = ShoppingCart.objects.filter(
-            user=user,
-            recipe=recipe
-        )
-        if user.is_anonymous:
-            return Response(status=status.HTTP_401_UNAUTHORIZED)
+        ingredients = IngredientRecipe.objects.filter(
+            recipe_id=pk
+        ).values_list('ingredient', flat=True)
         if request.method == 'POST':
-            if not in_shopping_cart:
-                shopping_cart = ShoppingCart.objects.create(
-                    user=user,
-                    recipe=recipe
-                )
-                serializer = ShoppingCartSerializer(shopping_cart.recipe)
-                return Response(
-                    data=serializer.data,
-                    status=status.HTTP_201_CREATED
-                )
-        elif request.method == 'DELETE':
-            if not in_shopping_cart:
-                data = {'errors': 'Такой рецепта нет в списке покупок.'}
+            # Рецепт проверяется до записи: внешний ключ в PostgreSQL
+            # проверяется только при коммите общей транзакции.
+            recipe = get_object_or_404(Recipe, pk=pk)
+            with transaction.atomic():
+                ShoppingListItem.objects.lock_users([user.id])
+                added = add_relation(ShoppingCart, user=user, recipe=recipe)
+                if added:
+                    ShoppingListItem.objects.sync([user.id], ingredients)
+            if not added:
+                data = {'errors': 'Рецепт уже в списке покупок.'}
                 return Response(
                     data=data,
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            in_shopping_cart.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
+            invalidate_user_relations(request)
+            serializer = ShoppingCartSerializer(recipe)
+            return Response(
+                data=serializer.data,
+                status=status.HTTP_201_CREATED
+            )
+        with transaction.atomic():
+            ShoppingListItem.objects.lock_users([user.id])
+            removed = remove_relation(ShoppingCart, user=user, recipe_id=pk)
+            if removed:
+                ShoppingListItem.objects.sync([user.id], ingredients)
+        if not removed:
+            get_object_or_404(Recipe, pk=pk)
+            data = {'errors': 'Такого рецепта нет в списке покупок.'}
+            return Response(
+                data=data,
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        invalidate_user_relations(request)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    def change_relations(self, request, model):
+        """ Пакетное добавление (POST) или удаление (DELETE) рецептов
+        с результатом по каждому id """
+        user = request.user
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data['recipes']
+        with transaction.atomic():
+            if model is ShoppingCart:
+                ShoppingListItem.objects.lock_users([user.id])
+            if request.method == 'POST':
+                results = add_relations(model, user, recipe_ids)
+            else:
+                results = remove_relations(model, user, recipe_ids)
+            changed = [
+                recipe_id for recipe_id, result in results.items()
+                if result in ('added', 'removed')
+            ]
+            if changed and model is ShoppingCart:
+                ShoppingListItem.objects.sync(
+                    [user.id],
+                    IngredientRecipe.objects.filter(
+                        recipe_id__in=changed
+                    ).values_list('ingredient', flat=True).distinct()
+                )
+        if changed:
+            invalidate_user_relations(request)
+        return Response({'results': [
+            {'id': recipe_id, 'status': result}
+            for recipe_id, result in results.items()
+        ]})
+
+    @action(
+        methods=['post', 'delete'],
+        detail=False,
+        url_path='favorite/bulk',
+        permission_classes=(IsAuthenticated, ),
+    )
+    def favorite_bulk(self, request):
+        """ Добавление и удаление нескольких рецептов в избранном """
+        return self.change_relations(request, Favorite)
+
+    @action(
+        methods=['post', 'delete'],
+        detail=False,
+        url_path='shopping_cart/bulk',
+        permission_classes=(IsAuthenticated, ),
+    )
+    def shopping_cart_bulk(self, request):
+        """ Добавление и удаление нескольких рецептов в списке покупок """
+        return self.change_relations(request, ShoppingCart)
+
+    @action(
+        methods=['delete'],
+        detail=False,
+        url_path='shopping_cart/clear',
+        permission_classes=(IsAuthenticated, ),
+    )
+    def clear_shopping_cart(self, request):
+        """ Очистка списка покупок вместе со сводным списком """
+        user = request.user
+        with transaction.atomic():
+            ShoppingListItem.objects.lock_users([user.id])
+            deleted, _ = ShoppingCart.objects.filter(user=user).delete()
+            ShoppingListItem.objects.filter(user=user).delete()
+        if deleted:
+            invalidate_user_relations(request)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(
+        methods=['get'],
+        detail=False,
+        url_path='by_ingredients',
+    )
+    def by_ingredients(self, request):
+        """ Рецепты, которые можно приготовить из имеющихся ингредиентов,
+        по убыванию доли совпавших ингредиентов """
+        params = RecipeMatchQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        query = params.validated_data
+        matches = get_recipe_ingredient_index().match(
+            query['ingredients'],
+            required=query.get('required', ()),
+            excluded=query.get('excluded', ()),
+            tags=query.get('tags', ()),
+            limit=query['limit']
+        )
+        recipes = self.get_queryset().in_bulk(
+            [recipe for recipe, matched, total in matches]
+        )
+        results = []
+        for recipe_id, matched, total in matches:
+            recipe = recipes.get(recipe_id)
+            if recipe is None:
+                continue
+            recipe.matched_ingredients = matched
+            recipe.missing_ingredients = total - matched
+            recipe.match_ratio = round(matched / total, 4)
+            results.append(recipe)
+        serializer = RecipeMatchSerializer(
+            results,
+            many=True,
+            context={'request': request}
+        )
+        return Response(serializer.data)
 
     @action(
         methods=['get'],
@@ -220,5 +431,8 @@ class RecipesViewSet(viewsets.ModelViewSet):
         permission_classes=(IsAuthenticated, ),
     )
     def download_shopping_cart(self, request):
-        """ Скачивание списка покупок """
-        return get_send_file(request.user)
+        """ Скачивание списка покупок в формате из параметра type """
+        return get_send_file(
+            request.user,
+            request.query_params.get('type', 'csv')
+        )
@@ -28,12 +28,14 @@ INSTALLED_APPS = [
     'rest_framework',
     'rest_framework.authtoken',
     'djoser',
-    'api',
+    'api.apps.ApiConfig',
     'recipes',
     'users',
 ]
 
 MIDDLEWARE = [
+    'api.metrics.MetricsMiddleware',
+    'api.replicas.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -74,9 +76,73 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER', default='postgres'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='postgres'),
         'HOST': os.getenv('DB_HOST', default='db'),
-        'PORT': os.getenv('DB_PORT', default='5432')
+        'PORT': os.getenv('DB_PORT', default='5432'),
+        # Соединение живёт между запросами, а не открывается на каждый.
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', default=60)),
     }
 }
+# Перед запросом постоянные соединения проверяются SELECT 1,
+# оборвавшиеся закрываются и открываются заново. Проверяются только
+# соединения, простоявшие без запросов дольше DB_CONN_HEALTH_CHECK_IDLE
+# секунд: только что использованное почти наверняка живо.
+DB_CONN_HEALTH_CHECKS = (
+    os.getenv('DB_CONN_HEALTH_CHECKS', default='true') == 'true'
+)
+DB_CONN_HEALTH_CHECK_IDLE = int(
+    os.getenv('DB_CONN_HEALTH_CHECK_IDLE', default=30)
+)
+
+# Реплики через запятую: host или host:port. Имя базы, пользователь
+# и пароль — как у основной.
+DATABASE_REPLICAS = []
+for number, address in enumerate(
+    filter(None, os.getenv('DB_REPLICA_HOSTS', default='').split(','))
+):
+    host, _, port = address.strip().partition(':')
+    alias = f'replica_{number}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+DATABASE_ROUTERS = ['api.replicas.PrimaryReplicaRouter']
+# Представления, которые при GET читают с реплики.
+REPLICA_VIEWS = (
+    'recipes-list',
+    'recipes-detail',
+    'tags-list',
+    'tags-detail',
+    'ingredients-list',
+    'ingredients-detail',
+    'user-subscriptions',
+)
+# Сколько секунд после своих записей пользователь читает
+# с основной базы.
+REPLICA_STICKY_SECONDS = int(
+    os.getenv('DB_REPLICA_STICKY_SECONDS', default=10)
+)
+
+# Кэш общий для всех процессов: версии данных, счётчики токенов
+# и готовые ответы сбрасываются в нём для всех воркеров сразу. Кэш
+# в памяти процесса годится только для разработки с одним процессом.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default='foodgram'),
+    }
+}
+# В кэше процесса лежат версии данных, токены, связи пользователей
+# и готовые ответы. При стандартных 300 записях он переполняется
+# и вытесняет версии, сбрасывая все закэшированные по ним данные.
+if CACHES['default']['BACKEND'].endswith('LocMemCache'):
+    CACHES['default']['OPTIONS'] = {
+        'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', default=100000)),
+    }
 
 
 # Password validation
@@ -124,7 +190,11 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.AllowAny',
     ),
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachingTokenAuthentication',
+    ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'api.metrics.TimedJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
     ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 6
@@ -145,3 +215,46 @@ DJOSER = {
 }
 
 EMPTY = '-пусто-'
+
+INGREDIENT_SEARCH_LIMIT = int(os.getenv('INGREDIENT_SEARCH_LIMIT', default=20))
+
+# Сколько найденных рецептов отдаёт поиск без PostgreSQL.
+RECIPE_SEARCH_LIMIT = int(os.getenv('RECIPE_SEARCH_LIMIT', default=1000))
+
+# Размеры уменьшенных копий картинок рецептов: карточка в подписках,
+# карточка в ленте и страница рецепта.
+RECIPE_THUMBNAIL_SIZES = {
+    'small': (240, 240),
+    'card': (480, 480),
+    'large': (1200, 1200),
+}
+RECIPE_THUMBNAIL_QUALITY = int(
+    os.getenv('RECIPE_THUMBNAIL_QUALITY', default=82)
+)
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', default=2))
+
+SHOPPING_LIST_FONT = os.getenv(
+    'SHOPPING_LIST_FONT',
+    default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
+# Авторы, у которых подписчиков больше, не копируют новые рецепты
+# в ленты подписчиков: их рецепты подмешиваются в ленту при чтении.
+TIMELINE_FANOUT_LIMIT = int(os.getenv('TIMELINE_FANOUT_LIMIT', default=1000))
+
+# Кэш проверенных токенов: размер и срок жизни в памяти процесса.
+# С TOKEN_CACHE_SHARED=true токены хранятся и в общем кэше CACHES.
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', default=10000))
+TOKEN_CACHE_TIMEOUT = int(os.getenv('TOKEN_CACHE_TIMEOUT', default=300))
+TOKEN_CACHE_SHARED = os.getenv('TOKEN_CACHE_SHARED', default='') == 'true'
+
+# Сколько секунд хранятся готовые ответы ленты и рецептов для анонимных
+# пользователей. Изменения данных сбрасывают их раньше.
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('RESPONSE_CACHE_TIMEOUT', default=600))
+
+# Заголовок Server-Timing с временем базы, сериализации и кодирования
+# в JSON в ответах.
+SERVER_TIMING = os.getenv('SERVER_TIMING', default='') == 'true'
+# Запросы, выполнившие больше SQL-запросов, пишутся в лог вместе с SQL.
+# 0 — не писать.
+QUERY_LOG_THRESHOLD = int(os.getenv('QUERY_LOG_THRESHOLD', default=0))
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Min
+
+from recipes.models import Favorite, ShoppingCart
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет повторяющиеся записи избранного и списка покупок '
+        'перед добавлением уникальных ограничений (user, recipe).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Сколько пар (user, recipe) чистить в одной транзакции.'
+        )
+
+    def handle(self, *args, **options):
+        for model in (Favorite, ShoppingCart):
+            deleted = self.dedupe(model, options['batch_size'])
+            self.stdout.write(
+                f'{model.__name__}: удалено дублей {deleted}'
+            )
+
+    def dedupe(self, model, batch_size):
+        """Оставляет самую раннюю запись для каждой пары.
+
+        Пары обрабатываются небольшими транзакциями, поэтому таблица
+        не блокируется надолго.
+        """
+        deleted = 0
+        while True:
+            groups = list(
+                model.objects.values('user', 'recipe').annotate(
+                    keep=Min('id'), total=Count('id')
+                ).filter(total__gt=1).order_by()[:batch_size]
+            )
+            if not groups:
+                return deleted
+            with transaction.atomic():
+                for group in groups:
+                    count, _ = model.objects.filter(
+                        user=group['user'],
+                        recipe=group['recipe']
+                    ).exclude(id=group['keep']).delete()
+                    deleted += count
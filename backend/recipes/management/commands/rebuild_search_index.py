@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает поисковые векторы рецептов (только PostgreSQL).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10000,
+            help='Количество рецептов в одном UPDATE.'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            self.stdout.write(
+                'Поиск без PostgreSQL строит индекс в памяти, '
+                'пересчитывать нечего.'
+            )
+            return
+        batch_size = options['batch_size']
+        ids = Recipe.objects.order_by('pk').values_list('pk', flat=True)
+        last = 0
+        updated = 0
+        while True:
+            batch = list(ids.filter(pk__gt=last)[:batch_size])
+            if not batch:
+                break
+            Recipe.objects.filter(
+                pk__gte=batch[0],
+                pk__lte=batch[-1]
+            ).update_search_vector()
+            updated += len(batch)
+            last = batch[-1]
+        self.stdout.write(self.style.SUCCESS(f'Рецептов: {updated}.'))
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.models import ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересобирает сводные списки покупок и сверяет их '
+        'с суммой ингредиентов по спискам покупок.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только сверить списки, ничего не изменяя.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество строк в одной вставке.'
+        )
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            ShoppingListItem.objects.rebuild(options['batch_size'])
+            self.stdout.write('Сводные списки покупок пересобраны.')
+        mismatches = self.verify()
+        if mismatches:
+            for (user, ingredient), (stored, live) in mismatches[:20]:
+                self.stderr.write(
+                    f'Пользователь {user}, ингредиент {ingredient}: '
+                    f'в списке {stored}, по корзине {live}'
+                )
+            raise CommandError(f'Расхождений: {len(mismatches)}.')
+        self.stdout.write(self.style.SUCCESS('Расхождений нет.'))
+
+    def verify(self):
+        live = {
+            (user, ingredient): total
+            for user, ingredient, total
+            in ShoppingListItem.objects.live_totals().iterator()
+        }
+        stored = {
+            (user, ingredient): amount
+            for user, ingredient, amount
+            in ShoppingListItem.objects.values_list(
+                'user', 'ingredient', 'amount'
+            ).iterator()
+        }
+        return sorted(
+            (key, (stored.get(key), live.get(key)))
+            for key in live.keys() | stored.keys()
+            if stored.get(key) != live.get(key)
+        )
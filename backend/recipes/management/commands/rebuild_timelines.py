@@ -0,0 +1,86 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from recipes.models import Recipe, TimelineEntry
+from users.models import Follow
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает счётчики подписчиков, пересобирает ленты подписок '
+        'и сверяет их с подписками.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только сверить ленты, ничего не изменяя.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество строк в одной вставке.'
+        )
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            TimelineEntry.objects.rebuild(options['batch_size'])
+            self.stdout.write('Ленты подписок пересобраны.')
+        errors = self.verify()
+        if errors:
+            for error in errors[:20]:
+                self.stderr.write(error)
+            raise CommandError(f'Расхождений: {len(errors)}.')
+        self.stdout.write(self.style.SUCCESS('Расхождений нет.'))
+
+    def verify(self):
+        """Счётчики подписчиков должны совпадать с подписками, в ленте
+        должны быть все рецепты непопулярных авторов из подписок
+        и только рецепты авторов из подписок."""
+        errors = []
+        followers = dict(Follow.objects.values_list('author').annotate(
+            total=Count('pk')
+        ).order_by())
+        for pk, stored in User.objects.values_list('pk', 'followers_count'):
+            if stored != followers.get(pk, 0):
+                errors.append(
+                    f'Автор {pk}: подписчиков {stored}, '
+                    f'по подпискам {followers.get(pk, 0)}'
+                )
+        recipes = {}
+        for pk, author in Recipe.objects.values_list('pk', 'author'):
+            recipes.setdefault(author, set()).add(pk)
+        timelines = {}
+        for user, recipe in TimelineEntry.objects.values_list(
+            'user', 'recipe'
+        ).iterator():
+            timelines.setdefault(user, set()).add(recipe)
+        following = {}
+        for user, author in Follow.objects.values_list('user', 'author'):
+            following.setdefault(user, set()).add(author)
+        for user in following.keys() | timelines.keys():
+            allowed = set().union(*(
+                recipes.get(author, ()) for author in following.get(user, ())
+            ))
+            required = set().union(*(
+                recipes.get(author, ()) for author in following.get(user, ())
+                if followers.get(author, 0) <= settings.TIMELINE_FANOUT_LIMIT
+            ))
+            stored = timelines.get(user, set())
+            if required - stored:
+                errors.append(
+                    f'Пользователь {user}: нет в ленте '
+                    f'{sorted(required - stored)[:10]}'
+                )
+            if stored - allowed:
+                errors.append(
+                    f'Пользователь {user}: лишние в ленте '
+                    f'{sorted(stored - allowed)[:10]}'
+                )
+        return errors
@@ -1,11 +1,41 @@
+import heapq
+from itertools import groupby
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+    SearchVectorField
+)
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import connections, models, transaction
+from django.db.models import (
+    Count,
+    Exists,
+    F,
+    OuterRef,
+    Prefetch,
+    Q,
+    Subquery,
+    Sum,
+    TextField,
+    Value
+)
+from django.db.models.functions import Coalesce
 
 from recipes.validators import ColorValidator
+from users.models import Follow
 
 User = get_user_model()
 
+SEARCH_CONFIG = 'russian'
+# GIN-индекс и поисковый вектор есть только в PostgreSQL.
+POSTGRES_SEARCH = 'postgresql' in settings.DATABASES['default']['ENGINE']
+
 
 class Tag(models.Model):
     """Модель тегов у рецептов пользователей."""
@@ -48,11 +78,93 @@ class Ingredient(models.Model):
         ordering = ('name', )
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('name', 'measurement_unit',),
+                name='unique_ingredient'
+            ),
+        )
 
     def __str__(self):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+    """Выборки рецептов с данными для сериализации."""
+
+    def with_user_flags(self, user):
+        """Флаги избранного и списка покупок для пользователя."""
+        if user.is_anonymous:
+            return self
+        return self.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user,
+                recipe=OuterRef('pk')
+            )),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user,
+                recipe=OuterRef('pk')
+            ))
+        )
+
+    def for_feed(self, user):
+        """Лента рецептов с автором, тегами и ингредиентами.
+
+        Число запросов не зависит от количества рецептов на странице.
+        Флаги избранного, списка покупок и подписки сериализаторы берут
+        из кэша связей пользователя.
+        """
+        return self.select_related('author').prefetch_related(
+            'tags',
+            Prefetch(
+                'ingredient_recipe',
+                queryset=IngredientRecipe.objects.select_related('ingredient')
+            )
+        )
+
+    def update_search_vector(self):
+        """Пересчитывает поисковый вектор: название важнее ингредиентов,
+        ингредиенты важнее описания."""
+        if connections[self.db].vendor != 'postgresql':
+            return
+        ingredients = IngredientRecipe.objects.filter(
+            recipe=OuterRef('pk')
+        ).values('recipe').annotate(
+            names=StringAgg('ingredient__name', ' ')
+        ).values('names')
+        self.update(search_vector=(
+            SearchVector('name', weight='A', config=SEARCH_CONFIG)
+            + SearchVector(
+                Coalesce(
+                    Subquery(ingredients, output_field=TextField()),
+                    Value('')
+                ),
+                weight='B',
+                config=SEARCH_CONFIG
+            )
+            + SearchVector('text', weight='C', config=SEARCH_CONFIG)
+        ))
+
+    def search(self, query):
+        """Полнотекстовый поиск по поисковому вектору, сначала
+        самые релевантные рецепты."""
+        search_query = SearchQuery(query, config=SEARCH_CONFIG)
+        return self.filter(search_vector=search_query).annotate(
+            rank=SearchRank(F('search_vector'), search_query)
+        ).order_by('-rank', '-pub_date', '-id')
+
+
+class RecipeManager(models.Manager.from_queryset(RecipeQuerySet)):
+    """Рецепты без поискового вектора.
+
+    Вектор нужен только для условий поиска, а загружать его в каждый
+    рецепт ленты, подписок или детальной страницы дорого.
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().defer('search_vector')
+
+
 class Recipe(models.Model):
     """Модель рецептов пользователей."""
     author = models.ForeignKey(
@@ -90,10 +202,31 @@ class Recipe(models.Model):
         )
     )
 
+    search_vector = SearchVectorField(null=True, editable=False)
+    thumbnails_ready = models.BooleanField(
+        'Уменьшенные копии картинки готовы',
+        default=False,
+        editable=False
+    )
+
+    objects = RecipeManager()
+
     class Meta:
-        ordering = ('-pub_date', )
+        ordering = ('-pub_date', '-id')
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = (
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='recipe_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='recipe_author_pub_date_idx'
+            ),
+        ) + ((
+            GinIndex(fields=('search_vector',), name='recipe_search_idx'),
+        ) if POSTGRES_SEARCH else ())
 
     def __str__(self):
         return self.name
@@ -124,6 +257,12 @@ class IngredientRecipe(models.Model):
     class Meta:
         verbose_name = 'Количество ингредиента'
         verbose_name_plural = 'Количество ингредиентов'
+        indexes = (
+            models.Index(
+                fields=('recipe', 'ingredient'),
+                name='ingredient_recipe_idx'
+            ),
+        )
 
     def __str__(self):
         return (f'{self.ingredient.name} - {self.amount}'
@@ -148,6 +287,12 @@ class Favorite(models.Model):
     class Meta:
         verbose_name = 'Избранное'
         verbose_name_plural = 'Избранные'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe',),
+                name='unique_favorite'
+            ),
+        )
 
 
 class ShoppingCart(models.Model):
@@ -168,3 +313,284 @@ class ShoppingCart(models.Model):
     class Meta:
         verbose_name = 'Покупка'
         verbose_name_plural = 'Покупки'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe',),
+                name='unique_shopping_cart'
+            ),
+        )
+
+
+class ShoppingListQuerySet(models.QuerySet):
+    """Поддержка сводного списка покупок в актуальном состоянии."""
+
+    def live_totals(self, users=None, ingredients=None):
+        """Суммы ингредиентов, посчитанные заново по спискам покупок."""
+        lookups = {'recipe__shopping_cart__isnull': False}
+        if users is not None:
+            lookups['recipe__shopping_cart__user__in'] = users
+        if ingredients is not None:
+            lookups['ingredient__in'] = ingredients
+        return IngredientRecipe.objects.filter(**lookups).values_list(
+            'recipe__shopping_cart__user', 'ingredient'
+        ).annotate(total=Sum('amount')).order_by()
+
+    @staticmethod
+    def lock_users(users):
+        """Блокирует строки пользователей до конца транзакции.
+
+        Изменение списка покупок и его пересчёт для одного пользователя
+        идут по очереди: иначе одновременные пересчёты вставляют одни
+        и те же строки или сохраняют суммы без чужого изменения.
+        """
+        list(User.objects.select_for_update().filter(
+            pk__in=list(users)
+        ).order_by('pk').values_list('pk', flat=True))
+
+    def sync(self, users, ingredients):
+        """Пересчитывает строки только для указанных пар
+        (пользователь, ингредиент).
+
+        Вызывается в той же транзакции, что и изменение списков
+        покупок, после lock_users.
+        """
+        users, ingredients = list(users), list(ingredients)
+        if not users or not ingredients:
+            return
+        totals = self.live_totals(users, ingredients)
+        with transaction.atomic():
+            self.lock_users(users)
+            self.filter(user__in=users, ingredient__in=ingredients).delete()
+            self.bulk_create(
+                self.model(
+                    user_id=user, ingredient_id=ingredient, amount=total
+                )
+                for user, ingredient, total in totals
+            )
+
+    def sync_recipe(self, recipe, ingredients):
+        """Обновляет списки всех пользователей с рецептом в корзине."""
+        self.sync(
+            ShoppingCart.objects.filter(recipe=recipe).values_list(
+                'user', flat=True
+            ),
+            ingredients
+        )
+
+    def rebuild(self, batch_size=1000):
+        """Полностью пересобирает сводные списки покупок."""
+        totals = self.live_totals().iterator(chunk_size=batch_size)
+        with transaction.atomic():
+            self.all().delete()
+            batch = []
+            for user, ingredient, total in totals:
+                batch.append(self.model(
+                    user_id=user, ingredient_id=ingredient, amount=total
+                ))
+                if len(batch) >= batch_size:
+                    self.bulk_create(batch)
+                    batch = []
+            self.bulk_create(batch)
+
+
+class ShoppingListItem(models.Model):
+    """Сводный список покупок пользователя.
+
+    Сумма ингредиентов по всем рецептам из списка покупок,
+    пересчитывается при изменении списка или состава рецептов.
+    """
+    user = models.ForeignKey(
+        User,
+        verbose_name='Пользователь',
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        verbose_name='Ингредиент',
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+    )
+    amount = models.PositiveIntegerField('Количество')
+
+    objects = ShoppingListQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Ингредиент в списке покупок'
+        verbose_name_plural = 'Ингредиенты в списке покупок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'ingredient',),
+                name='unique_shopping_list_item'
+            ),
+        )
+
+
+class TimelineQuerySet(models.QuerySet):
+    """Ленты новых рецептов авторов из подписок.
+
+    Рецепт автора, у которого подписчиков не больше
+    TIMELINE_FANOUT_LIMIT, при публикации записывается в ленту каждого
+    подписчика. Рецепты авторов с большим числом подписчиков в ленты
+    не копируются, а подмешиваются при чтении.
+    """
+
+    @staticmethod
+    def is_popular(followers_count):
+        return followers_count > settings.TIMELINE_FANOUT_LIMIT
+
+    @staticmethod
+    def get_followers_count(author):
+        return User.objects.filter(pk=author).values_list(
+            'followers_count', flat=True
+        ).first() or 0
+
+    def add_recipes(self, users, recipes, batch_size=1000):
+        """Записывает рецепты в ленты пользователей."""
+        recipes = list(recipes.values_list('pk', 'author', 'pub_date'))
+        batch = []
+        for user in users:
+            for recipe, author, pub_date in recipes:
+                batch.append(self.model(
+                    user_id=user,
+                    recipe_id=recipe,
+                    author_id=author,
+                    pub_date=pub_date
+                ))
+                if len(batch) >= batch_size:
+                    self.bulk_create(batch, ignore_conflicts=True)
+                    batch = []
+        self.bulk_create(batch, ignore_conflicts=True)
+
+    def fan_out(self, recipe):
+        """Записывает новый рецепт в ленты подписчиков автора."""
+        if self.is_popular(self.get_followers_count(recipe.author_id)):
+            return
+        self.add_recipes(
+            Follow.objects.filter(author=recipe.author_id).values_list(
+                'user', flat=True
+            ).iterator(),
+            Recipe.objects.filter(pk=recipe.pk)
+        )
+
+    def follow(self, user, author):
+        """Переносит рецепты автора в ленту нового подписчика."""
+        if not self.is_popular(self.get_followers_count(author)):
+            self.add_recipes((user,), Recipe.objects.filter(author=author))
+
+    def unfollow(self, user, author):
+        """Убирает рецепты автора из ленты бывшего подписчика.
+
+        Если автор после этого перестал быть популярным, его рецепты
+        переносятся в ленты оставшихся подписчиков.
+        """
+        self.filter(user=user, author=author).delete()
+        if self.get_followers_count(author) == settings.TIMELINE_FANOUT_LIMIT:
+            self.add_recipes(
+                Follow.objects.filter(author=author).values_list(
+                    'user', flat=True
+                ),
+                Recipe.objects.filter(author=author)
+            )
+
+    def page(self, user, after=None, size=6):
+        """(дата публикации, id) рецептов ленты пользователя, новые
+        первыми.
+
+        after — (дата публикации, id) последнего рецепта предыдущей
+        страницы. Записи ленты и рецепты популярных авторов читаются
+        по индексам не больше size штук каждые и сливаются.
+        """
+        entries = self.filter(user=user)
+        recipes = Recipe.objects.filter(author__in=Follow.objects.filter(
+            user=user,
+            author__followers_count__gt=settings.TIMELINE_FANOUT_LIMIT
+        ).values('author'))
+        if after is not None:
+            pub_date, pk = after
+            entries = entries.filter(
+                Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, recipe__lt=pk)
+            )
+            recipes = recipes.filter(
+                Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, pk__lt=pk)
+            )
+        merged = heapq.merge(
+            entries.order_by('-pub_date', '-recipe').values_list(
+                'pub_date', 'recipe'
+            )[:size],
+            recipes.order_by('-pub_date', '-id').values_list(
+                'pub_date', 'id'
+            )[:size],
+            reverse=True
+        )
+        result = []
+        for key in merged:
+            # Рецепт автора, ставшего популярным, может остаться
+            # и в ленте: при слиянии такие повторы стоят рядом.
+            if not result or result[-1] != key:
+                result.append(key)
+            if len(result) == size:
+                break
+        return result
+
+    def rebuild(self, batch_size=1000):
+        """Пересчитывает счётчики подписчиков и заново собирает ленты."""
+        followers = Follow.objects.filter(author=OuterRef('pk')).order_by(
+        ).values('author').annotate(total=Count('pk')).values('total')
+        with transaction.atomic():
+            User.objects.update(followers_count=Coalesce(
+                Subquery(followers, output_field=models.IntegerField()), 0
+            ))
+            self.all().delete()
+            follows = Follow.objects.filter(
+                author__followers_count__lte=settings.TIMELINE_FANOUT_LIMIT
+            ).order_by('author').values_list('author', 'user')
+            for author, pairs in groupby(
+                follows.iterator(), key=lambda pair: pair[0]
+            ):
+                self.add_recipes(
+                    [user for _, user in pairs],
+                    Recipe.objects.filter(author=author),
+                    batch_size
+                )
+
+
+class TimelineEntry(models.Model):
+    """Рецепт в ленте подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        verbose_name='Пользователь',
+        on_delete=models.CASCADE,
+        related_name='timeline',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        verbose_name='Рецепт',
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+    )
+    author = models.ForeignKey(
+        User,
+        verbose_name='Автор',
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    objects = TimelineQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Рецепт в ленте подписок'
+        verbose_name_plural = 'Ленты подписок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe',),
+                name='unique_timeline_entry'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date', '-recipe'),
+                name='timeline_user_pub_date_idx'
+            ),
+        )
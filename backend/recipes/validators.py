@@ -2,5 +2,5 @@ from django.core.validators import RegexValidator
 
 
 class ColorValidator(RegexValidator):
-    regex = '^#([-a-fA-F0-9_]$)'
+    regex = '^#([a-fA-F0-9]{6}|[a-fA-F0-9]{3})$'
     flags = 0
@@ -0,0 +1,93 @@
+"""Замер скорости подсказок ингредиентов.
+
+Запуск из каталога backend:
+    python -m scripts.bench_autocomplete --scale 100
+"""
+import argparse
+import csv
+import os
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+django.setup()
+
+from api.autocomplete import IngredientIndex  # noqa: E402
+
+DATA_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'data', 'ingredients.csv'
+)
+QUERIES = (
+    ('по началу', ('а', 'мо', 'сах', 'карт', 'масло', 'сыр', 'перец', 'яйц',
+                   'ко')),
+    ('по подстроке', ('рец', 'ный', 'вый', 'ель', 'кий', 'ичн')),
+    ('без совпадений', ('ъ', 'zz', 'щщщ', 'xyz', 'абвгд', 'сыр x')),
+)
+
+
+def load_names(scale):
+    with open(DATA_PATH, encoding='utf-8') as csv_file:
+        names = [row[0] for row in csv.reader(csv_file) if row]
+    scaled = []
+    for copy in range(scale):
+        for name in names:
+            scaled.append(
+                (len(scaled), name if copy == 0 else f'{name} {copy}')
+            )
+    return scaled
+
+
+def naive_search(ingredients, query, limit):
+    query = query.lower()
+    prefix = sorted(
+        (name.lower(), pk) for pk, name in ingredients
+        if name.lower().startswith(query)
+    )
+    result = [pk for name, pk in prefix[:limit]]
+    for pk, name in ingredients:
+        if len(result) == limit:
+            break
+        if query in name.lower() and pk not in result:
+            result.append(pk)
+    return result
+
+
+def measure(search, queries, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for query in queries:
+            search(query)
+    return (time.perf_counter() - started) / (repeat * len(queries))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scale', type=int, default=100)
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    ingredients = load_names(args.scale)
+    started = time.perf_counter()
+    index = IngredientIndex(ingredients)
+    build_time = time.perf_counter() - started
+    print(f'Ингредиентов: {len(index)}, индекс построен за '
+          f'{build_time * 1000:.1f} мс')
+
+    for name, queries in QUERIES:
+        indexed = measure(
+            lambda q: index.search(q, args.limit), queries, args.repeat
+        )
+        naive = measure(
+            lambda q: naive_search(ingredients, q, args.limit),
+            queries,
+            max(1, args.repeat // 10)
+        )
+        print(f'{name}: индекс {indexed * 1000:.3f} мс, '
+              f'перебор списка {naive * 1000:.3f} мс на запрос')
+
+
+if __name__ == '__main__':
+    main()
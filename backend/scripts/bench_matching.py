@@ -0,0 +1,94 @@
+"""Замер индекса подбора рецептов по ингредиентам.
+
+Запуск из каталога backend:
+    python -m scripts.bench_matching --recipes 500000
+"""
+import argparse
+import os
+import random
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+django.setup()
+
+from api.matching import RecipeIngredientIndex  # noqa: E402
+
+TAGS = ('breakfast', 'lunch', 'dinner')
+
+
+def random_recipe(generator, ingredients):
+    return (
+        generator.sample(range(1, ingredients + 1), generator.randint(3, 12)),
+        generator.sample(TAGS, generator.randint(1, 2))
+    )
+
+
+def measure(function, arguments):
+    started = time.perf_counter()
+    for argument in arguments:
+        function(argument)
+    return (time.perf_counter() - started) / len(arguments)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--recipes', type=int, default=500000)
+    parser.add_argument('--ingredients', type=int, default=2000)
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--updates', type=int, default=50)
+    args = parser.parse_args()
+
+    generator = random.Random(1)
+    recipes = {
+        pk: random_recipe(generator, args.ingredients)
+        for pk in range(1, args.recipes + 1)
+    }
+    started = time.perf_counter()
+    index = RecipeIngredientIndex(
+        sorted(recipes),
+        (
+            (pk, ingredient) for pk, (ingredients, tags) in recipes.items()
+            for ingredient in ingredients
+        ),
+        (
+            (pk, tag) for pk, (ingredients, tags) in recipes.items()
+            for tag in tags
+        )
+    )
+    build_time = time.perf_counter() - started
+    bitmaps = len(index.ingredients) + len(index.tags) + len(index.by_total)
+    dense = bitmaps * ((len(index) + 7) // 8)
+    print(f'Рецептов: {len(index)}, индекс построен за {build_time:.2f} с, '
+          f'карты занимают {index.size() / 2 ** 20:.1f} МБ '
+          f'(несжатые — {dense / 2 ** 20:.1f} МБ)')
+
+    queries = [
+        generator.sample(range(1, args.ingredients + 1), 10)
+        for _ in range(args.queries)
+    ]
+    query_time = measure(lambda query: index.match(query, limit=20), queries)
+    tagged_time = measure(
+        lambda query: index.match(query, tags=['dinner'], limit=20), queries
+    )
+    print(f'Подбор: {query_time * 1000:.1f} мс, с тегом '
+          f'{tagged_time * 1000:.1f} мс на запрос')
+
+    last = args.recipes
+    batches = []
+    for _ in range(args.updates):
+        batch = {
+            pk: random_recipe(generator, args.ingredients)
+            for pk in generator.sample(range(1, args.recipes + 1), 5)
+        }
+        last += 1
+        batch[last] = random_recipe(generator, args.ingredients)
+        batches.append(batch)
+    update_time = measure(index.update, batches)
+    print(f'Изменение шести рецептов: {update_time * 1000:.1f} мс '
+          f'вместо пересборки за {build_time:.2f} с')
+
+
+if __name__ == '__main__':
+    main()
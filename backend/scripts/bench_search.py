@@ -0,0 +1,154 @@
+"""Замер скорости поиска рецептов на синтетических данных.
+
+Запуск из каталога backend:
+    python -m scripts.bench_search --count 1000000
+    python -m scripts.bench_search --count 1000000 --database
+
+С --database рецепты записываются в базу из настроек (PostgreSQL)
+внутри транзакции, которая в конце откатывается, и сравниваются
+поиск по GIN-индексу и icontains.
+"""
+import argparse
+import csv
+import os
+import random
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+django.setup()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.db import connection, transaction  # noqa: E402
+from django.db.models import Q  # noqa: E402
+
+from recipes.models import Recipe  # noqa: E402
+
+from api.search import RecipeSearchIndex  # noqa: E402
+
+DATA_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'data', 'ingredients.csv'
+)
+DISHES = (
+    'суп', 'салат', 'пирог', 'запеканка', 'каша', 'рагу', 'омлет',
+    'котлеты', 'паста', 'плов', 'блины', 'сырники', 'жаркое', 'борщ',
+)
+STYLES = (
+    'домашний', 'быстрый', 'праздничный', 'постный', 'бабушкин',
+    'летний', 'острый', 'сливочный', 'деревенский', 'легкий',
+)
+WORDS = (
+    'нарезать', 'обжарить', 'добавить', 'перемешать', 'варить',
+    'запекать', 'минут', 'духовке', 'сковороде', 'кастрюле', 'подавать',
+    'горячим', 'посолить', 'поперчить', 'огне', 'крышкой', 'тесто',
+)
+QUERIES = (
+    'суп', 'борщ со свеклой', 'пирог с яблоками', 'быстрый омлет',
+    'картофель', 'сливочный соус', 'курица в духовке', 'сыр',
+)
+
+
+def load_ingredients():
+    with open(DATA_PATH, encoding='utf-8') as csv_file:
+        return [row[0] for row in csv.reader(csv_file) if row]
+
+
+def generate(count, seed=0):
+    """Рецепты (id, название, ингредиенты, описание)."""
+    rng = random.Random(seed)
+    ingredients = load_ingredients()
+    for pk in range(1, count + 1):
+        used = rng.sample(ingredients, 5)
+        name = f'{rng.choice(STYLES)} {rng.choice(DISHES)} {used[0]}'
+        text = ' '.join(rng.choice(WORDS) for _ in range(12))
+        yield pk, name, ' '.join(used), text
+
+
+def naive_search(recipes, query, limit):
+    words = query.lower().split()
+    return [
+        pk for pk, *fields in recipes
+        if all(word in ' '.join(fields).lower() for word in words)
+    ][:limit]
+
+
+def measure(search, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for query in QUERIES:
+            search(query)
+    return (time.perf_counter() - started) / (repeat * len(QUERIES))
+
+
+def bench_index(recipes, limit, repeat):
+    started = time.perf_counter()
+    index = RecipeSearchIndex(recipes)
+    build_time = time.perf_counter() - started
+    print(f'Рецептов: {len(index)}, индекс построен за {build_time:.1f} с')
+    indexed = measure(lambda q: index.search(q, limit), repeat)
+    naive = measure(lambda q: naive_search(recipes, q, limit), 1)
+    print(f'Индекс в памяти:  {indexed * 1000:.3f} мс на запрос')
+    print(f'Перебор списка:   {naive * 1000:.3f} мс на запрос')
+
+
+def bench_database(recipes, limit, repeat):
+    if connection.vendor != 'postgresql':
+        print('Замер в базе требует PostgreSQL.')
+        return
+    with transaction.atomic():
+        author = get_user_model().objects.create(
+            username='bench_search', email='bench_search@example.com'
+        )
+        started = time.perf_counter()
+        batch = []
+        for pk, name, ingredients, text in recipes:
+            batch.append(Recipe(
+                author=author,
+                name=name[:200],
+                text=f'{ingredients}. {text}',
+                cooking_time=10,
+                image='recipes/images/bench.jpg'
+            ))
+            if len(batch) == 10000:
+                Recipe.objects.bulk_create(batch)
+                batch = []
+        Recipe.objects.bulk_create(batch)
+        Recipe.objects.filter(author=author).update_search_vector()
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {Recipe._meta.db_table}')
+        print(f'Записано за {time.perf_counter() - started:.1f} с')
+        indexed = measure(
+            lambda q: list(Recipe.objects.search(q).values('id')[:limit]),
+            repeat
+        )
+        naive = measure(
+            lambda q: list(Recipe.objects.filter(*(
+                Q(name__icontains=word) | Q(text__icontains=word)
+                for word in q.split()
+            )).values('id')[:limit]),
+            1
+        )
+        print(f'SearchVector + GIN: {indexed * 1000:.3f} мс на запрос')
+        print(f'icontains:          {naive * 1000:.3f} мс на запрос')
+        transaction.set_rollback(True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=1000000)
+    parser.add_argument('--limit', type=int, default=6)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--database', action='store_true')
+    args = parser.parse_args()
+
+    recipes = list(generate(args.count))
+    if args.database:
+        bench_database(recipes, args.limit, args.repeat)
+    else:
+        bench_index(recipes, args.limit, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""Замер сериализации ленты рецептов и подписок: поля DRF против
+быстрых представлений.
+
+Запуск из каталога backend:
+    python -m scripts.bench_serializers --page 100 --repeat 50
+
+Объекты создаются в памяти вместе с предзагруженными связями, база
+не нужна: замеряется только сборка данных ответа.
+"""
+import argparse
+import os
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+django.setup()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.contrib.auth.models import AnonymousUser  # noqa: E402
+from django.test import RequestFactory  # noqa: E402
+
+from recipes.models import (  # noqa: E402
+    Ingredient,
+    IngredientRecipe,
+    Recipe,
+    Tag
+)
+
+from api.serializers import (  # noqa: E402
+    RecipeListSerializer,
+    SubscribeSerializer
+)
+
+User = get_user_model()
+
+
+def make_user(pk):
+    return User(
+        id=pk,
+        email=f'user{pk}@example.com',
+        username=f'user{pk}',
+        first_name='Имя',
+        last_name='Фамилия'
+    )
+
+
+def make_recipes(count, author=None):
+    tags = [
+        Tag(id=pk, name=f'Тег {pk}', color=f'#00000{pk}', slug=f'tag{pk}')
+        for pk in range(1, 4)
+    ]
+    ingredients = [
+        Ingredient(id=pk, name=f'Ингредиент {pk}', measurement_unit='г')
+        for pk in range(1, 11)
+    ]
+    recipes = []
+    for pk in range(1, count + 1):
+        recipe = Recipe(
+            id=pk,
+            author=author or make_user(pk % 10 + 1),
+            name=f'Рецепт {pk}',
+            image=f'recipes/images/{pk}.jpg',
+            text='Описание рецепта ' * 20,
+            cooking_time=pk % 90 + 1
+        )
+        recipe._prefetched_objects_cache = {
+            'tags': tags[:pk % 3 + 1],
+            'ingredient_recipe': [
+                IngredientRecipe(
+                    id=pk * 10 + number,
+                    recipe=recipe,
+                    ingredient=ingredients[(pk + number) % 10],
+                    amount=number + 1
+                )
+                for number in range(8)
+            ],
+        }
+        recipes.append(recipe)
+    return recipes
+
+
+def make_authors(count, recipes_per_author):
+    authors = []
+    for pk in range(1, count + 1):
+        author = make_user(pk)
+        author.recipes_count = recipes_per_author
+        author._prefetched_objects_cache = {
+            'recipes': make_recipes(recipes_per_author, author),
+        }
+        authors.append(author)
+    return authors
+
+
+def measure(serializer_class, objects, request, compiled, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        serializer_class(
+            objects,
+            many=True,
+            context={'request': request, 'compiled': compiled}
+        ).data
+    return (time.perf_counter() - started) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--page', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    request = RequestFactory().get('/api/', {'recipes_limit': 3})
+    request.user = AnonymousUser()
+    payloads = (
+        ('Лента рецептов', RecipeListSerializer, make_recipes(args.page)),
+        ('Подписки', SubscribeSerializer, make_authors(args.page, 3)),
+    )
+    for name, serializer_class, objects in payloads:
+        drf = measure(serializer_class, objects, request, False, args.repeat)
+        compiled = measure(
+            serializer_class, objects, request, True, args.repeat
+        )
+        print(
+            f'{name}, {len(objects)} объектов: DRF {drf * 1000:.2f} мс, '
+            f'быстро {compiled * 1000:.2f} мс, в {drf / compiled:.1f} раза'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -1,28 +1,233 @@
 import csv
+import io
+import json
+import time
+from itertools import islice
 
-from django.db.utils import IntegrityError
-
-
-def print_error(error, row, print_error):
-    if print_error:
-        print('Error:', error.args, '\nRow ID:', row.get('id'))
-
-
-def create_models(file_path, model, print_errors):
-    with open(file_path, encoding='utf-8', mode='r') as csv_file:
-        csv_reader = csv.DictReader(csv_file)
-        total_count = 0
-        successfull = 0
-        for row in csv_reader:
-            total_count += 1
-            try:
-                model.objects.get_or_create(**row)
-                successfull += 1
-            except IntegrityError as error:
-                print_error(error, row, print_errors)
-            except ValueError as error:
-                print_error(error, row, print_errors)
-        errors = total_count - successfull
-        print('Model: {}\nSuccessfull: {}; errors: {}'.format(
-            model.__name__, successfull, errors
-        ))
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+
+from recipes.models import Ingredient, Tag
+
+# Модель, поля в файле и поля, по которым запись считается той же самой.
+IMPORT_MODELS = {
+    'ingredients': (Ingredient, ('name', 'measurement_unit'),
+                    ('name', 'measurement_unit')),
+    'tags': (Tag, ('name', 'color', 'slug'), ('slug',)),
+}
+
+
+def read_rows(file_path, fields, file_format):
+    """Построчно читает файл, не загружая его в память целиком.
+
+    CSV может быть с заголовком или без него, тогда столбцы идут
+    в порядке fields. JSON Lines читается построчно, обычный JSON
+    (массив объектов) загружается целиком.
+    """
+    with open(file_path, encoding='utf-8') as data_file:
+        if file_format == 'json':
+            yield from json.load(data_file)
+            return
+        if file_format == 'jsonl':
+            for line in data_file:
+                if line.strip():
+                    yield json.loads(line)
+            return
+        reader = csv.reader(data_file)
+        first = next(reader, None)
+        if first is None:
+            return
+        header = [column.strip() for column in first]
+        if set(header) >= set(fields):
+            columns = header
+        else:
+            columns = fields
+            yield dict(zip(columns, first))
+        for row in reader:
+            yield dict(zip(columns, row))
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
+
+
+class BulkLoader:
+    """Пакетная загрузка справочника.
+
+    Файл читается частями по batch_size строк. Каждая часть проверяется,
+    очищается от дублей и записывается одной транзакцией через
+    bulk_create(ignore_conflicts=True), а на PostgreSQL — через COPY во
+    временную таблицу и INSERT ... ON CONFLICT. В памяти одновременно
+    находится только одна часть файла.
+
+    Из отклонённых строк хранятся первые max_rejected, остальные
+    только считаются.
+    """
+
+    def __init__(self, model, fields, key_fields, batch_size=5000,
+                 dry_run=False, upsert=False, use_copy=True,
+                 max_rejected=100):
+        self.model = model
+        self.fields = fields
+        self.key_fields = key_fields
+        self.update_fields = [
+            field for field in fields if field not in key_fields
+        ]
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.upsert = upsert and bool(self.update_fields)
+        self.use_copy = use_copy and connection.vendor == 'postgresql'
+        self.total = 0
+        self.created = 0
+        self.updated = 0
+        self.duplicates = 0
+        self.rejected = []
+        self.rejected_count = 0
+        self.max_rejected = max_rejected
+        self.elapsed = 0
+
+    def key(self, values):
+        return tuple(values[field] for field in self.key_fields)
+
+    def clean(self, number, row):
+        values = {
+            field: str(row.get(field) or '').strip() for field in self.fields
+        }
+        try:
+            self.model(**values).clean_fields()
+        except ValidationError as error:
+            self.rejected_count += 1
+            if len(self.rejected) < self.max_rejected:
+                self.rejected.append((number, row, error.message_dict))
+            return None
+        return values
+
+    def load(self, rows):
+        started = time.monotonic()
+        for chunk in chunked(enumerate(rows, 1), self.batch_size):
+            self.load_chunk(chunk)
+        self.elapsed = time.monotonic() - started
+
+    def load_chunk(self, chunk):
+        unique = {}
+        for number, row in chunk:
+            self.total += 1
+            values = self.clean(number, row)
+            if values is None:
+                continue
+            if self.key(values) in unique:
+                self.duplicates += 1
+            unique[self.key(values)] = values
+        if not unique:
+            return
+        if self.dry_run:
+            existing = self.get_existing(unique)
+            self.created += len(unique.keys() - existing.keys())
+            if self.upsert:
+                self.updated += len(existing)
+            else:
+                self.duplicates += len(existing)
+            return
+        with transaction.atomic():
+            if self.use_copy:
+                self.copy_chunk(list(unique.values()))
+            else:
+                self.insert_chunk(unique)
+
+    def get_existing(self, unique):
+        """Уже сохранённые записи с ключами из текущей части файла."""
+        first_field = self.key_fields[0]
+        candidates = self.model.objects.filter(**{
+            f'{first_field}__in': {key[0] for key in unique}
+        }).values('pk', *self.fields)
+        return {
+            self.key(values): values
+            for values in candidates if self.key(values) in unique
+        }
+
+    def insert_chunk(self, unique):
+        existing = self.get_existing(unique)
+        new = {
+            key: values for key, values in unique.items()
+            if key not in existing
+        }
+        # bulk_create с ignore_conflicts не сообщает, сколько строк
+        # вставлено, а часть ключей могли добавить параллельно после
+        # чтения existing, поэтому они считаются до и после вставки.
+        before = len(self.get_existing(new))
+        self.model.objects.bulk_create(
+            [self.model(**values) for values in new.values()],
+            ignore_conflicts=True
+        )
+        inserted = len(self.get_existing(new)) - before
+        self.created += inserted
+        self.duplicates += len(new) - inserted
+        if not self.upsert:
+            self.duplicates += len(existing)
+            return
+        changed = []
+        for key, current in existing.items():
+            values = unique[key]
+            if any(current[f] != values[f] for f in self.update_fields):
+                changed.append(self.model(pk=current['pk'], **values))
+        self.model.objects.bulk_update(changed, self.update_fields)
+        self.updated += len(changed)
+        self.duplicates += len(existing) - len(changed)
+
+    def copy_chunk(self, rows):
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        columns = ', '.join(
+            connection.ops.quote_name(field) for field in self.fields
+        )
+        keys = ', '.join(
+            connection.ops.quote_name(field) for field in self.key_fields
+        )
+        if self.upsert:
+            updates = ', '.join(
+                f'{connection.ops.quote_name(field)} = '
+                f'EXCLUDED.{connection.ops.quote_name(field)}'
+                for field in self.update_fields
+            )
+            changed = ', '.join(
+                f'{table}.{connection.ops.quote_name(field)}'
+                for field in self.update_fields
+            )
+            excluded = ', '.join(
+                f'EXCLUDED.{connection.ops.quote_name(field)}'
+                for field in self.update_fields
+            )
+            conflict = (
+                f'ON CONFLICT ({keys}) DO UPDATE SET {updates} '
+                f'WHERE ROW({changed}) IS DISTINCT FROM ROW({excluded})'
+            )
+        else:
+            conflict = 'ON CONFLICT DO NOTHING'
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for values in rows:
+            writer.writerow([values[field] for field in self.fields])
+        buffer.seek(0)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMPORARY TABLE import_rows ON COMMIT DROP AS '
+                f'SELECT {columns} FROM {table} WITH NO DATA'
+            )
+            cursor.cursor.copy_expert(
+                f'COPY import_rows ({columns}) FROM STDIN WITH CSV', buffer
+            )
+            cursor.execute(
+                f'INSERT INTO {table} ({columns}) '
+                f'SELECT {columns} FROM import_rows {conflict} '
+                'RETURNING (xmax = 0)'
+            )
+            inserted = [row[0] for row in cursor.fetchall()]
+            # Внутри внешней транзакции таблица дожила бы до её коммита
+            # и следующий пакет не смог бы создать её заново.
+            cursor.execute('DROP TABLE import_rows')
+        self.created += sum(inserted)
+        self.updated += len(inserted) - sum(inserted)
+        self.duplicates += len(rows) - len(inserted)
@@ -0,0 +1,169 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import Barrier
+
+import pytest
+from django.core.cache import cache
+from django.db import connection, connections
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    IngredientRecipe,
+    Recipe,
+    ShoppingCart,
+    Tag
+)
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Версии, каталоги и ответы из кэша не переходят между тестами."""
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+
+
+@pytest.fixture
+def postgresql_only():
+    if connection.vendor != 'postgresql':
+        pytest.skip('SQLite не выполняет записи одновременно.')
+
+
+@pytest.fixture
+def run_concurrently():
+    """Выполняет функции из разных потоков одновременно."""
+
+    def run_all(requests):
+        barrier = Barrier(len(requests))
+
+        def run(request):
+            barrier.wait()
+            try:
+                return request()
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(len(requests)) as executor:
+            return list(executor.map(run, requests))
+
+    return run_all
+
+
+def make_user(django_user_model, username):
+    return django_user_model.objects.create_user(
+        email=f'{username}@example.com',
+        username=username,
+        first_name='Имя',
+        last_name='Фамилия',
+        password='Pa55w0rd-test'
+    )
+
+
+def authorized_client(user):
+    client = APIClient()
+    token, _ = Token.objects.get_or_create(user=user)
+    client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    return client
+
+
+@pytest.fixture
+def user(django_user_model):
+    return make_user(django_user_model, 'reader')
+
+
+@pytest.fixture
+def author(django_user_model):
+    return make_user(django_user_model, 'author')
+
+
+@pytest.fixture
+def user_client(user):
+    return authorized_client(user)
+
+
+@pytest.fixture
+def author_client(author):
+    return authorized_client(author)
+
+
+@pytest.fixture
+def client_for(db):
+    """Новый клиент пользователя, например для каждого потока."""
+    return authorized_client
+
+
+@pytest.fixture
+def guest_client():
+    return APIClient()
+
+
+@pytest.fixture
+def tags(db):
+    return [
+        Tag.objects.create(
+            name=f'Тег {number}',
+            color=f'#00000{number}',
+            slug=f'tag{number}'
+        )
+        for number in range(3)
+    ]
+
+
+@pytest.fixture
+def ingredients(db):
+    return [
+        Ingredient.objects.create(
+            name=f'Ингредиент {number}',
+            measurement_unit='г'
+        )
+        for number in range(10)
+    ]
+
+
+@pytest.fixture
+def make_recipes(author, tags, ingredients):
+    """Рецепты автора с тегами и тремя ингредиентами каждый."""
+
+    def make(count, recipe_author=None):
+        recipes = []
+        for number in range(count):
+            recipe = Recipe.objects.create(
+                author=recipe_author or author,
+                name=f'Рецепт {number}',
+                image=f'recipes/images/{number}.png',
+                text='Описание рецепта',
+                cooking_time=number + 1
+            )
+            recipe.tags.set(tags[:number % len(tags) + 1])
+            IngredientRecipe.objects.bulk_create(
+                IngredientRecipe(
+                    recipe=recipe,
+                    ingredient=ingredients[(number + shift) % len(
+                        ingredients
+                    )],
+                    amount=shift + 1
+                )
+                for shift in range(3)
+            )
+            recipes.append(recipe)
+        return recipes
+
+    return make
+
+
+@pytest.fixture
+def recipes(make_recipes, user):
+    """Двенадцать рецептов, первые три — в избранном и списке покупок
+    пользователя."""
+    recipes = make_recipes(12)
+    for recipe in recipes[:3]:
+        Favorite.objects.create(user=user, recipe=recipe)
+        ShoppingCart.objects.create(user=user, recipe=recipe)
+    return recipes
@@ -0,0 +1,50 @@
+import pytest
+
+USERS_URL = '/api/users/'
+PASSWORD = 'Pa55w0rd-test'
+
+
+@pytest.fixture
+def followed_user(user, user_client, author_client):
+    """Пользователь с токеном в кэше и одним подписчиком, который
+    появился после загрузки токена."""
+    assert user_client.get(f'{USERS_URL}me/').status_code == 200
+    response = author_client.post(f'{USERS_URL}{user.id}/subscribe/')
+    assert response.status_code == 201
+    return user
+
+
+@pytest.mark.django_db
+def test_set_password_keeps_followers_count(followed_user, user_client):
+    response = user_client.post(f'{USERS_URL}set_password/', {
+        'current_password': PASSWORD,
+        'new_password': 'N3w-pa55w0rd-test'
+    })
+    assert response.status_code == 204
+    followed_user.refresh_from_db()
+    assert followed_user.followers_count == 1
+    assert followed_user.check_password('N3w-pa55w0rd-test')
+
+
+@pytest.mark.django_db
+def test_profile_update_keeps_followers_count(followed_user, user_client):
+    response = user_client.patch(f'{USERS_URL}me/', {'first_name': 'Новое'})
+    assert response.status_code == 200
+    followed_user.refresh_from_db()
+    assert followed_user.followers_count == 1
+    assert followed_user.first_name == 'Новое'
+
+
+@pytest.mark.django_db
+def test_cached_token_follows_user_changes(user, user_client):
+    assert user_client.get(f'{USERS_URL}me/').status_code == 200
+    user.is_active = False
+    user.save()
+    assert user_client.get(f'{USERS_URL}me/').status_code == 401
+
+
+@pytest.mark.django_db
+def test_cached_token_is_dropped_after_logout(user_client):
+    assert user_client.get(f'{USERS_URL}me/').status_code == 200
+    assert user_client.post('/api/auth/token/logout/').status_code == 204
+    assert user_client.get(f'{USERS_URL}me/').status_code == 401
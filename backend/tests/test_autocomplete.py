@@ -0,0 +1,28 @@
+from api.autocomplete import IngredientIndex
+
+INGREDIENTS = (
+    (1, 'Сахар'),
+    (2, 'Сахарная пудра'),
+    (3, 'Ванильный сахар'),
+    (4, 'Тростниковый сахар'),
+    (5, 'Соль'),
+)
+
+
+def test_prefix_matches_go_first():
+    index = IngredientIndex(INGREDIENTS)
+    assert index.search('сах', 10) == [1, 2, 3, 4]
+    assert index.search(' САХАР ', 2) == [1, 2]
+
+
+def test_substring_matches():
+    index = IngredientIndex(INGREDIENTS)
+    assert index.search('льный', 10) == [3]
+    assert index.search('ль', 10) == [3, 5]
+
+
+def test_missing_query():
+    index = IngredientIndex(INGREDIENTS)
+    assert index.search('перец', 10) == []
+    assert index.search('щ', 10) == []
+    assert index.search('', 10) == []
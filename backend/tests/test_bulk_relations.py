@@ -0,0 +1,118 @@
+import pytest
+
+from api import services
+from recipes.models import Favorite, ShoppingCart, ShoppingListItem
+
+RECIPES_URL = '/api/recipes/'
+MISSING_ID = 10 ** 6
+
+
+def shopping_list(user):
+    return set(ShoppingListItem.objects.filter(user=user).values_list(
+        'ingredient', 'amount'
+    ))
+
+
+def live_shopping_list(user):
+    return set(ShoppingListItem.objects.live_totals(users=[user]).values_list(
+        'ingredient', 'total'
+    ))
+
+
+@pytest.fixture
+def cart(user, recipes):
+    """Список покупок пользователя, собранный по корзине фикстуры
+    recipes."""
+    ShoppingListItem.objects.rebuild()
+    assert shopping_list(user)
+    return recipes
+
+
+def statuses(response):
+    assert response.status_code == 200
+    return [
+        (item['id'], item['status']) for item in response.json()['results']
+    ]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('path, model', (
+    ('favorite/bulk/', Favorite),
+    ('shopping_cart/bulk/', ShoppingCart),
+))
+def test_bulk_add_mixed_ids(user, user_client, cart, path, model):
+    ids = [cart[0].id, cart[5].id, MISSING_ID, cart[6].id, cart[5].id]
+    response = user_client.post(
+        f'{RECIPES_URL}{path}', {'recipes': ids}, format='json'
+    )
+    assert statuses(response) == [
+        (cart[0].id, 'exists'),
+        (cart[5].id, 'added'),
+        (MISSING_ID, 'not_found'),
+        (cart[6].id, 'added'),
+    ]
+    assert set(model.objects.filter(user=user).values_list(
+        'recipe', flat=True
+    )) == {recipe.id for recipe in cart[:3]} | {cart[5].id, cart[6].id}
+    assert shopping_list(user) == live_shopping_list(user)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('path, model', (
+    ('favorite/bulk/', Favorite),
+    ('shopping_cart/bulk/', ShoppingCart),
+))
+def test_bulk_remove_mixed_ids(user, user_client, cart, path, model):
+    ids = [cart[0].id, cart[5].id, MISSING_ID, cart[1].id]
+    response = user_client.delete(
+        f'{RECIPES_URL}{path}', {'recipes': ids}, format='json'
+    )
+    assert statuses(response) == [
+        (cart[0].id, 'removed'),
+        (cart[5].id, 'absent'),
+        (MISSING_ID, 'absent'),
+        (cart[1].id, 'removed'),
+    ]
+    assert list(model.objects.filter(user=user).values_list(
+        'recipe', flat=True
+    )) == [cart[2].id]
+    assert shopping_list(user) == live_shopping_list(user)
+
+
+@pytest.mark.django_db
+def test_bulk_add_status_follows_insert(monkeypatch, user, user_client, cart):
+    insert_relations = services.insert_relations
+
+    def insert_concurrently(model, user, recipe_ids):
+        # Связь появляется между чтением существующих и вставкой.
+        Favorite.objects.create(user=user, recipe_id=recipe_ids[0])
+        return insert_relations(model, user, recipe_ids)
+
+    monkeypatch.setattr(services, 'insert_relations', insert_concurrently)
+    response = user_client.post(
+        f'{RECIPES_URL}favorite/bulk/',
+        {'recipes': [cart[5].id, cart[6].id]},
+        format='json'
+    )
+    assert statuses(response) == [
+        (cart[5].id, 'exists'), (cart[6].id, 'added')
+    ]
+
+
+@pytest.mark.django_db
+def test_clear_shopping_cart(user, user_client, cart):
+    response = user_client.delete(f'{RECIPES_URL}shopping_cart/clear/')
+    assert response.status_code == 204
+    assert not ShoppingCart.objects.filter(user=user).exists()
+    assert shopping_list(user) == live_shopping_list(user) == set()
+    assert Favorite.objects.filter(user=user).count() == 3
+    response = user_client.delete(f'{RECIPES_URL}shopping_cart/clear/')
+    assert response.status_code == 204
+
+
+@pytest.mark.django_db
+def test_bulk_requires_ids(user_client, cart):
+    response = user_client.post(
+        f'{RECIPES_URL}favorite/bulk/', {'recipes': []}, format='json'
+    )
+    assert response.status_code == 400
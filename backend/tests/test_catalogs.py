@@ -0,0 +1,28 @@
+import pytest
+
+TAGS_URL = '/api/tags/'
+
+
+@pytest.mark.django_db
+def test_catalog_served_from_cache(
+    guest_client, tags, django_assert_num_queries
+):
+    guest_client.get(TAGS_URL)
+    with django_assert_num_queries(0):
+        response = guest_client.get(TAGS_URL)
+        detail = guest_client.get(f'{TAGS_URL}{tags[0].id}/')
+    assert response['Content-Type'] == 'application/json'
+    assert [tag['slug'] for tag in response.json()] == [
+        tag.slug for tag in tags
+    ]
+    assert detail.json()['slug'] == tags[0].slug
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('url', (TAGS_URL, f'{TAGS_URL}{{pk}}/'))
+def test_browsable_api_is_not_served_from_catalog(guest_client, tags, url):
+    url = url.format(pk=tags[0].id)
+    guest_client.get(url)
+    response = guest_client.get(url, HTTP_ACCEPT='text/html')
+    assert response.status_code == 200
+    assert response['Content-Type'].startswith('text/html')
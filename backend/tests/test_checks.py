@@ -0,0 +1,16 @@
+from api.checks import check_shared_cache
+
+
+def test_local_cache_is_reported(settings):
+    settings.CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }}
+    assert [error.id for error in check_shared_cache(None)] == ['api.W001']
+
+
+def test_shared_cache_passes(settings):
+    settings.CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+        'LOCATION': 'memcached:11211',
+    }}
+    assert check_shared_cache(None) == []
@@ -0,0 +1,48 @@
+import pytest
+from django.utils.http import http_date
+
+RECIPES_URL = '/api/recipes/'
+
+
+@pytest.mark.django_db
+def test_matching_etag_returns_not_modified(user_client, recipes):
+    response = user_client.get(RECIPES_URL)
+    assert 'Last-Modified' not in response
+    etag = response['ETag']
+    response = user_client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304
+    assert response['ETag'] == etag
+
+
+@pytest.mark.django_db
+def test_if_modified_since_is_ignored(user_client, recipes):
+    response = user_client.get(
+        RECIPES_URL, HTTP_IF_MODIFIED_SINCE=http_date(2 ** 31)
+    )
+    assert response.status_code == 200
+
+
+@pytest.mark.django_db
+def test_etag_depends_on_format(user_client, recipes):
+    json_response = user_client.get(RECIPES_URL)
+    html_response = user_client.get(RECIPES_URL, HTTP_ACCEPT='text/html')
+    assert html_response['Content-Type'].startswith('text/html')
+    assert html_response['ETag'] != json_response['ETag']
+    assert 'Accept' in json_response['Vary']
+    response = user_client.get(
+        RECIPES_URL,
+        HTTP_ACCEPT='text/html',
+        HTTP_IF_NONE_MATCH=json_response['ETag']
+    )
+    assert response.status_code == 200
+
+
+@pytest.mark.django_db(transaction=True)
+def test_etag_changes_after_write(author_client, recipes):
+    url = f'{RECIPES_URL}{recipes[0].id}/'
+    etag = author_client.get(url)['ETag']
+    response = author_client.patch(url, {'text': 'Новое описание'})
+    assert response.status_code == 200
+    response = author_client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response['ETag'] != etag
@@ -0,0 +1,84 @@
+import csv
+import io
+
+import pytest
+
+from api.exports import FONT_NAME, register_font
+from recipes.models import ShoppingListItem
+
+RECIPES_URL = '/api/recipes/'
+DOWNLOAD_URL = f'{RECIPES_URL}download_shopping_cart/'
+
+
+@pytest.fixture
+def shopping_list(user, user_client, recipes):
+    """Позиции списка покупок пользователя по названию ингредиента."""
+    for recipe in recipes[3:5]:
+        response = user_client.post(f'{RECIPES_URL}{recipe.id}/shopping_cart/')
+        assert response.status_code == 201
+    return list(ShoppingListItem.objects.filter(user=user).values_list(
+        'ingredient__name', 'ingredient__measurement_unit', 'amount'
+    ).order_by('ingredient__name'))
+
+
+def download(client, file_type):
+    response = client.get(DOWNLOAD_URL, {'type': file_type})
+    assert response.status_code == 200
+    return response, b''.join(response.streaming_content)
+
+
+@pytest.mark.django_db
+def test_csv_export(user_client, shopping_list):
+    response, body = download(user_client, 'csv')
+    assert response['Content-Type'] == 'text/csv; charset=utf-8'
+    assert response['Content-Disposition'].startswith(
+        'attachment; filename="shopping_list.csv"; filename*=UTF-8\'\''
+    )
+    rows = list(csv.reader(io.StringIO(body.decode('utf-8-sig'))))
+    assert rows == [
+        [name, unit, str(amount)] for name, unit, amount in shopping_list
+    ]
+
+
+@pytest.mark.django_db
+def test_text_export(user_client, user, shopping_list):
+    response, body = download(user_client, 'txt')
+    assert response['Content-Type'] == 'text/plain; charset=utf-8'
+    lines = body.decode().splitlines()
+    assert lines[0] == f'Список покупок: {user}'
+    assert lines[2:] == [
+        f'• {name} ({unit}) — {amount}'
+        for name, unit, amount in shopping_list
+    ]
+
+
+@pytest.mark.django_db
+def test_pdf_export(user_client, shopping_list):
+    response, body = download(user_client, 'pdf')
+    assert response['Content-Type'] == 'application/pdf'
+    assert response['Content-Disposition'].endswith('.pdf')
+    assert body.startswith(b'%PDF-')
+    assert body.rstrip().endswith(b'%%EOF')
+
+
+def test_font_is_registered_once(settings, monkeypatch):
+    calls = []
+    monkeypatch.setattr(
+        'api.exports.pdfmetrics.registerFont', calls.append
+    )
+    register_font.cache_clear()
+    try:
+        for _ in range(3):
+            assert register_font(settings.SHOPPING_LIST_FONT) in (
+                FONT_NAME, 'Helvetica'
+            )
+    finally:
+        register_font.cache_clear()
+    assert len(calls) <= 1
+
+
+@pytest.mark.django_db
+def test_unknown_export_type(user_client, shopping_list):
+    response = user_client.get(DOWNLOAD_URL, {'type': 'xls'})
+    assert response.status_code == 400
+    assert 'type' in response.json()
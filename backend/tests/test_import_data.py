@@ -0,0 +1,73 @@
+import os
+
+import pytest
+from django.conf import settings
+from django.core.management import call_command
+
+from recipes.models import Ingredient, Tag
+from scripts.import_data import BulkLoader
+
+DATA_DIR = os.path.join(settings.BASE_DIR, 'data')
+
+
+@pytest.mark.django_db
+def test_import_bundled_data():
+    call_command('import_data', 'tags', os.path.join(DATA_DIR, 'tags.json'))
+    call_command(
+        'import_data',
+        'ingredients',
+        os.path.join(DATA_DIR, 'ingredients.csv')
+    )
+    assert set(Tag.objects.values_list('slug', flat=True)) == {
+        'breakfast', 'lunch', 'dinner'
+    }
+    assert Ingredient.objects.count() > 2000
+
+
+@pytest.mark.django_db
+def test_repeated_import_skips_duplicates():
+    path = os.path.join(DATA_DIR, 'tags.json')
+    call_command('import_data', 'tags', path)
+    call_command('import_data', 'tags', path)
+    assert Tag.objects.count() == 3
+
+
+def make_loader(**options):
+    return BulkLoader(
+        Tag, ('name', 'color', 'slug'), ('slug',), use_copy=False, **options
+    )
+
+
+@pytest.mark.django_db
+def test_created_counts_only_inserted_rows(monkeypatch):
+    loader = make_loader()
+    get_existing = loader.get_existing
+
+    def create_concurrently(unique):
+        existing = get_existing(unique)
+        # Та же запись появляется сразу после чтения существующих.
+        Tag.objects.get_or_create(
+            slug='lunch', defaults={'name': 'Обед', 'color': '#00FF00'}
+        )
+        return existing
+
+    monkeypatch.setattr(loader, 'get_existing', create_concurrently)
+    loader.load([
+        {'name': 'Завтрак', 'color': '#FF0000', 'slug': 'breakfast'},
+        {'name': 'Обед', 'color': '#00FF00', 'slug': 'lunch'},
+    ])
+    assert Tag.objects.count() == 2
+    assert loader.created == 1
+    assert loader.duplicates == 1
+
+
+@pytest.mark.django_db
+def test_rejected_rows_are_capped():
+    loader = make_loader(max_rejected=2)
+    loader.load(
+        {'name': '', 'color': '', 'slug': f'bad-{number}'}
+        for number in range(5)
+    )
+    assert loader.rejected_count == 5
+    assert [number for number, _, _ in loader.rejected] == [1, 2]
+    assert not Tag.objects.exists()
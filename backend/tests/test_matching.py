@@ -0,0 +1,154 @@
+import random
+
+import pytest
+
+from api.bitmaps import CHUNK_SIZE, Bitmap
+from api.matching import RecipeIngredientIndex, get_recipe_ingredient_index
+from recipes.models import IngredientRecipe, Recipe
+
+RECIPES_URL = '/api/recipes/'
+
+
+def positions(bitmap):
+    return {
+        number * CHUNK_SIZE + offset
+        for number in bitmap.chunks()
+        for offset in range(CHUNK_SIZE)
+        if bitmap.chunk(number) >> offset & 1
+    }
+
+
+def make_index(recipes):
+    return RecipeIngredientIndex(
+        sorted(recipes),
+        [
+            (pk, ingredient)
+            for pk, (ingredients, tags) in recipes.items()
+            for ingredient in ingredients
+        ],
+        [
+            (pk, tag)
+            for pk, (ingredients, tags) in recipes.items()
+            for tag in tags
+        ]
+    )
+
+
+def test_bitmap_sparse_and_dense_chunks():
+    expected = set(range(0, CHUNK_SIZE, 3)) | {CHUNK_SIZE * 2 + 5}
+    bitmap = Bitmap.from_sorted(sorted(expected))
+    assert positions(bitmap) == expected
+    for position in (1, CHUNK_SIZE * 2 + 7, CHUNK_SIZE * 5):
+        bitmap.add(position)
+        expected.add(position)
+    assert positions(bitmap) == expected
+    removed = [0, 1, 3, CHUNK_SIZE * 2 + 5, CHUNK_SIZE * 2 + 7]
+    for number in (0, 2):
+        offsets = [
+            position % CHUNK_SIZE for position in removed
+            if position // CHUNK_SIZE == number
+        ]
+        bitmap.discard_chunk(
+            number, offsets, sum(1 << offset for offset in offsets)
+        )
+    expected -= set(removed)
+    assert positions(bitmap) == expected
+    assert set(bitmap.chunks()) == {0, 5}
+
+
+def test_match_order():
+    index = make_index({
+        1: ([1, 2], ['lunch']),
+        2: ([1, 2, 3], ['lunch']),
+        3: ([1, 2, 3, 4], ['dinner']),
+        4: ([1], ['dinner']),
+        5: ([5], ['lunch']),
+    })
+    assert index.match([1, 2, 3]) == [
+        (2, 3, 3), (1, 2, 2), (4, 1, 1), (3, 3, 4)
+    ]
+    assert index.match([1, 2], required=[3], excluded=[4]) == [(2, 3, 3)]
+    assert index.match([1, 2], tags=['dinner'], limit=1) == [(4, 1, 1)]
+    assert index.match([6]) == []
+
+
+def test_updates_match_rebuilt_index():
+    generator = random.Random(17)
+
+    def random_recipe():
+        return (
+            generator.sample(range(1, 31), generator.randint(1, 6)),
+            generator.sample(['breakfast', 'lunch', 'dinner'], 1)
+        )
+
+    recipes = {
+        pk: random_recipe() for pk in range(1, CHUNK_SIZE + 5000, 2)
+    }
+    index = make_index(recipes)
+    last = max(recipes)
+    for _ in range(20):
+        changes = {}
+        for pk in generator.sample(sorted(recipes), 50):
+            changes[pk] = None if generator.random() < 0.3 else (
+                random_recipe()
+            )
+        for pk in range(last + 1, last + 6):
+            changes[pk] = random_recipe()
+        last += 5
+        assert index.update(changes)
+        for pk, state in changes.items():
+            if state is None:
+                recipes.pop(pk, None)
+            else:
+                recipes[pk] = state
+    rebuilt = make_index(recipes)
+    for _ in range(20):
+        query = {
+            'ingredients': generator.sample(range(1, 31), 5),
+            'required': generator.sample(range(1, 31), 1),
+            'excluded': generator.sample(range(1, 31), 2),
+            'tags': generator.sample(['breakfast', 'lunch', 'dinner'], 2),
+            'limit': 50,
+        }
+        assert index.match(**query) == rebuilt.match(**query)
+
+
+def test_older_recipe_requires_rebuild():
+    index = make_index({5: ([1], []), 7: ([2], [])})
+    assert not index.update({6: ([1], [])})
+
+
+@pytest.mark.django_db(transaction=True)
+def test_index_follows_recipe_changes(
+    user_client, recipes, tags, ingredients
+):
+    params = {'ingredients': [ingredients[0].id], 'limit': 100}
+    response = user_client.get(f'{RECIPES_URL}by_ingredients/', params)
+    assert response.status_code == 200
+    index = get_recipe_ingredient_index()
+    recipe = Recipe.objects.create(
+        author=recipes[0].author,
+        name='Новый рецепт',
+        image='recipes/images/new.png',
+        text='Описание рецепта',
+        cooking_time=5
+    )
+    IngredientRecipe.objects.create(
+        recipe=recipe, ingredient=ingredients[0], amount=1
+    )
+    recipe.tags.set([tags[2]])
+    recipes[0].delete()
+    tags[1].recipe_set.add(recipes[9])
+    expected = sorted(
+        Recipe.objects.filter(ingredients=ingredients[0]).values_list(
+            'pk', flat=True
+        )
+    )
+    response = user_client.get(f'{RECIPES_URL}by_ingredients/', params)
+    assert get_recipe_ingredient_index() is index
+    assert sorted(recipe['id'] for recipe in response.json()) == expected
+    assert recipe.pk in expected
+    response = user_client.get(
+        f'{RECIPES_URL}by_ingredients/', {**params, 'tags': 'tag1'}
+    )
+    assert recipes[9].pk in {recipe['id'] for recipe in response.json()}
@@ -0,0 +1,40 @@
+import re
+import time
+
+import pytest
+
+from api.metrics import RequestMetrics
+from api.serializers import RecipeListSerializer
+
+RECIPES_URL = '/api/recipes/'
+
+
+def timings(response):
+    return dict(re.findall(
+        r'(\w+);dur=([\d.]+)', response['Server-Timing']
+    ))
+
+
+@pytest.mark.django_db
+def test_server_timing_separates_serialization(settings, user_client, recipes):
+    settings.SERVER_TIMING = True
+    response = user_client.get(RECIPES_URL)
+    assert set(timings(response)) == {'db', 'serialize', 'render', 'total'}
+    metrics = user_client.get('/metrics').content.decode()
+    assert 'foodgram_serialize_seconds_total{view="recipes-list"' in metrics
+    assert 'foodgram_render_seconds_total{view="recipes-list"' in metrics
+
+
+@pytest.mark.django_db
+def test_nested_serializers_are_timed_once(rf, user, recipes):
+    request = rf.get(RECIPES_URL)
+    request.user = user
+    request.metrics = RequestMetrics()
+    started = time.perf_counter()
+    RecipeListSerializer(
+        recipes, many=True, context={'request': request, 'compiled': False}
+    ).data
+    elapsed = time.perf_counter() - started
+    # Теги рецепта — тоже сериализатор с замером времени.
+    assert 0 < request.metrics.serialize_seconds <= elapsed
+    assert not request.metrics.serializing
@@ -0,0 +1,70 @@
+import json
+from base64 import b64encode
+
+import pytest
+
+RECIPES_URL = '/api/recipes/'
+
+
+def encode(values):
+    return b64encode(json.dumps(values).encode()).decode()
+
+
+def collect_ids(client, url, params):
+    """id рецептов со всех страниц, пройденных по ссылкам next."""
+    ids = []
+    response = client.get(url, params)
+    while True:
+        assert response.status_code == 200
+        data = response.json()
+        ids.extend(recipe['id'] for recipe in data['results'])
+        if data['next'] is None:
+            return ids
+        response = client.get(data['next'])
+
+
+@pytest.mark.django_db
+def test_next_page_chain(guest_client, recipes):
+    ids = collect_ids(
+        guest_client, RECIPES_URL, {'pagination': 'cursor', 'limit': 5}
+    )
+    expected = sorted(
+        recipes, key=lambda recipe: (recipe.pub_date, recipe.id), reverse=True
+    )
+    assert ids == [recipe.id for recipe in expected]
+
+
+@pytest.mark.django_db
+def test_inserts_do_not_shift_pages(guest_client, recipes, make_recipes):
+    response = guest_client.get(
+        RECIPES_URL, {'pagination': 'cursor', 'limit': 5}
+    )
+    first = [recipe['id'] for recipe in response.json()['results']]
+    make_recipes(3)
+    rest = collect_ids(guest_client, response.json()['next'], {})
+    assert len(first + rest) == len(recipes)
+    assert not set(first) & set(rest)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('cursor', (
+    'не base64',
+    encode({'pub_date': 1}),
+    encode([1]),
+    encode(['garbage', 1]),
+    encode(['2020-01-01T00:00:00', 'garbage']),
+    encode(['2020-01-01T00:00:00', True]),
+    encode(['2020-13-45T00:00:00', 1]),
+))
+def test_tampered_cursor_returns_not_found(guest_client, recipes, cursor):
+    response = guest_client.get(RECIPES_URL, {'cursor': cursor})
+    assert response.status_code == 404
+
+
+@pytest.mark.django_db
+def test_cursor_with_search_ranking_is_rejected(guest_client, recipes):
+    response = guest_client.get(
+        RECIPES_URL, {'pagination': 'cursor', 'search': 'Рецепт'}
+    )
+    assert response.status_code == 400
+    assert 'cursor' in response.json()
@@ -0,0 +1,88 @@
+import pytest
+from django.db import connection
+
+from recipes.models import (
+    Favorite,
+    IngredientRecipe,
+    Recipe,
+    ShoppingCart,
+    TimelineEntry
+)
+
+pytestmark = pytest.mark.skipif(
+    connection.vendor != 'postgresql',
+    reason='Планы запросов проверяются только на PostgreSQL.'
+)
+
+# Запрос, таблица, которую он не должен читать целиком, и индекс,
+# который должен попасть в план (None — любой).
+HOT_QUERIES = (
+    ('избранное пользователя',
+     lambda: Favorite.objects.filter(user_id=1, recipe_id=1),
+     Favorite, 'unique_favorite'),
+    ('рецепт в списке покупок',
+     lambda: ShoppingCart.objects.filter(user_id=1, recipe_id=1),
+     ShoppingCart, 'unique_shopping_cart'),
+    ('фильтр ленты по избранному',
+     lambda: Recipe.objects.filter(favorite_recipe__user_id=1),
+     Favorite, None),
+    ('фильтр ленты по списку покупок',
+     lambda: Recipe.objects.filter(shopping_cart__user_id=1),
+     ShoppingCart, None),
+    ('ингредиент в рецепте',
+     lambda: IngredientRecipe.objects.filter(recipe_id=1, ingredient_id=1),
+     IngredientRecipe, 'ingredient_recipe_idx'),
+    ('первая страница ленты',
+     lambda: Recipe.objects.order_by('-pub_date', '-id')[:6],
+     Recipe, 'recipe_pub_date_id_idx'),
+    ('лента подписок',
+     lambda: TimelineEntry.objects.filter(user_id=1).order_by(
+         '-pub_date', '-recipe'
+     )[:6],
+     TimelineEntry, 'timeline_user_pub_date_idx'),
+    ('рецепты популярного автора в ленте подписок',
+     lambda: Recipe.objects.filter(author_id=1).order_by(
+         '-pub_date', '-id'
+     )[:6],
+     Recipe, 'recipe_author_pub_date_idx'),
+    ('поиск рецептов',
+     lambda: Recipe.objects.search('борщ'),
+     Recipe, 'recipe_search_idx'),
+)
+
+
+@pytest.fixture
+def without_seqscan(db):
+    """На маленьких таблицах планировщик предпочитает полный просмотр,
+    поэтому проверяется, что индекс вообще применим."""
+    with connection.cursor() as cursor:
+        cursor.execute('SET LOCAL enable_seqscan = off')
+
+
+def drop_other_indexes(model, index):
+    """Удаляет в транзакции теста остальные неуникальные индексы таблицы:
+    выбор между похожими индексами зависит от статистики, накопленной
+    другими тестами, а проверяется применимость именно этого."""
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, table)
+        for name, options in constraints.items():
+            if (
+                options['index'] and name != index
+                and not options['unique'] and not options['primary_key']
+            ):
+                cursor.execute(f'DROP INDEX {connection.ops.quote_name(name)}')
+
+
+@pytest.mark.parametrize(
+    'queryset, model, index',
+    [query[1:] for query in HOT_QUERIES],
+    ids=[query[0] for query in HOT_QUERIES]
+)
+def test_hot_queries_use_indexes(without_seqscan, queryset, model, index):
+    if index is not None:
+        drop_other_indexes(model, index)
+    plan = queryset().explain()
+    assert f'Seq Scan on {model._meta.db_table}' not in plan, plan
+    if index is not None:
+        assert index in plan, plan
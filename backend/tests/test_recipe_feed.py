@@ -0,0 +1,82 @@
+import pytest
+
+RECIPES_URL = '/api/recipes/'
+# Постраничная лента: количество, страница рецептов, теги
+# и ингредиенты. Флаги избранного и списка покупок — из кэша связей.
+FEED_QUERIES = 4
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('limit', (2, 10))
+def test_feed_queries_do_not_depend_on_page_size(
+    user_client, recipes, django_assert_num_queries, limit
+):
+    user_client.get(RECIPES_URL)
+    with django_assert_num_queries(FEED_QUERIES):
+        response = user_client.get(RECIPES_URL, {'limit': limit})
+    assert response.status_code == 200
+    results = response.json()['results']
+    assert len(results) == limit
+    favorited = {recipe.id for recipe in recipes[:3]}
+    for recipe in results:
+        assert recipe['is_favorited'] == (recipe['id'] in favorited)
+        assert recipe['is_in_shopping_cart'] == (recipe['id'] in favorited)
+        assert len(recipe['ingredients']) == 3
+
+
+@pytest.mark.django_db
+def test_recipe_detail_queries(
+    user_client, recipes, django_assert_num_queries
+):
+    url = f'{RECIPES_URL}{recipes[0].id}/'
+    user_client.get(url)
+    # Рецепт, теги и ингредиенты.
+    with django_assert_num_queries(3):
+        response = user_client.get(f'{RECIPES_URL}{recipes[1].id}/')
+    assert response.status_code == 200
+    assert response.json()['id'] == recipes[1].id
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('params, expected', (
+    ({'is_favorited': 1}, 3),
+    ({'is_in_shopping_cart': 1}, 3),
+    ({'is_favorited': 0}, 9),
+    ({'tags': 'tag2'}, 4),
+    ({'tags': ['tag1', 'tag2']}, 8),
+    ({'is_favorited': 1, 'tags': 'tag0'}, 3),
+))
+def test_filtered_feed_queries(
+    user_client, recipes, django_assert_num_queries, params, expected
+):
+    params = {**params, 'limit': 20}
+    # Первый запрос собирает каталог тегов для фильтра.
+    user_client.get(RECIPES_URL, params)
+    with django_assert_num_queries(FEED_QUERIES):
+        response = user_client.get(RECIPES_URL, params)
+    assert response.status_code == 200
+    assert response.json()['count'] == expected
+    assert len(response.json()['results']) == expected
+
+
+@pytest.mark.django_db
+def test_author_filter_queries(
+    user_client, user, recipes, make_recipes, django_assert_num_queries
+):
+    make_recipes(2, recipe_author=user)
+    user_client.get(RECIPES_URL)
+    # Фильтр проверяет, что автор существует.
+    with django_assert_num_queries(FEED_QUERIES + 1):
+        response = user_client.get(RECIPES_URL, {'author': user.id})
+    assert response.json()['count'] == 2
+
+
+@pytest.mark.django_db
+def test_guest_feed_queries(guest_client, recipes, django_assert_num_queries):
+    guest_client.get(RECIPES_URL)
+    with django_assert_num_queries(FEED_QUERIES):
+        response = guest_client.get(RECIPES_URL, {'limit': 10})
+    assert response.status_code == 200
+    assert not any(
+        recipe['is_favorited'] for recipe in response.json()['results']
+    )
@@ -0,0 +1,107 @@
+from itertools import product
+from types import SimpleNamespace
+
+import pytest
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection
+
+from api.filters import RecipeFilter
+from recipes.models import Favorite, Recipe, ShoppingCart
+
+FLAGS = (None, True, False)
+TAGS = (None, ['tag0'], ['tag1', 'tag2'])
+
+
+def filter_data(favorited, in_cart, tags, author):
+    data = {}
+    if favorited is not None:
+        data['is_favorited'] = str(favorited).lower()
+    if in_cart is not None:
+        data['is_in_shopping_cart'] = str(in_cart).lower()
+    if tags:
+        data['tags'] = tags
+    if author is not None:
+        data['author'] = author
+    return data
+
+
+def filter_recipes(user, data):
+    filterset = RecipeFilter(
+        data,
+        queryset=Recipe.objects.for_feed(user),
+        request=SimpleNamespace(user=user)
+    )
+    assert filterset.is_valid(), filterset.errors
+    return filterset.qs.values_list('pk', flat=True)
+
+
+def expected_recipes(user, favorited, in_cart, tags, author):
+    """Ожидаемый результат, посчитанный без фильтров ленты."""
+    favorites = cart = set()
+    if user.is_authenticated:
+        favorites = set(Favorite.objects.filter(user=user).values_list(
+            'recipe', flat=True
+        ))
+        cart = set(ShoppingCart.objects.filter(user=user).values_list(
+            'recipe', flat=True
+        ))
+    expected = set()
+    for recipe in Recipe.objects.prefetch_related('tags'):
+        recipe_tags = {tag.slug for tag in recipe.tags.all()}
+        if (
+            (favorited is None or (recipe.pk in favorites) == favorited)
+            and (in_cart is None or (recipe.pk in cart) == in_cart)
+            and (not tags or bool(recipe_tags & set(tags)))
+            and (author is None or recipe.author_id == author)
+        ):
+            expected.add(recipe.pk)
+    return expected
+
+
+@pytest.fixture
+def filtered_recipes(recipes, make_recipes, user):
+    """Рецепты двух авторов, часть — в избранном и в списке покупок."""
+    recipes = recipes + make_recipes(3, recipe_author=user)
+    Favorite.objects.create(user=user, recipe=recipes[5])
+    ShoppingCart.objects.create(user=user, recipe=recipes[13])
+    return recipes
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('anonymous', (True, False))
+@pytest.mark.parametrize('favorited, in_cart', product(FLAGS, FLAGS))
+def test_filter_combinations(
+    filtered_recipes, user, author, django_assert_max_num_queries,
+    anonymous, favorited, in_cart
+):
+    current = AnonymousUser() if anonymous else user
+    for tags, recipe_author in product(TAGS, (None, author.pk, user.pk)):
+        combination = (favorited, in_cart, tags, recipe_author)
+        queryset = filter_recipes(current, filter_data(*combination))
+        with django_assert_max_num_queries(1):
+            found = list(queryset)
+        assert len(found) == len(set(found)), combination
+        assert set(found) == expected_recipes(current, *combination), (
+            combination
+        )
+
+
+@pytest.mark.django_db
+@pytest.mark.skipif(
+    connection.vendor != 'postgresql',
+    reason='Планы запросов проверяются только на PostgreSQL.'
+)
+@pytest.mark.parametrize('favorited, in_cart', (
+    (True, None), (False, None), (None, True), (None, False), (True, False)
+))
+def test_relation_filters_use_indexes(
+    filtered_recipes, user, favorited, in_cart
+):
+    queryset = filter_recipes(
+        user, filter_data(favorited, in_cart, None, None)
+    )
+    with connection.cursor() as cursor:
+        cursor.execute('SET LOCAL enable_seqscan = off')
+    plan = queryset.explain()
+    for model in (Favorite, ShoppingCart):
+        assert f'Seq Scan on {model._meta.db_table}' not in plan, plan
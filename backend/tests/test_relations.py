@@ -0,0 +1,52 @@
+import pytest
+
+from recipes.models import Favorite, ShoppingCart
+from users.models import Follow
+
+REQUESTS = 8
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize('url, model', (
+    ('/api/recipes/{recipe}/favorite/', Favorite),
+    ('/api/recipes/{recipe}/shopping_cart/', ShoppingCart),
+    ('/api/users/{author}/subscribe/', Follow),
+))
+def test_concurrent_toggles_create_one_row(
+    postgresql_only, run_concurrently, client_for, user, author,
+    make_recipes, url, model
+):
+    recipe = make_recipes(1)[0]
+    url = url.format(recipe=recipe.id, author=author.id)
+    responses = run_concurrently([
+        lambda: client_for(user).post(url) for _ in range(REQUESTS)
+    ])
+    statuses = sorted(response.status_code for response in responses)
+    assert statuses == [201] + [400] * (REQUESTS - 1)
+    assert model.objects.filter(user=user).count() == 1
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('url, error', (
+    ('/api/recipes/{recipe}/favorite/', 'Рецепт уже в избранном.'),
+    ('/api/recipes/{recipe}/shopping_cart/', 'Рецепт уже в списке покупок.'),
+    ('/api/users/{author}/subscribe/', 'Вы уже подписаны на этого автора.'),
+))
+def test_repeated_toggle(user_client, author, make_recipes, url, error):
+    url = url.format(recipe=make_recipes(1)[0].id, author=author.id)
+    assert user_client.post(url).status_code == 201
+    response = user_client.post(url)
+    assert response.status_code == 400
+    assert response.json() == {'errors': error}
+    assert user_client.delete(url).status_code == 204
+    assert user_client.delete(url).status_code == 400
+
+
+@pytest.mark.django_db
+def test_repeated_subscribe_counts_follower_once(user_client, author):
+    url = f'/api/users/{author.id}/subscribe/'
+    statuses = [user_client.post(url).status_code for _ in range(2)]
+    assert statuses == [201, 400]
+    author.refresh_from_db()
+    assert author.followers_count == 1
+    assert Follow.objects.filter(author=author).count() == 1
@@ -0,0 +1,89 @@
+import pytest
+from django.db import connections
+
+from api.signals import check_connections, mark_connections_idle
+
+RECIPES_URL = '/api/recipes/'
+
+
+@pytest.fixture
+def replica(settings):
+    """Основная база под видом реплики: маршрутизация та же, а данные
+    доступны в тестовой базе."""
+    settings.DATABASE_REPLICAS = ['default']
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('url', (RECIPES_URL, f'{RECIPES_URL}{{}}/'))
+def test_replica_response_has_no_validators(
+    replica, user_client, recipes, url
+):
+    response = user_client.get(url.format(recipes[0].id))
+    assert response.status_code == 200
+    assert 'ETag' not in response
+    assert 'Last-Modified' not in response
+
+
+@pytest.mark.django_db
+def test_primary_validators_work_with_replica(
+    settings, user_client, recipes
+):
+    etag = user_client.get(RECIPES_URL)['ETag']
+    settings.DATABASE_REPLICAS = ['default']
+    response = user_client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304
+    assert response['ETag'] == etag
+
+
+@pytest.mark.django_db
+def test_anonymous_response_from_replica_has_no_validators(
+    replica, guest_client, recipes, django_assert_num_queries
+):
+    response = guest_client.get(RECIPES_URL)
+    assert response.status_code == 200
+    assert 'ETag' not in response
+    with django_assert_num_queries(0):
+        cached = guest_client.get(RECIPES_URL)
+    assert cached.content == response.content
+    assert 'ETag' not in cached
+
+
+@pytest.mark.django_db
+def test_anonymous_response_from_primary_has_validators(
+    guest_client, recipes
+):
+    response = guest_client.get(RECIPES_URL)
+    assert response.status_code == 200
+    assert 'ETag' in response
+    assert 'ETag' in guest_client.get(RECIPES_URL)
+
+
+@pytest.mark.django_db
+def test_replica_response_is_cached_briefly(
+    replica, settings, guest_client, recipes, monkeypatch
+):
+    timeouts = []
+    monkeypatch.setattr(
+        'api.cache.cache.set',
+        lambda key, value, timeout: timeouts.append(timeout)
+    )
+    settings.REPLICA_STICKY_SECONDS = 3
+    assert guest_client.get(RECIPES_URL).status_code == 200
+    assert timeouts == [3]
+
+
+@pytest.mark.django_db
+def test_connections_checked_only_after_idle(settings, monkeypatch):
+    connection = connections['default']
+    checked = []
+    monkeypatch.setattr(
+        connection, 'is_usable', lambda: checked.append(True) or True
+    )
+    settings.DB_CONN_HEALTH_CHECK_IDLE = 30
+    connection.ensure_connection()
+    mark_connections_idle()
+    check_connections()
+    assert checked == []
+    connection.idle_since -= 31
+    check_connections()
+    assert checked == [True]
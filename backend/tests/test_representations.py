@@ -0,0 +1,119 @@
+import pytest
+from django.contrib.auth.models import AnonymousUser
+from django.db.models import Count, Prefetch
+from rest_framework.renderers import JSONRenderer
+
+from api.serializers import (
+    FavoriteSerializer,
+    RecipeDetailSerializer,
+    RecipeListSerializer,
+    RecipeMatchSerializer,
+    ShoppingCartSerializer,
+    SubscribeSerializer,
+    UserListSerializer
+)
+from recipes.models import Recipe
+from users.models import Follow, User
+
+RECIPE_SERIALIZERS = (
+    RecipeListSerializer,
+    RecipeDetailSerializer,
+    RecipeMatchSerializer,
+    FavoriteSerializer,
+    ShoppingCartSerializer,
+)
+
+
+def render_both(serializer_class, objects, request):
+    """JSON сериализатора через поля DRF и через быстрое представление."""
+    renderer = JSONRenderer()
+    return [
+        renderer.render(serializer_class(
+            objects,
+            many=True,
+            context={'request': request, 'compiled': compiled}
+        ).data)
+        for compiled in (False, True)
+    ]
+
+
+@pytest.fixture
+def make_request(rf, user):
+    def make(anonymous, params=None):
+        request = rf.get('/api/', params or {})
+        request.user = AnonymousUser() if anonymous else user
+        return request
+
+    return make
+
+
+@pytest.fixture
+def followed_authors(user, author, recipes, make_recipes, django_user_model):
+    """Подписки пользователя: автор с рецептами и автор без них."""
+    other = django_user_model.objects.create_user(
+        email='other@example.com',
+        username='other',
+        first_name='Имя',
+        last_name='Фамилия',
+        password='Pa55w0rd-test'
+    )
+    for followed in (author, other):
+        Follow.objects.create(user=user, author=followed)
+    return User.objects.filter(following__user=user)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('anonymous', (True, False))
+@pytest.mark.parametrize(
+    'serializer_class', RECIPE_SERIALIZERS,
+    ids=[serializer.__name__ for serializer in RECIPE_SERIALIZERS]
+)
+def test_recipe_representations_match_drf(
+    make_request, user, recipes, anonymous, serializer_class
+):
+    request = make_request(anonymous)
+    recipes = list(Recipe.objects.for_feed(request.user))
+    for number, recipe in enumerate(recipes):
+        recipe.matched_ingredients = number % 4
+        recipe.missing_ingredients = number % 3
+        recipe.match_ratio = round(1 / (number + 1), 4)
+    expected, compiled = render_both(serializer_class, recipes, request)
+    assert compiled == expected
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('anonymous', (True, False))
+def test_user_representations_match_drf(
+    make_request, followed_authors, anonymous
+):
+    expected, compiled = render_both(
+        UserListSerializer, list(User.objects.all()), make_request(anonymous)
+    )
+    assert compiled == expected
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('limit', ('', '1', '3'))
+def test_subscription_representations_match_drf(
+    make_request, followed_authors, limit
+):
+    authors = list(followed_authors.annotate(
+        recipes_count=Count('recipes')
+    ).prefetch_related(
+        Prefetch('recipes', queryset=Recipe.objects.all())
+    ))
+    expected, compiled = render_both(
+        SubscribeSerializer, authors,
+        make_request(False, {'recipes_limit': limit})
+    )
+    assert compiled == expected
+
+
+@pytest.mark.django_db
+def test_subscription_without_count_matches_drf(
+    make_request, followed_authors
+):
+    expected, compiled = render_both(
+        SubscribeSerializer, list(followed_authors), make_request(False)
+    )
+    assert compiled == expected
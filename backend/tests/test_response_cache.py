@@ -0,0 +1,68 @@
+import time
+
+import pytest
+from django.http import HttpResponse
+
+from api.cache import get_cached_response
+
+RECIPES_URL = '/api/recipes/'
+REQUESTS = 6
+
+
+@pytest.mark.django_db
+def test_anonymous_response_is_cached(
+    guest_client, recipes, django_assert_num_queries
+):
+    url = f'{RECIPES_URL}{recipes[0].id}/'
+    response = guest_client.get(url)
+    assert response.status_code == 200
+    with django_assert_num_queries(0):
+        cached = guest_client.get(url)
+    assert cached.status_code == 200
+    assert cached.json() == response.json()
+
+
+@pytest.mark.django_db
+def test_authenticated_response_is_not_cached(
+    user_client, guest_client, recipes
+):
+    url = f'{RECIPES_URL}{recipes[0].id}/'
+    guest_client.get(url)
+    assert user_client.get(url).json()['is_favorited'] is True
+    assert guest_client.get(url).json()['is_favorited'] is False
+
+
+@pytest.mark.django_db(transaction=True)
+def test_write_invalidates_cached_response(
+    guest_client, author_client, recipes
+):
+    url = f'{RECIPES_URL}{recipes[0].id}/'
+    assert guest_client.get(url).json()['name'] == recipes[0].name
+    response = author_client.patch(url, {'name': 'Новое название'})
+    assert response.status_code == 200
+    assert guest_client.get(url).json()['name'] == 'Новое название'
+    recipes[0].author.last_name = 'Новая фамилия'
+    recipes[0].author.save()
+    assert guest_client.get(url).json()['author']['last_name'] == (
+        'Новая фамилия'
+    )
+
+
+def test_concurrent_misses_build_once(run_concurrently):
+    built = []
+
+    def build():
+        built.append(True)
+        time.sleep(0.2)
+        return HttpResponse(b'{"built": 1}', content_type='application/json')
+
+    responses = run_concurrently([
+        lambda: get_cached_response('coalescing', build)
+        for _ in range(REQUESTS)
+    ])
+    assert len(built) == 1
+    assert {response.content for response in responses} == {b'{"built": 1}'}
+    assert get_cached_response('coalescing', build).content == (
+        b'{"built": 1}'
+    )
+    assert len(built) == 1
@@ -0,0 +1,104 @@
+import random
+
+import pytest
+
+from api.search import RecipeSearchIndex, get_recipe_search_index
+from recipes.models import Ingredient, IngredientRecipe, Recipe
+
+RECIPES_URL = '/api/recipes/'
+WORDS = ('борщ', 'суп', 'салат', 'свекла', 'укроп', 'сметана', 'пирог')
+
+
+def test_rank_order():
+    index = RecipeSearchIndex([
+        (1, 'Суп', 'Свекла', 'Густой борщ'),
+        (2, 'Борщ', 'Свекла', 'Суп'),
+        (3, 'Салат', 'Борщевик', 'Без борща'),
+        (4, 'Пирог', 'Борщ', ''),
+        (5, 'Борщ', '', ''),
+    ])
+    assert index.search('борщ', 10) == [5, 2, 4, 3, 1]
+    assert index.search('борщ суп', 10) == [2, 1]
+    assert index.search('борщ', 2) == [5, 2]
+    assert index.search('компот', 10) == []
+
+
+def test_updates_match_rebuilt_index():
+    generator = random.Random(16)
+
+    def random_recipe():
+        return tuple(
+            ' '.join(generator.sample(WORDS, generator.randint(0, 3)))
+            for _ in range(3)
+        )
+
+    recipes = {pk: random_recipe() for pk in range(1, 500)}
+    index = RecipeSearchIndex(
+        (pk, *fields) for pk, fields in recipes.items()
+    )
+    for _ in range(20):
+        changes = {
+            pk: None if generator.random() < 0.3 else random_recipe()
+            for pk in generator.sample(range(1, 600), 30)
+        }
+        index.update(changes)
+        for pk, fields in changes.items():
+            if fields is None:
+                recipes.pop(pk, None)
+            else:
+                recipes[pk] = fields
+    rebuilt = RecipeSearchIndex(
+        (pk, *fields) for pk, fields in recipes.items()
+    )
+    assert len(index) == len(rebuilt)
+    for first in WORDS:
+        for second in WORDS:
+            query = f'{first} {second}'
+            assert index.search(query, 50) == rebuilt.search(query, 50)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_api_results_in_rank_order(guest_client, author):
+    spinach = Ingredient.objects.create(name='Шпинат', measurement_unit='г')
+    recipes = {}
+    for place, name, text in (
+        ('text', 'Суп', 'Подавать со шпинатом'),
+        ('name', 'Шпинат с сыром', 'Описание'),
+        ('ingredient', 'Пирог', 'Описание'),
+    ):
+        recipes[place] = Recipe.objects.create(
+            author=author,
+            name=name,
+            image='recipes/images/1.png',
+            text=text,
+            cooking_time=10
+        )
+    IngredientRecipe.objects.create(
+        recipe=recipes['ingredient'], ingredient=spinach, amount=100
+    )
+    response = guest_client.get(RECIPES_URL, {'search': 'шпинат'})
+    assert response.status_code == 200
+    assert [recipe['id'] for recipe in response.json()['results']] == [
+        recipes[place].id for place in ('name', 'ingredient', 'text')
+    ]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_index_follows_recipe_changes(recipes, ingredients):
+    index = get_recipe_search_index()
+    assert index.search('рецепт', 100)
+    recipe = recipes[0]
+    recipe.name = 'Окрошка'
+    recipe.save()
+    recipes[1].delete()
+    ingredient = ingredients[recipes[2].id % len(ingredients)]
+    ingredient.name = 'Квас'
+    ingredient.save()
+    assert get_recipe_search_index() is index
+    assert index.search('окрошка', 10) == [recipe.id]
+    assert recipes[1].id not in index.search('рецепт', 100)
+    assert set(index.search('квас', 100)) == set(
+        Recipe.objects.filter(ingredients=ingredient).values_list(
+            'pk', flat=True
+        )
+    )
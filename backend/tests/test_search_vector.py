@@ -0,0 +1,31 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from users.models import Follow
+
+
+@pytest.mark.django_db
+def test_search_vector_is_not_loaded(user, user_client, author, recipes):
+    Follow.objects.create(user=user, author=author)
+    requests = (
+        ('get', '/api/recipes/'),
+        ('get', f'/api/recipes/{recipes[5].id}/'),
+        ('get', '/api/users/subscriptions/'),
+        ('post', f'/api/recipes/{recipes[5].id}/favorite/'),
+        ('post', f'/api/recipes/{recipes[5].id}/shopping_cart/'),
+    )
+    for method, url in requests:
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(user_client, method)(url)
+        assert response.status_code in (200, 201), url
+        for query in context.captured_queries:
+            assert 'search_vector' not in query['sql'], url
+
+
+@pytest.mark.django_db
+def test_recipe_with_deferred_vector_is_saved(author_client, recipes):
+    url = f'/api/recipes/{recipes[0].id}/'
+    response = author_client.patch(url, {'name': 'Новое название'})
+    assert response.status_code == 200
+    assert author_client.get(url).json()['name'] == 'Новое название'
@@ -0,0 +1,84 @@
+import pytest
+
+from recipes.models import IngredientRecipe, ShoppingListItem
+
+RECIPES_URL = '/api/recipes/'
+
+
+def shopping_list(user):
+    return set(ShoppingListItem.objects.filter(user=user).values_list(
+        'ingredient', 'amount'
+    ))
+
+
+def live_shopping_list(user):
+    return set(ShoppingListItem.objects.live_totals(users=[user]).values_list(
+        'ingredient', 'total'
+    ))
+
+
+@pytest.mark.django_db
+def test_shopping_list_follows_cart(user, user_client, recipes):
+    for recipe in recipes[3:6]:
+        response = user_client.post(f'{RECIPES_URL}{recipe.id}/shopping_cart/')
+        assert response.status_code == 201
+    user_client.delete(f'{RECIPES_URL}{recipes[0].id}/shopping_cart/')
+    user_client.post(
+        f'{RECIPES_URL}shopping_cart/bulk/',
+        {'recipes': [recipes[7].id, recipes[8].id]},
+        format='json'
+    )
+    assert shopping_list(user) == live_shopping_list(user)
+
+
+@pytest.mark.django_db
+def test_missing_recipe_is_not_added_to_cart(user_client, recipes):
+    response = user_client.post(f'{RECIPES_URL}0/shopping_cart/')
+    assert response.status_code == 404
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_cart_changes_keep_shopping_list(
+    postgresql_only, run_concurrently, user, client_for, recipes
+):
+    requests = [
+        lambda recipe=recipe: client_for(user).post(
+            f'{RECIPES_URL}{recipe.id}/shopping_cart/'
+        )
+        for recipe in recipes[3:9]
+    ] + [
+        lambda recipe=recipe: client_for(user).delete(
+            f'{RECIPES_URL}{recipe.id}/shopping_cart/'
+        )
+        for recipe in recipes[:3]
+    ]
+    responses = run_concurrently(requests)
+    assert [response.status_code for response in responses] == (
+        [201] * 6 + [204] * 3
+    )
+    assert shopping_list(user) == live_shopping_list(user)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('make_payload', (
+    lambda tags: {'text': 'Новое описание'},
+    lambda tags: {'tags': [tags[-1].id]},
+    lambda tags: {'name': 'Новое название', 'cooking_time': 42},
+), ids=('text', 'tags', 'name'))
+def test_patch_without_ingredients_keeps_them(
+    user, author_client, tags, recipes, make_payload
+):
+    recipe = recipes[0]
+    ShoppingListItem.objects.rebuild()
+    ingredients = set(IngredientRecipe.objects.filter(
+        recipe=recipe
+    ).values_list('id', 'ingredient', 'amount'))
+    items = shopping_list(user)
+    response = author_client.patch(
+        f'{RECIPES_URL}{recipe.id}/', make_payload(tags), format='json'
+    )
+    assert response.status_code == 200
+    assert set(IngredientRecipe.objects.filter(
+        recipe=recipe
+    ).values_list('id', 'ingredient', 'amount')) == ingredients
+    assert shopping_list(user) == items
@@ -0,0 +1,104 @@
+from concurrent.futures import Future
+from io import BytesIO
+
+import pytest
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image
+
+from api import signals
+from api.images import make_thumbnails, thumbnail_name, thumbnail_names
+from api.versions import get_version
+from recipes.models import Recipe
+
+RECIPES_URL = '/api/recipes/'
+
+
+def save_image(name):
+    """Полупрозрачная картинка больше самой крупной копии."""
+    buffer = BytesIO()
+    Image.new('RGBA', (1600, 900), (200, 100, 50, 128)).save(buffer, 'PNG')
+    return default_storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def done(result):
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+@pytest.fixture
+def image_recipe(recipes):
+    recipe = recipes[0]
+    recipe.image = save_image('recipes/images/photo.png')
+    recipe.save()
+    return recipe
+
+
+def test_thumbnail_names():
+    assert thumbnail_name('recipes/images/abc.png', 'small') == (
+        'recipes/thumbnails/abc_small.jpg'
+    )
+    assert thumbnail_name('abc.jpeg', 'large', 'jpg.webp') == (
+        'recipes/thumbnails/abc_large.jpg.webp'
+    )
+
+
+def test_make_thumbnails_creates_every_size_once():
+    name = save_image('recipes/images/photo.png')
+    assert make_thumbnails(name)
+    for size, _, image_format, target in thumbnail_names(name):
+        with default_storage.open(target) as thumbnail:
+            image = Image.open(thumbnail)
+            assert image.format == image_format
+            width, height = settings.RECIPE_THUMBNAIL_SIZES[size]
+            assert image.width <= width and image.height <= height
+    assert not make_thumbnails(name)
+
+
+@pytest.mark.django_db
+def test_original_until_thumbnails_are_ready(guest_client, image_recipe):
+    url = f'{RECIPES_URL}{image_recipe.id}/'
+    assert guest_client.get(url).json()['image'].endswith(
+        image_recipe.image.name
+    )
+    version = get_version('recipes')
+    signals.thumbnails_done(image_recipe.image.name, done(True))
+    assert get_version('recipes') != version
+    assert guest_client.get(url).json()['image'].endswith(
+        thumbnail_name(image_recipe.image.name, 'large')
+    )
+
+
+@pytest.mark.django_db
+def test_failed_thumbnails_keep_original(image_recipe):
+    future = Future()
+    future.set_exception(OSError('broken image'))
+    signals.thumbnails_done(image_recipe.image.name, future)
+    image_recipe.refresh_from_db()
+    assert not image_recipe.thumbnails_ready
+
+
+@pytest.mark.django_db(transaction=True)
+def test_thumbnails_are_scheduled_only_for_new_image(
+    monkeypatch, author_client, image_recipe
+):
+    scheduled = []
+
+    def schedule(name):
+        scheduled.append(name)
+        return done(True)
+
+    monkeypatch.setattr(signals, 'schedule_thumbnails', schedule)
+    Recipe.objects.filter(pk=image_recipe.pk).update(thumbnails_ready=True)
+    url = f'{RECIPES_URL}{image_recipe.id}/'
+    response = author_client.patch(url, {'text': 'Новое описание'})
+    assert response.status_code == 200
+    assert scheduled == []
+    image_recipe.refresh_from_db()
+    image_recipe.image = save_image('recipes/images/other.png')
+    image_recipe.save()
+    assert scheduled == [image_recipe.image.name]
+    image_recipe.refresh_from_db()
+    assert image_recipe.thumbnails_ready
@@ -0,0 +1,125 @@
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.pagination import TimelinePagination
+from recipes.models import Recipe, TimelineEntry
+from users.models import Follow
+
+USERS_URL = '/api/users/'
+TIMELINE_URL = f'{USERS_URL}timeline/'
+
+
+def newest_first(recipes):
+    return [
+        recipe.id for recipe in sorted(
+            recipes, key=lambda recipe: (recipe.pub_date, recipe.id),
+            reverse=True
+        )
+    ]
+
+
+def timeline_ids(client, limit=5):
+    """id рецептов ленты со всех страниц."""
+    ids = []
+    response = client.get(TIMELINE_URL, {'limit': limit})
+    while True:
+        assert response.status_code == 200
+        data = response.json()
+        assert len(data['results']) == limit or data['next'] is None
+        ids.extend(recipe['id'] for recipe in data['results'])
+        if data['next'] is None:
+            return ids
+        response = client.get(data['next'])
+
+
+def entries(user):
+    return set(TimelineEntry.objects.filter(user=user).values_list(
+        'recipe', flat=True
+    ))
+
+
+@pytest.fixture
+def subscribed(user, user_client, author, make_recipes):
+    """Подписка пользователя на автора с семью рецептами."""
+    recipes = make_recipes(7)
+    response = user_client.post(f'{USERS_URL}{author.id}/subscribe/')
+    assert response.status_code == 201
+    return recipes
+
+
+@pytest.mark.django_db(transaction=True)
+def test_follow_backfills_and_unfollow_clears(
+    user, user_client, author, subscribed
+):
+    assert entries(user) == {recipe.id for recipe in subscribed}
+    assert timeline_ids(user_client) == newest_first(subscribed)
+    response = user_client.delete(f'{USERS_URL}{author.id}/subscribe/')
+    assert response.status_code == 204
+    assert entries(user) == set()
+    assert timeline_ids(user_client) == []
+
+
+@pytest.mark.django_db(transaction=True)
+def test_new_recipe_is_fanned_out(user, user_client, subscribed, make_recipes):
+    recipe = make_recipes(1)[0]
+    assert recipe.id in entries(user)
+    assert timeline_ids(user_client)[0] == recipe.id
+
+
+@pytest.mark.django_db(transaction=True)
+def test_popular_author_is_pulled(
+    settings, user, user_client, author, make_recipes, subscribed,
+    django_user_model
+):
+    settings.TIMELINE_FANOUT_LIMIT = 1
+    other = django_user_model.objects.create_user(
+        email='other@example.com',
+        username='other',
+        password='Pa55w0rd-test'
+    )
+    Follow.objects.create(user=other, author=author)
+    recipe = make_recipes(1)[0]
+    assert recipe.id not in entries(user)
+    other_recipes = make_recipes(3, recipe_author=other)
+    response = user_client.post(f'{USERS_URL}{other.id}/subscribe/')
+    assert response.status_code == 201
+    assert entries(user) >= {recipe.id for recipe in other_recipes}
+    expected = newest_first(subscribed + other_recipes + [recipe])
+    assert timeline_ids(user_client, limit=4) == expected
+
+
+@pytest.mark.django_db(transaction=True)
+def test_missing_recipes_do_not_shorten_page(user, subscribed):
+    pagination = TimelinePagination()
+    request = Request(APIRequestFactory().get(TIMELINE_URL, {'limit': 2}))
+    request.user = user
+    ordered = newest_first(subscribed)
+    queryset = Recipe.objects.exclude(pk__in=ordered[:3])
+    page = pagination.paginate_queryset(queryset, request)
+    assert [recipe.id for recipe in page] == ordered[3:5]
+    assert pagination.has_next
+    request = Request(APIRequestFactory().get(TIMELINE_URL, {
+        'limit': 2,
+        'cursor': pagination.encode_cursor(page[-1])
+    }))
+    request.user = user
+    page = pagination.paginate_queryset(queryset, request)
+    assert [recipe.id for recipe in page] == ordered[5:]
+    assert not pagination.has_next
+
+
+@pytest.mark.django_db(transaction=True)
+def test_rebuild_timelines_command(user, author, subscribed, capsys):
+    TimelineEntry.objects.filter(user=user).delete()
+    type(author).objects.filter(pk=author.pk).update(followers_count=5)
+    with pytest.raises(CommandError):
+        call_command('rebuild_timelines', '--check')
+    call_command('rebuild_timelines')
+    assert entries(user) == {recipe.id for recipe in subscribed}
+    author.refresh_from_db()
+    assert author.followers_count == 1
+    call_command('rebuild_timelines', '--check')
+    assert 'Расхождений нет.' in capsys.readouterr().out
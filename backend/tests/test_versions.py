@@ -0,0 +1,59 @@
+import pytest
+from django.db import transaction
+
+from recipes.models import Ingredient, Tag
+
+from api.versions import get_version
+
+
+def create_tag(make_recipes):
+    Tag.objects.create(name='Завтрак', color='#E26C2D', slug='breakfast')
+
+
+def create_ingredient(make_recipes):
+    Ingredient.objects.create(name='Мука', measurement_unit='г')
+
+
+def create_recipe(make_recipes):
+    make_recipes(1)
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize('name, create', (
+    ('tags', create_tag),
+    ('ingredients', create_ingredient),
+    ('recipes', create_recipe),
+))
+def test_versions_change_after_commit(name, create, make_recipes):
+    version = get_version(name)
+    with transaction.atomic():
+        create(make_recipes)
+        assert get_version(name) == version
+    assert get_version(name) != version
+
+
+@pytest.mark.django_db(transaction=True)
+def test_rolled_back_change_keeps_version(tags):
+    version = get_version('tags')
+    with pytest.raises(RuntimeError):
+        with transaction.atomic():
+            tags[0].delete()
+            raise RuntimeError
+    assert get_version('tags') == version
+
+
+@pytest.mark.django_db(transaction=True)
+def test_users_version_follows_author_card(user, django_user_model):
+    version = get_version('users')
+    user.save(update_fields=['last_login'])
+    user.set_password('N3w-pa55w0rd-test')
+    user.save()
+    user.first_name = 'Имя'
+    user.save(update_fields=['first_name'])
+    django_user_model.objects.create_user(
+        email='new@example.com', username='new', password='Pa55w0rd-test'
+    )
+    assert get_version('users') == version
+    user.first_name = 'Новое имя'
+    user.save()
+    assert get_version('users') != version
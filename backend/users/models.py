@@ -24,6 +24,11 @@ class User(AbstractUser):
         'Фамилия',
         max_length=150
     )
+    followers_count = models.PositiveIntegerField(
+        'Количество подписчиков',
+        default=0,
+        editable=False
+    )
 
     class Meta:
         ordering = ('id',)